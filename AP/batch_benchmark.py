@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# python3 batch_benchmark.py --batches 1,4,8,16 --faces 1,2,4,8
+"""Measure the throughput gained by batching DNN inference on the CPU:
+
+- training: images of the dataset per second when the detector and the embedder run on batches of images (train.embedImages(), batch 1 = one image per forward pass)
+- recognition: milliseconds to embed the faces of a frame with several faces, one forward pass per face vs one forward pass for all of them (RecognitionEngine.embedFaces())
+"""
+import argparse
+import time
+import cv2
+from imutils import paths
+import train
+
+def timeit(function, repeat):
+    """The best time of several calls of a function, in seconds
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - begin)
+    return best
+
+
+def embedOneByOne(faces):
+    """Embed faces with one forward pass each (what the recognition loop did before batching)
+    """
+    spec = train.profile["embedder_spec"]
+    for face in faces:
+        train.embedder.setInput(cv2.dnn.blobFromImage(face, spec["scale"], (spec["size"], spec["size"]), spec["mean"], swapRB=spec["swapRB"], crop=False))
+        train.embedder.forward()
+
+
+def embedBatch(faces):
+    """Embed faces with one forward pass for all of them (like RecognitionEngine.embedFaces())
+    """
+    spec = train.profile["embedder_spec"]
+    train.embedder.setInput(cv2.dnn.blobFromImages(faces, spec["scale"], (spec["size"], spec["size"]), spec["mean"], swapRB=spec["swapRB"], crop=False))
+    train.embedder.forward()
+
+
+def datasetFaces(imagePaths):
+    """The face ROIs of the dataset images (the largest face of each image, as in train.py)
+    """
+    faces = []
+    for imagePath in imagePaths:
+        image = cv2.imread(imagePath)
+        box = train.detectBatch([image])[0]
+        if box is not None:
+            (startX, startY, endX, endY) = box
+            face = image[max(startY, 0):endY, max(startX, 0):endX]
+            if face.shape[0] >= 20 and face.shape[1] >= 20:
+                faces.append(face)
+    return faces
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark batched DNN inference for training and multi-face frames")
+    parser.add_argument("--dataset", default="dataset", help="images to benchmark on")
+    parser.add_argument("--batches", default="1,4,8,16", help="batch sizes for training")
+    parser.add_argument("--faces", default="1,2,4,8", help="numbers of faces per frame")
+    parser.add_argument("--threads", type=int, default=cv2.getNumThreads(), help="OpenCV threads (train.py workers use 1)")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions of each measure (the best one is kept)")
+    parser.add_argument("--profile", default="default", help="models to benchmark (see models.py)")
+    args = parser.parse_args()
+
+    train.initWorker({"profile": args.profile, "confidence": 0.5})
+    cv2.setNumThreads(args.threads)
+    imagePaths = sorted(paths.list_images(args.dataset))
+    print("[INFO] {} images, {} OpenCV threads".format(len(imagePaths), args.threads))
+
+    # training: the whole dataset in batches of each size
+    baseline = None
+    for batch in [int(b) for b in args.batches.split(",")]:
+        chunks = [imagePaths[i:i + batch] for i in range(0, len(imagePaths), batch)]
+        seconds = timeit(lambda: [train.embedImages(chunk) for chunk in chunks], max(1, args.repeat // 2))
+        baseline = baseline or seconds
+        print("[INFO] training batch {:>3}: {:.1f} images/s (x{:.2f})".format(batch, len(imagePaths) / seconds, baseline / seconds))
+
+    # recognition: frames with several faces
+    faces = datasetFaces(imagePaths)
+    for count in [int(n) for n in args.faces.split(",")]:
+        frameFaces = [faces[i % len(faces)] for i in range(count)]
+        single = timeit(lambda: embedOneByOne(frameFaces), args.repeat)
+        batched = timeit(lambda: embedBatch(frameFaces), args.repeat)
+        print("[INFO] {} faces per frame: {:.1f} ms one by one, {:.1f} ms batched (x{:.2f})".format(
+            count, single * 1000, batched * 1000, single / batched))
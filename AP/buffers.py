@@ -0,0 +1,113 @@
+import threading
+import numpy as np
+import cv2
+
+class FramePool:
+    """Frame buffers reused from frame to frame, so the capture loop does not allocate a new frame for every camera frame.
+
+    A frame is taken with acquire() and given back with release() once nothing uses it anymore
+    (the pipeline releases the frames its queues drop, and the recognition loop the frames it is done with).
+    A frame that is never released is only lost until reset(): when every buffer is in use, acquire() allocates a new one, up to size buffers,
+    then frames that are not pooled at all.
+    """
+
+    def __init__(self, size=8):
+        """inits FramePool with no buffer (they are allocated by acquire() when needed)
+
+        Keyword Arguments:
+            size {int} -- Maximum number of buffers
+        """
+        self.size = size
+        self.lock = threading.Lock()
+        self.buffers = {}       # id of each buffer -> buffer
+        self.free = []
+        self.allocated = 0      # Buffers allocated, pooled or not
+        self.reused = 0         # Frames given a free buffer
+
+    def acquire(self, shape):
+        """Take a buffer for a frame
+
+        Arguments:
+            shape {tuple} -- The shape of the frame
+
+        Returns:
+            numpy.ndarray -- A uint8 buffer with that shape, its content is undefined
+        """
+        with self.lock:
+            while self.free:
+                frame = self.free.pop()
+                if frame.shape == shape:
+                    self.reused += 1
+                    return frame
+                # the camera changed resolution, the buffers of the old one are dropped
+                del self.buffers[id(frame)]
+
+            frame = np.empty(shape, dtype=np.uint8)
+            self.allocated += 1
+            if len(self.buffers) < self.size:
+                self.buffers[id(frame)] = frame
+            return frame
+
+    def release(self, frame):
+        """Give back a frame. Releasing a frame that is not pooled, or that is already free, does nothing
+
+        Arguments:
+            frame {numpy.ndarray} -- A frame from acquire()
+        """
+        with self.lock:
+            if self.buffers.get(id(frame)) is frame and not any(frame is free for free in self.free):
+                self.free.append(frame)
+
+    def reset(self):
+        """Mark every buffer free (when no thread uses a frame anymore, at the start of a login)
+        """
+        with self.lock:
+            self.free = list(self.buffers.values())
+
+
+class BlobBuffer:
+    """A preallocated input of a DNN, filled in place with the same values as cv2.dnn.blobFromImages():
+    each image is resized to size x size (skipped if it already has that size), its channels swapped if swapRB,
+    then (image - mean) * scale is written straight into the blob, in channel-first order.
+    """
+
+    def __init__(self, size, scale=1.0, mean=(0.0, 0.0, 0.0), swapRB=False, batch=1):
+        """inits BlobBuffer
+
+        Arguments:
+            size {int} -- Width and height of the input of the DNN
+
+        Keyword Arguments:
+            scale {float} -- Multiplier of the pixel values
+            mean {tuple} -- Value subtracted from each channel (after swapping)
+            swapRB {bool} -- Swap the first and the last channel (BGR to RGB)
+            batch {int} -- Images the blob has room for at first (it grows if more are given)
+        """
+        self.size = size
+        self.scale = scale
+        self.mean = np.array(mean, dtype=np.float32).reshape(3, 1, 1)
+        self.swapRB = swapRB
+        self.resized = np.empty((size, size, 3), dtype=np.uint8)
+        self.blob = np.empty((batch, 3, size, size), dtype=np.float32)
+
+    def fill(self, images):
+        """Write images into the blob
+
+        Arguments:
+            images {list} -- BGR images (views of a frame are fine, they are not copied)
+
+        Returns:
+            numpy.ndarray -- The blob of the images, with shape (len(images), 3, size, size). It is overwritten by the next call
+        """
+        if len(images) > len(self.blob):
+            self.blob = np.empty((len(images), 3, self.size, self.size), dtype=np.float32)
+
+        for image, out in zip(images, self.blob):
+            if image.shape[:2] != (self.size, self.size):
+                image = cv2.resize(image, (self.size, self.size), dst=self.resized)
+            if self.swapRB:
+                image = image[:, :, ::-1]
+            np.subtract(image.transpose(2, 0, 1), self.mean, out=out)
+            if self.scale != 1.0:
+                np.multiply(out, self.scale, out=out)
+        return self.blob[:len(images)]
@@ -0,0 +1,57 @@
+import unittest
+import numpy as np
+import cv2
+from buffers import FramePool, BlobBuffer
+
+class BuffersTest(unittest.TestCase):
+    """These tests check that the frame buffers and the DNN inputs are reused instead of allocated for every frame
+    """
+
+    def test_reuse(self):
+        """
+        Function: acquire 2 frames, release one and acquire again
+
+        Assertion: the released buffer is reused, the one in use is not
+        """
+        pool = FramePool()
+        first = pool.acquire((450, 600, 3))
+        second = pool.acquire((450, 600, 3))
+        pool.release(first)
+        pool.release(first)
+        self.assertIs(pool.acquire((450, 600, 3)), first)
+        self.assertIsNot(pool.acquire((450, 600, 3)), second)
+        self.assertEqual((pool.allocated, pool.reused), (3, 1))
+
+    def test_limits(self):
+        """
+        Function: acquire more frames than the pool holds, reset it, then acquire frames of another shape
+
+        Assertion: the extra frames are not pooled, reset frees the pooled ones, and buffers of the old shape are dropped
+        """
+        pool = FramePool(2)
+        frames = [pool.acquire((10, 10, 3)) for _ in range(3)]
+        pool.release(frames[2])
+        self.assertEqual(pool.free, [])
+
+        pool.reset()
+        self.assertEqual(len(pool.free), 2)
+        self.assertEqual(pool.acquire((20, 20, 3)).shape, (20, 20, 3))
+        self.assertEqual(len(pool.buffers), 1)
+
+    def test_blob(self):
+        """
+        Function: fill a face blob with faces of different sizes (views of a frame), more faces than its first size
+
+        Assertion: the blob has the values of cv2.dnn.blobFromImages(), and is filled in place the next time
+        """
+        frame = np.random.RandomState(0).randint(0, 255, (450, 600, 3)).astype(np.uint8)
+        faces = [frame[10:150, 20:130], frame[200:300, 300:420], frame[0:96, 0:96]]
+        blob = BlobBuffer(96, 1.0 / 255, swapRB=True)
+
+        filled = blob.fill(faces)
+        expected = cv2.dnn.blobFromImages(faces, 1.0 / 255, (96, 96), (0, 0, 0), swapRB=True, crop=False)
+        np.testing.assert_allclose(filled, expected, atol=1e-6)
+        self.assertTrue(np.shares_memory(blob.fill(faces[:1]), filled))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,15 +2,23 @@
 
 import socket
 import getpass
+import json
 
 class ClientTCP:
     """This module will be imported to menu.py to the Agent Pi the ability to connect to the TCP Server and send messages
     """
 
-    HOST = input("Enter IP address of Carshare server: ")   # The server's hostname or IP address
-
     PORT = 65000       # The port used by the server
-    ADDRESS = (HOST, PORT)
+
+    def __init__(self, host=None):
+        """inits ClientTCP with the address of the server. The address is asked when a client is created, not when this module is imported:
+        the worker process of facial recognition (worker.py) imports the modules of menu.py again and has no terminal to answer
+
+        Keyword Arguments:
+            host {str} -- The server's hostname or IP address (asked if None)
+        """
+        self.HOST = input("Enter IP address of Carshare server: ") if host is None else host
+        self.ADDRESS = (self.HOST, self.PORT)
 
     def credentialsCheck(self):
         """This function will ask the user to enter their username and password.
@@ -123,3 +131,36 @@ class ClientTCP:
         print("Done.")
         print()
 
+
+    def faceMapping(self, since):
+        """This function is triggered by menu.py to download the changes of the mapping of facial recognition labels to User IDs (see enrolment.py).
+        The request is sent to the TCP server in a string with the "mapping" tag and the version the Agent Pi has.
+        The reply starts with its length in bytes and a new line, as it can be longer than one TCP read.
+
+        Arguments:
+            since {int} -- The version of the mapping the Agent Pi has (0 for the whole mapping)
+
+        Returns:
+            dict -- {"version": latest version, "changes": {label: User ID, or None if unenrolled}}. None if the server could not be reached
+        """
+        try:
+            with socket.create_connection(self.ADDRESS, timeout=10) as s:
+                s.sendall("mapping {}".format(since).encode())
+
+                # Receive the length of the reply, then the whole reply
+                data = b""
+                while b"\n" not in data:
+                    chunk = s.recv(4096) # 4096 is the buffersize
+                    if not chunk:
+                        return None
+                    data += chunk
+                length, data = data.split(b"\n", 1)
+                while len(data) < int(length):
+                    chunk = s.recv(4096)
+                    if not chunk:
+                        return None
+                    data += chunk
+                return json.loads(data.decode())
+        except (OSError, ValueError) as e:
+            print("Could not download the facial recognition mapping: {}".format(e))
+            return None
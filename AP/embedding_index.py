@@ -0,0 +1,222 @@
+import numpy as np
+import model_store
+
+class EmbeddingIndex:
+    """A face recognizer that keeps the L2-normalised 128-d embeddings of every known face in one contiguous NumPy matrix.
+    It is an alternative to the SVC fitted by train.py:
+
+    - Adding (enrolling) or removing a person does not need any training, the matrix and the per-person centroids are updated in place
+    - Recognizing a face is one matrix-vector product, there is no Platt scaling
+
+    Each person gets a score, the cosine similarity of the face to:
+
+    - "centroid": the mean of the person's embeddings
+    - "knn": the most similar of the person's embeddings among the k nearest ones
+
+    The probability of a person is the softmax of the scores divided by temperature.
+    A face less similar than min_similarity to everyone is recognized as "unknown".
+    It has the same predict_proba() and classes_ as the SVC and its label encoder.
+    It is saved to and loaded from the binary store of model_store.py, the loaded matrix is memory-mapped until a person is added or removed.
+    """
+
+    def __init__(self, mode="centroid", k=5, temperature=0.05, min_similarity=0.5, dim=128):
+        """inits EmbeddingIndex (empty)
+
+        Keyword Arguments:
+            mode {str} -- "centroid" or "knn"
+            k {int} -- Number of nearest embeddings ("knn")
+            temperature {float} -- Lower values give more confident probabilities
+            min_similarity {float} -- Minimum cosine similarity to recognize a known person
+            dim {int} -- Size of the embeddings
+        """
+        if mode not in ("centroid", "knn"):
+            raise ValueError("Unknown index mode: {}".format(mode))
+        self.mode = mode
+        self.k = k
+        self.temperature = temperature
+        self.min_similarity = min_similarity
+        self.matrix = np.empty((16, dim), dtype=np.float32)    # Grown by doubling, only the first size rows are used
+        self.labels = np.empty(16, dtype=np.int32)              # Index in classes_ of each row
+        self.size = 0
+        self.classes_ = []
+        self.sums = np.zeros((0, dim), dtype=np.float32)        # Sum of the embeddings of each person
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def load(cls, directory, **args):
+        """Load an index from a store (see model_store.py), without copying its embeddings
+
+        Arguments:
+            directory {str} -- The directory of the store
+
+        Keyword Arguments:
+            Any keyword argument of EmbeddingIndex()
+
+        Returns:
+            EmbeddingIndex -- The index
+        """
+        vectors, labels, classes = model_store.load(directory)
+        index = cls(dim=vectors.shape[1], **args)
+        index.matrix = vectors      # stored L2-normalised, read-only until add() or remove() copies it
+        index.labels = labels
+        index.size = len(vectors)
+        index.classes_ = list(classes)
+        index.sums = np.zeros((len(classes), vectors.shape[1]), dtype=np.float32)
+        np.add.at(index.sums, labels, vectors)
+        index.counts = np.bincount(labels, minlength=len(classes)).astype(np.int64)
+        return index
+
+    def save(self, directory, embedder="openface"):
+        """Save the index to a store (see model_store.py)
+
+        Arguments:
+            directory {str} -- The directory of the store
+
+        Keyword Arguments:
+            embedder {str} -- The embedder of models.py the embeddings were computed with
+        """
+        model_store.save(directory, self.vectors, self.names, embedder)
+
+    @property
+    def vectors(self):
+        """The embeddings of the index (a view, not a copy)
+        """
+        return self.matrix[:self.size]
+
+    @property
+    def names(self):
+        """The name of each embedding of the index
+        """
+        return [self.classes_[label] for label in self.labels[:self.size]]
+
+    @staticmethod
+    def normalize(vectors):
+        """L2-normalise embeddings
+
+        Arguments:
+            vectors {numpy.ndarray} -- One embedding or a matrix of embeddings (one per row)
+
+        Returns:
+            numpy.ndarray -- A float32 matrix of unit rows
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, np.shape(vectors)[-1])
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def add(self, vectors, names):
+        """Enrol embeddings, no retraining needed
+
+        Arguments:
+            vectors {numpy.ndarray} -- A matrix of embeddings (one per row), or one embedding
+            names {list} -- The name of each embedding, or one name for all of them
+        """
+        vectors = self.normalize(vectors)
+        if isinstance(names, str):
+            names = [names] * len(vectors)
+        if len(names) != len(vectors):
+            raise ValueError("{} names for {} embeddings".format(len(names), len(vectors)))
+
+        for name in names:
+            if name not in self.classes_:
+                self.classes_.append(name)
+                self.sums = np.vstack([self.sums, np.zeros((1, self.sums.shape[1]), dtype=np.float32)])
+                self.counts = np.append(self.counts, 0)
+        labels = np.array([self.classes_.index(name) for name in names], dtype=np.int32)
+
+        end = self.size + len(vectors)
+        if end > len(self.matrix):
+            capacity = max(end, 2 * len(self.matrix))
+            self.matrix = np.resize(self.matrix, (capacity, self.matrix.shape[1]))
+            self.labels = np.resize(self.labels, capacity)
+        self.matrix[self.size:end] = vectors
+        self.labels[self.size:end] = labels
+        self.size = end
+
+        np.add.at(self.sums, labels, vectors)
+        np.add.at(self.counts, labels, 1)
+
+    def remove(self, name):
+        """Forget every embedding of a person
+
+        Arguments:
+            name {str} -- The name of the person
+
+        Returns:
+            int -- The number of embeddings removed
+        """
+        if name not in self.classes_:
+            return 0
+        label = self.classes_.index(name)
+        keep = self.labels[:self.size] != label
+        removed = self.size - int(keep.sum())
+
+        self.matrix = self.vectors[keep]
+        self.labels = self.labels[:self.size][keep]
+        self.labels[self.labels > label] -= 1
+        self.size = len(self.matrix)
+
+        del self.classes_[label]
+        self.sums = np.delete(self.sums, label, axis=0)
+        self.counts = np.delete(self.counts, label)
+        return removed
+
+    def scores(self, vectors):
+        """The cosine similarity of faces to each person
+
+        Arguments:
+            vectors {numpy.ndarray} -- A matrix of embeddings (one per row), or one embedding
+
+        Returns:
+            numpy.ndarray -- A (faces, persons) matrix
+        """
+        vectors = self.normalize(vectors)
+        if self.mode == "centroid":
+            centroids = self.normalize(self.sums)
+            return vectors @ centroids.T
+
+        similarities = vectors @ self.vectors.T
+        k = min(self.k, self.size)
+        nearest = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        scores = np.full((len(vectors), len(self.classes_)), -1.0, dtype=np.float32)
+        rows = np.repeat(np.arange(len(vectors)), k)
+        np.maximum.at(scores, (rows, self.labels[nearest].ravel()), similarities[rows, nearest.ravel()])
+        return scores
+
+    def predict_proba(self, vectors):
+        """The probability of each person for faces (like SVC.predict_proba())
+
+        Arguments:
+            vectors {numpy.ndarray} -- A matrix of embeddings (one per row), or one embedding
+
+        Returns:
+            numpy.ndarray -- A (faces, persons) matrix, each row sums to 1
+        """
+        return self.softmax(self.scores(vectors))
+
+    def softmax(self, scores):
+        """Turn the scores of faces into probabilities
+
+        Arguments:
+            scores {numpy.ndarray} -- A (faces, persons) matrix from scores()
+
+        Returns:
+            numpy.ndarray -- A (faces, persons) matrix, each row sums to 1
+        """
+        scores = np.exp((scores - scores.max(axis=1, keepdims=True)) / self.temperature)
+        return scores / scores.sum(axis=1, keepdims=True)
+
+    def classify(self, vec):
+        """Recognize the person of an embedding
+
+        Arguments:
+            vec {numpy.ndarray} -- The embedding, with shape (1, 128)
+
+        Returns:
+            tuple -- The name of the person ("unknown" if nobody is similar enough) and its probability
+        """
+        scores = self.scores(vec)
+        j = int(np.argmax(scores[0]))
+        proba = self.softmax(scores)[0][j]
+        if scores[0][j] < self.min_similarity:
+            return "unknown", proba
+        return self.classes_[j], proba
@@ -0,0 +1,75 @@
+import unittest
+import numpy as np
+from embedding_index import EmbeddingIndex
+
+class EmbeddingIndexTest(unittest.TestCase):
+    """These tests check the nearest-neighbour recognizer on synthetic embeddings (clusters around random directions)
+    """
+
+    def setUp(self):
+        self.rng = np.random.RandomState(0)
+        self.centers = {name: self.rng.randn(128) for name in ("Fahim", "Tyler", "Vinh")}
+
+    def faces(self, name, count):
+        return self.centers[name] + 0.3 * self.rng.randn(count, 128)
+
+    def test_classify(self):
+        """
+        Function: enrol 2 people, then recognize new faces of each of them in both modes
+
+        Assertion: every face is recognized with a high probability
+        """
+        for mode in ("centroid", "knn"):
+            index = EmbeddingIndex(mode)
+            index.add(self.faces("Fahim", 10), "Fahim")
+            index.add(self.faces("Tyler", 10), "Tyler")
+
+            for name in ("Fahim", "Tyler"):
+                for vec in self.faces(name, 5):
+                    recognized, proba = index.classify(vec.reshape(1, -1))
+                    self.assertEqual(recognized, name)
+                    self.assertGreater(proba, 0.9)
+
+    def test_enrolment(self):
+        """
+        Function: enrol a third person into an index of 2, with more faces than its initial capacity
+
+        Assertion: the new person is recognized right away, the rows of the others are kept
+        """
+        index = EmbeddingIndex()
+        index.add(self.faces("Fahim", 10), "Fahim")
+        index.add(self.faces("Tyler", 10), "Tyler")
+        index.add(self.faces("Vinh", 10), "Vinh")
+
+        self.assertEqual(index.size, 30)
+        self.assertEqual(index.names[:10], ["Fahim"] * 10)
+        self.assertEqual(index.classify(self.faces("Vinh", 1))[0], "Vinh")
+        self.assertEqual(index.predict_proba(self.faces("Fahim", 4)).shape, (4, 3))
+
+    def test_remove(self):
+        """
+        Function: remove the first of 3 people
+
+        Assertion: its embeddings are gone and the others are still recognized
+        """
+        index = EmbeddingIndex()
+        for name in ("Fahim", "Tyler", "Vinh"):
+            index.add(self.faces(name, 5), name)
+
+        self.assertEqual(index.remove("Fahim"), 5)
+        self.assertEqual(index.classes_, ["Tyler", "Vinh"])
+        self.assertEqual(index.names, ["Tyler"] * 5 + ["Vinh"] * 5)
+        self.assertEqual(index.classify(self.faces("Vinh", 1))[0], "Vinh")
+
+    def test_unknown(self):
+        """
+        Function: recognize a face far from everyone enrolled
+
+        Assertion: it is recognized as "unknown"
+        """
+        index = EmbeddingIndex()
+        index.add(self.faces("Fahim", 5), "Fahim")
+        self.assertEqual(index.classify(-self.centers["Fahim"].reshape(1, -1))[0], "unknown")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,241 @@
+import numpy as np
+import model_store
+import threading
+import json
+import os
+
+class IdentityMap:
+    """This class links the labels recognized by facial recognition (the dataset folder names) to the User IDs of the Master Pi.
+    It replaces the hard-coded id_names dict: enrolling a user on the Master Pi (/face/enrol) reaches every Agent Pi without a code change.
+
+    - The mapping and its version are kept in a JSON file, so the Agent Pi can log users in while the Master Pi is unreachable
+    - sync() only downloads the changes since the version it has (see flask_api.getFaceMapping())
+    - It is used like the old dict: name in id_names, id_names[name], for name in id_names
+    """
+
+    def __init__(self, path="output/id_map.json"):
+        """inits IdentityMap from its file (empty if there is no file yet)
+
+        Keyword Arguments:
+            path {str} -- The JSON file of the mapping
+        """
+        self.path = path
+        self.version = 0
+        self.users = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.version = data["version"]
+            self.users = data["users"]
+
+    def __contains__(self, name):
+        return name in self.users
+
+    def __getitem__(self, name):
+        return int(self.users[name])
+
+    def __len__(self):
+        return len(self.users)
+
+    def __iter__(self):
+        return iter(list(self.users))
+
+    def apply(self, delta, replace=False):
+        """Apply changes of the mapping
+
+        Arguments:
+            delta {dict} -- {"version": version, "changes": {label: User ID, or None if the label was unenrolled}}
+
+        Keyword Arguments:
+            replace {bool} -- The changes are the whole mapping, labels not in it are dropped
+
+        Returns:
+            int -- The number of labels changed
+        """
+        users = {} if replace else dict(self.users)
+        for label, user_id in delta["changes"].items():
+            if user_id is None:
+                users.pop(label, None)
+            else:
+                users[label] = str(user_id)
+        changed = len(set(users.items()) ^ set(self.users.items()))
+
+        # replaced at once, so a login checking the mapping never sees half of the changes
+        self.users = users
+        self.version = delta["version"]
+        return changed
+
+    def save(self):
+        """Write the mapping and its version (to a temporary file first, so an interrupted write never leaves half a file)
+        """
+        with open(self.path + ".tmp", "w") as f:
+            json.dump({"version": self.version, "users": self.users}, f, indent=1, sort_keys=True)
+        os.replace(self.path + ".tmp", self.path)
+
+    def sync(self, clientTCP):
+        """Download the changes of the mapping from the Master Pi and save them.
+        If the Master Pi is behind the version (its mapping was reset), the whole mapping is downloaded instead.
+        The first sync (version 0) replaces the whole local mapping, e.g. the one shipped in output/id_map.json: the Master Pi's mapping is the reference.
+
+        Arguments:
+            clientTCP {ClientTCP} -- The connection to the Master Pi
+
+        Returns:
+            bool -- False if the Master Pi could not be reached
+        """
+        with self.lock:
+            delta = clientTCP.faceMapping(self.version)
+            if delta is None:
+                return False
+
+            replace = self.version == 0 or delta["version"] < self.version
+            if delta["version"] < self.version:
+                delta = clientTCP.faceMapping(0)
+                if delta is None:
+                    return False
+
+            version = self.version
+            changed = self.apply(delta, replace)
+            if changed or version != self.version:
+                self.save()
+                print("[INFO] facial recognition mapping: version {}, {} users, {} changed".format(self.version, len(self.users), changed))
+            return True
+
+
+class ContinuousEnrolment:
+    """This class keeps the embeddings of the faces of successful logins, so facial recognition gets better over time without running train.py again.
+    It is opt-in (args "learn" of RecognitionEngine, CARSHARE_FACE_LEARN=on).
+
+    - Only the embeddings recognized as the logged in person with a probability of at least min_proba are kept
+    - An embedding more similar than max_similarity (cosine) to an embedding of the person already known, or kept in the same login, is dropped: it adds nothing
+    - At most cap embeddings are kept per person, the oldest ones are dropped first
+    - They are kept in their own store (learned/ in the store of train.py, see model_store.py), so train.py does not overwrite them
+    - learn() does the work in a background thread, then calls back to refresh the recognizer, the login does not wait for it
+    """
+
+    def __init__(self, store="output", min_proba=0.9, max_similarity=0.95, cap=50, embedder="openface"):
+        """inits ContinuousEnrolment with the embeddings learned so far
+
+        Keyword Arguments:
+            store {str} -- The directory of the embeddings of train.py
+            min_proba {float} -- Minimum probability of a recognition to keep its embedding
+            max_similarity {float} -- Maximum cosine similarity of a kept embedding to the known ones
+            cap {int} -- Maximum number of embeddings kept per person
+            embedder {str} -- The embedder of models.py of the embeddings, learned embeddings of another embedder are dropped
+        """
+        self.store = store
+        self.directory = os.path.join(store, "learned")
+        self.min_proba = min_proba
+        self.max_similarity = max_similarity
+        self.cap = cap
+        self.embedder = embedder
+        self.lock = threading.Lock()
+        self.vectors = np.zeros((0, 128), dtype=np.float32)
+        self.names = []
+        if os.path.exists(model_store.paths(self.directory)[2]) and model_store.embedder(self.directory) == embedder:
+            vectors, labels, classes = model_store.load(self.directory, mmap=False)
+            self.vectors = vectors
+            self.names = [classes[label] for label in labels]
+
+    def learned(self):
+        """The embeddings kept so far
+
+        Returns:
+            tuple -- The embeddings (one per row) and the name of each
+        """
+        return self.vectors, list(self.names)
+
+    def known(self, name):
+        """The embeddings of a person in the store of train.py and learned so far
+
+        Arguments:
+            name {str} -- The person
+
+        Returns:
+            numpy.ndarray -- The L2-normalised embeddings, one per row
+        """
+        vectors = [self.vectors[[i for i, learned in enumerate(self.names) if learned == name]]]
+        if os.path.exists(model_store.paths(self.store)[2]):
+            stored, labels, classes = model_store.load(self.store)
+            if name in classes:
+                vectors.append(stored[labels == classes.index(name)])
+        return np.vstack(vectors)
+
+    def select(self, name, vectors, probas):
+        """The embeddings of a login worth keeping
+
+        Arguments:
+            name {str} -- The logged in person
+            vectors {numpy.ndarray} -- The embeddings of the person's face during the login, one per row
+            probas {list} -- The probability of the person for each embedding
+
+        Returns:
+            numpy.ndarray -- The L2-normalised embeddings to keep, one per row
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(probas), -1)
+        vectors = vectors[np.asarray(probas) >= self.min_proba]
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        known = self.known(name)
+        if len(known):
+            vectors = vectors[(vectors @ known.T).max(axis=1) < self.max_similarity]
+
+        kept = []
+        for vec in vectors:
+            if all(float(vec @ other) < self.max_similarity for other in kept):
+                kept.append(vec)
+        return np.array(kept, dtype=np.float32).reshape(-1, vectors.shape[1])
+
+    def add(self, name, vectors, probas):
+        """Keep the embeddings of a login worth keeping (see select()), drop the oldest ones of the person above cap and save them
+
+        Arguments:
+            name {str} -- The logged in person
+            vectors {numpy.ndarray} -- The embeddings of the person's face during the login, one per row
+            probas {list} -- The probability of the person for each embedding
+
+        Returns:
+            int -- The number of embeddings kept
+        """
+        with self.lock:
+            kept = self.select(name, vectors, probas)
+            if not len(kept):
+                return 0
+            vectors = np.vstack([self.vectors.reshape(-1, kept.shape[1]), kept])
+            names = self.names + [name] * len(kept)
+
+            # the oldest embeddings of the person go first
+            rows = [i for i, learned in enumerate(names) if learned == name]
+            drop = set(rows[:max(len(rows) - self.cap, 0)])
+            keep = [i for i in range(len(names)) if i not in drop]
+            self.vectors = vectors[keep]
+            self.names = [names[i] for i in keep]
+            model_store.save(self.directory, self.vectors, self.names, self.embedder)
+            return len(kept)
+
+    def learn(self, name, vectors, probas, refresh=None):
+        """Keep the embeddings of a login in a background thread (see add()), then refresh the recognizer
+
+        Arguments:
+            name {str} -- The logged in person
+            vectors {numpy.ndarray} -- The embeddings of the person's face during the login, one per row
+            probas {list} -- The probability of the person for each embedding
+
+        Keyword Arguments:
+            refresh {function} -- Called without argument once embeddings were kept, to refresh the recognizer with them
+
+        Returns:
+            threading.Thread -- The background thread
+        """
+        def work():
+            try:
+                added = self.add(name, vectors, probas)
+                print("[INFO] continuous enrolment: {} new embeddings of {} kept".format(added, name))
+                if added and refresh is not None:
+                    refresh()
+            except Exception as e:
+                print("[INFO] continuous enrolment failed: {}".format(e))
+
+        thread = threading.Thread(target=work, name="enrolment", daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,177 @@
+import unittest
+import tempfile
+import os
+import numpy as np
+import model_store
+from sklearn.preprocessing import LabelEncoder
+from enrolment import IdentityMap, ContinuousEnrolment
+from recognition import RecognitionEngine
+
+class FakeClient:
+    """Replies to faceMapping() like the Master Pi would, from a dict of versions to changes
+    """
+    def __init__(self, versions):
+        self.versions = versions
+        self.requests = []
+
+    def faceMapping(self, since):
+        self.requests.append(since)
+        if self.versions is None:
+            return None
+        changes = {}
+        for version in sorted(self.versions):
+            if version > since:
+                changes.update(self.versions[version])
+        return {"version": max(self.versions, default=0), "changes": changes}
+
+class EnrolmentTest(unittest.TestCase):
+    """These tests check that the facial recognition mapping is synced from the Master Pi as deltas and kept on disk
+    """
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "id_map.json")
+
+    def test_sync(self):
+        """
+        Function: sync an empty mapping, then sync again after a user is moved and another unenrolled
+
+        Assertion: the second sync only asks for the changes since the first one, the mapping is saved and used like a dict
+        """
+        client = FakeClient({1: {"Fahim": "1"}, 2: {"Tyler": "2"}})
+        id_names = IdentityMap(self.path)
+        self.assertTrue(id_names.sync(client))
+        self.assertEqual(id_names["Tyler"], 2)
+
+        client.versions[3] = {"Fahim": "7", "Tyler": None}
+        self.assertTrue(id_names.sync(client))
+        self.assertEqual(client.requests, [0, 2])
+        self.assertEqual(id_names["Fahim"], 7)
+        self.assertNotIn("Tyler", id_names)
+
+        reloaded = IdentityMap(self.path)
+        self.assertEqual((reloaded.version, reloaded.users), (3, {"Fahim": "7"}))
+
+    def test_offline(self):
+        """
+        Function: sync a saved mapping while the Master Pi cannot be reached
+
+        Assertion: the saved mapping is kept
+        """
+        IdentityMap(self.path).sync(FakeClient({1: {"Vinh": "3"}}))
+        id_names = IdentityMap(self.path)
+        self.assertFalse(id_names.sync(FakeClient(None)))
+        self.assertIn("Vinh", id_names)
+
+    def test_reset(self):
+        """
+        Function: sync a mapping at version 5 with a Master Pi whose mapping restarted at version 1
+
+        Assertion: the whole mapping is downloaded again and replaces the old one
+        """
+        id_names = IdentityMap(self.path)
+        id_names.apply({"version": 5, "changes": {"Fahim": "1", "Tyler": "2"}})
+
+        client = FakeClient({1: {"Vinh": "3"}})
+        self.assertTrue(id_names.sync(client))
+        self.assertEqual(client.requests, [5, 0])
+        self.assertEqual((id_names.version, id_names.users), (1, {"Vinh": "3"}))
+
+    def test_seeded(self):
+        """
+        Function: sync the mapping shipped with the Agent Pi (version 0) for the first time
+
+        Assertion: the mapping of the Master Pi replaces it, labels the Master Pi does not have are dropped
+        """
+        id_names = IdentityMap(self.path)
+        id_names.apply({"version": 0, "changes": {"Fahim": "1", "Tyler": "2", "Vinh": "3"}})
+
+        client = FakeClient({1: {"Fahim": "1"}, 2: {"Vinh": "4"}})
+        self.assertTrue(id_names.sync(client))
+        self.assertEqual(client.requests, [0])
+        self.assertEqual((id_names.version, id_names.users), (2, {"Fahim": "1", "Vinh": "4"}))
+
+
+class ContinuousEnrolmentTest(unittest.TestCase):
+    """These tests check which embeddings of the logins are kept, and that they are kept apart from the embeddings of train.py
+    """
+
+    def setUp(self):
+        self.store = tempfile.mkdtemp()
+        self.random = np.random.RandomState(0)
+        self.people = {name: self.random.randn(128) for name in ("Fahim", "Tyler")}
+        stored = [self.people[name] + 0.3 * self.random.randn(128) for name in ("Fahim", "Tyler") for _ in range(5)]
+        model_store.save(self.store, stored, ["Fahim"] * 5 + ["Tyler"] * 5)
+
+    def faces(self, name, count):
+        """Embeddings of a person's face in new conditions (far enough from the stored ones)
+        """
+        return np.array([self.people[name] + 0.5 * self.random.randn(128) for _ in range(count)])
+
+    def test_select(self):
+        """
+        Function: learn from a login with a duplicate embedding, an embedding already in the store and a low probability
+
+        Assertion: only the new confident embeddings are kept, in their own store
+        """
+        learner = ContinuousEnrolment(self.store, min_proba=0.9)
+        faces = self.faces("Fahim", 3)
+        stored, _, _ = model_store.load(self.store)
+        vectors = np.vstack([faces, faces[:1] * 2, stored[:1]])
+        self.assertEqual(learner.add("Fahim", vectors, [0.95, 0.97, 0.5, 0.99, 0.99]), 2)
+
+        reloaded = ContinuousEnrolment(self.store)
+        self.assertEqual(reloaded.names, ["Fahim", "Fahim"])
+        self.assertEqual(reloaded.add("Fahim", faces[:1] + 1e-3, [1.0]), 0)
+        self.assertEqual(model_store.names(self.store), ["Fahim"] * 5 + ["Tyler"] * 5)
+
+    def test_cap(self):
+        """
+        Function: learn from 3 logins of a person with a cap of 4, and one login of another person
+
+        Assertion: the person keeps their 4 newest embeddings, the other person is not affected
+        """
+        learner = ContinuousEnrolment(self.store, cap=4)
+        learner.add("Tyler", self.faces("Tyler", 1), [1.0])
+        logins = [self.faces("Fahim", 2) for _ in range(3)]
+        for faces in logins:
+            learner.add("Fahim", faces, [1.0, 1.0])
+
+        vectors, names = learner.learned()
+        self.assertEqual(names, ["Tyler"] + ["Fahim"] * 4)
+        newest = np.vstack(logins[1:])
+        np.testing.assert_allclose(vectors[1:], newest / np.linalg.norm(newest, axis=1, keepdims=True), rtol=1e-5)
+
+    def test_learn(self):
+        """
+        Function: learn from a login in the background, with another embedder than the learned embeddings afterwards
+
+        Assertion: the recognizer is refreshed once the embeddings are kept, and learned embeddings of another embedder are not used
+        """
+        learner = ContinuousEnrolment(self.store)
+        refreshed = []
+        learner.learn("Tyler", self.faces("Tyler", 2), [1.0, 1.0], lambda: refreshed.append(learner.learned()[1])).join()
+        self.assertEqual(refreshed, [["Tyler", "Tyler"]])
+        self.assertEqual(ContinuousEnrolment(self.store, embedder="facenet").names, [])
+
+    def test_staleEncoder(self):
+        """
+        Function: refresh the SVC recognizer with a label encoder that knows every person of the store, then with one older than the store
+
+        Assertion: the SVC is fitted again with the learned embeddings, the older encoder leaves the recognizer as it is
+        """
+        learner = ContinuousEnrolment(self.store)
+        learner.add("Tyler", self.faces("Tyler", 2), [1.0, 1.0])
+        engine = RecognitionEngine(backend="svc", store=self.store)
+        engine.learner = learner
+
+        engine.le = LabelEncoder().fit(["Fahim", "Tyler"])
+        engine.refreshRecognizer()
+        self.assertEqual(list(engine.recognizer.classes_), [0, 1])
+
+        engine.recognizer = None
+        engine.le = LabelEncoder().fit(["Fahim"])
+        engine.refreshRecognizer()
+        self.assertIsNone(engine.recognizer)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# python3 face_benchmark.py --dataset dataset --output face_bench.json
+# python3 face_benchmark.py --video recording.mp4 --label Fahim --backend svc
+# python3 face_benchmark.py --profiles default,fast,cascade
+"""Measure the speed and the accuracy of facial recognition offline, without a camera or anyone in front of it.
+
+The images of the dataset (or the frames of a recorded video) go through the same path as the frames of the camera in RecognitionEngine:
+resize() like capture(), then detect(), embedFaces() and classify(). For each frame the largest face is the recognized person.
+The liveness check (liveness.py) is timed on the largest face too, and with a video the blinks it saw are reported.
+
+- latency of each stage (ms per frame: p50, p95, mean) and frames per second
+- accuracy and the confusion matrix (true person per row, recognized person per column, "no face" if no face was detected)
+- with --folds, the accuracy of a nearest-neighbour index cross-validated on the embeddings of the run.
+  The recognizer of output/ was trained on the dataset images, so its accuracy on them is optimistic
+- with --memory, the memory allocated per frame once the buffers are warm (tracemalloc), which should stay near zero (see buffers.py)
+- with --profiles, the same for several profiles of models.py, and a table of their latency/accuracy trade-off.
+  A profile with another embedder than the embeddings of output/ is only evaluated with cross-validation
+
+The images are read in sorted order and nothing is random, so two runs on the same machine and models only differ by timing noise.
+"""
+import argparse
+import itertools
+import tracemalloc
+import json
+import time
+import os
+import cv2
+import numpy as np
+from imutils import paths
+from sklearn.model_selection import StratifiedKFold
+from embedding_index import EmbeddingIndex
+from recognition import RecognitionEngine
+import model_store
+import models
+
+STAGES = ("resize", "detect", "embed", "classify", "liveness")
+NO_FACE = "no face"
+
+def datasetFrames(dataset):
+    """The images of a dataset, in sorted order
+
+    Arguments:
+        dataset {str} -- A directory with one folder of images per person
+
+    Returns:
+        generator -- (person, image) of each image
+    """
+    for imagePath in sorted(paths.list_images(dataset)):
+        image = cv2.imread(imagePath)
+        if image is not None:
+            yield imagePath.split(os.path.sep)[-2], image
+
+
+def videoFrames(path, label, every=1):
+    """The frames of a recorded video
+
+    Arguments:
+        path {str} -- The video file
+        label {str} -- The person in the video (None if unknown: no accuracy)
+
+    Keyword Arguments:
+        every {int} -- Keep one frame out of this many
+
+    Returns:
+        generator -- (person, frame) of each frame
+    """
+    video = cv2.VideoCapture(path)
+    if not video.isOpened():
+        raise IOError("cannot open {}".format(path))
+    try:
+        i = 0
+        while True:
+            (grabbed, frame) = video.read()
+            if not grabbed:
+                return
+            if i % every == 0:
+                yield label, frame
+            i += 1
+    finally:
+        video.release()
+
+
+def recognizeFrame(engine, frame):
+    """Recognize the largest face of a frame like the recognition loop, timing each stage
+
+    Arguments:
+        engine {RecognitionEngine} -- A loaded engine
+        frame {numpy.ndarray} -- A BGR image
+
+    Returns:
+        dict -- The recognized person (NO_FACE if no face was detected), its probability, its embedding and the seconds of each stage
+    """
+    times = dict.fromkeys(STAGES, 0.0)
+    begin = time.perf_counter()
+    frame = engine.resize(frame)
+    times["resize"] = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    boxes = engine.detect(frame)
+    times["detect"] = time.perf_counter() - begin
+    if not boxes:
+        engine.release(frame)
+        return {"name": NO_FACE, "proba": 0.0, "vec": None, "times": times}
+
+    begin = time.perf_counter()
+    vecs = engine.embedFaces([frame[startY:endY, startX:endX] for (startX, startY, endX, endY) in boxes])
+    times["embed"] = time.perf_counter() - begin
+
+    largest = max(range(len(boxes)), key=lambda i: (boxes[i][2] - boxes[i][0]) * (boxes[i][3] - boxes[i][1]))
+    if engine.args["liveness"]:
+        (startX, startY, endX, endY) = boxes[largest]
+        begin = time.perf_counter()
+        engine.liveness.update(frame[startY:endY, startX:endX])
+        times["liveness"] = time.perf_counter() - begin
+    engine.release(frame)
+
+    if engine.recognizer is None:
+        results = [("unknown", 0.0)] * len(vecs)
+    else:
+        begin = time.perf_counter()
+        results = [engine.classify(vec.reshape(1, -1)) for vec in vecs]
+        times["classify"] = time.perf_counter() - begin
+
+    name, proba = results[largest]
+    return {"name": str(name), "proba": float(proba), "vec": vecs[largest].reshape(1, -1), "times": times}
+
+
+def run(engine, frames, warmup=3):
+    """Recognize every frame
+
+    Arguments:
+        engine {RecognitionEngine} -- A loaded engine
+        frames {iterable} -- (person, frame) of each frame
+
+    Keyword Arguments:
+        warmup {int} -- Frames recognized first and left out of the results (the first forward passes are slower)
+
+    Returns:
+        list -- The result of recognizeFrame() of each frame, with its "label"
+    """
+    records = []
+    engine.liveness.reset()
+    for i, (label, frame) in enumerate(frames):
+        if i == 0:
+            for _ in range(warmup):
+                recognizeFrame(engine, frame)
+        record = recognizeFrame(engine, frame)
+        record["label"] = label
+        records.append(record)
+    return records
+
+
+def allocations(engine, frames, count=50):
+    """Memory allocated while recognizing frames, once the buffers are warm.
+    Each frame is recognized a first time untraced (to fill the buffers and caches), then count times with tracemalloc
+
+    Arguments:
+        engine {RecognitionEngine} -- A loaded engine
+        frames {list} -- (person, frame) of some frames
+
+    Keyword Arguments:
+        count {int} -- Number of traced frames
+
+    Returns:
+        dict -- KB allocated at the peak of a frame above what was allocated before it (p50, max), and KB still allocated after all the frames
+    """
+    images = [frame for (_, frame) in frames]
+    for image in images:
+        recognizeFrame(engine, image)
+
+    peaks = []
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    for i in range(count):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        recognizeFrame(engine, images[i % len(images)])
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    retained = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    return {"peak_kb_p50": float(np.percentile(peaks, 50)) / 1024, "peak_kb_max": max(peaks) / 1024.0, "retained_kb": retained / 1024.0}
+
+
+def latency(records):
+    """Latency of each stage and frames per second
+
+    Arguments:
+        records {list} -- The results of run()
+
+    Returns:
+        dict -- p50, p95 and mean milliseconds of each stage and of the whole frame, and the frames per second
+    """
+    times = {stage: np.array([record["times"][stage] for record in records]) * 1000 for stage in STAGES}
+    times["total"] = sum(times[stage] for stage in STAGES)
+    report = {stage: {"p50": float(np.percentile(ms, 50)), "p95": float(np.percentile(ms, 95)), "mean": float(ms.mean())}
+              for stage, ms in times.items()}
+    report["fps"] = 1000.0 / report["total"]["mean"]
+    return report
+
+
+def confusion(records):
+    """Confusion matrix of the frames whose person is known
+
+    Arguments:
+        records {list} -- The results of run()
+
+    Returns:
+        tuple -- The people (rows), the recognized names (columns) and the matrix (numpy.ndarray of counts)
+    """
+    records = [record for record in records if record["label"] is not None]
+    labels = sorted(set(record["label"] for record in records))
+    columns = labels + sorted(set(record["name"] for record in records) - set(labels) - {NO_FACE}) + [NO_FACE]
+    matrix = np.zeros((len(labels), len(columns)), dtype=int)
+    for record in records:
+        matrix[labels.index(record["label"]), columns.index(record["name"])] += 1
+    return labels, columns, matrix
+
+
+def crossValidate(records, folds, mode="centroid"):
+    """Accuracy of a nearest-neighbour index filled with the embeddings of some frames and tested on the others (stratified k-fold)
+
+    Arguments:
+        records {list} -- The results of run()
+        folds {int} -- Number of folds
+
+    Keyword Arguments:
+        mode {str} -- Mode of the EmbeddingIndex
+
+    Returns:
+        float -- The accuracy, counting frames without a face as errors
+    """
+    faces = [record for record in records if record["vec"] is not None and record["label"] is not None]
+    vectors = np.vstack([record["vec"] for record in faces])
+    names = np.array([record["label"] for record in faces])
+
+    correct = 0
+    for train, test in StratifiedKFold(folds, shuffle=True, random_state=0).split(vectors, names):
+        index = EmbeddingIndex(mode)
+        index.add(vectors[train], list(names[train]))
+        correct += sum(index.classify(vectors[i:i + 1])[0] == names[i] for i in test)
+    return correct / float(len([record for record in records if record["label"] is not None]))
+
+
+def printReport(report):
+    """Print a report as tables
+    """
+    print("{:>9} {:>9} {:>9} {:>9}".format("stage", "p50 ms", "p95 ms", "mean ms"))
+    for stage in STAGES + ("total",):
+        print("{:>9} {:>9.2f} {:>9.2f} {:>9.2f}".format(stage, report["latency"][stage]["p50"], report["latency"][stage]["p95"], report["latency"][stage]["mean"]))
+    print("[INFO] {} frames, {:.1f} FPS, a face found in {:.1f}%".format(report["frames"], report["latency"]["fps"], report["faces_found"] * 100))
+    if "blinks" in report:
+        print("[INFO] liveness: {} blinks seen in the video".format(report["blinks"]))
+    if "memory" in report:
+        print("[INFO] allocated per frame: {:.1f} KB (p50), {:.1f} KB (max), {:.1f} KB retained after {} frames".format(
+            report["memory"]["peak_kb_p50"], report["memory"]["peak_kb_max"], report["memory"]["retained_kb"], report["memory"]["frames"]))
+
+    if "cross_validated" in report:
+        print("[INFO] cross-validated accuracy ({} folds): {:.1f}%".format(report["folds"], report["cross_validated"] * 100))
+    if report["accuracy"] is None:
+        return
+    print("[INFO] accuracy: {:.1f}%".format(report["accuracy"] * 100))
+
+    columns = report["confusion"]["columns"]
+    width = max(len(name) for name in columns + report["confusion"]["labels"]) + 1
+    print(" " * width + "".join("{:>{}}".format(name, width) for name in columns))
+    for label, row in zip(report["confusion"]["labels"], report["confusion"]["matrix"]):
+        print("{:>{}}".format(label, width) + "".join("{:>{}}".format(count, width) for count in row))
+
+
+def printComparison(reports):
+    """Print the latency/accuracy trade-off of several profiles as a table
+    """
+    print("{:>10} {:>10} {:>9} {:>9} {:>8} {:>8} {:>9} {:>9}".format(
+        "profile", "detect ms", "embed ms", "total ms", "FPS", "faces", "accuracy", "cross-val"))
+    for report in reports:
+        percent = lambda value: "-" if value is None else "{:.1f}%".format(value * 100)
+        print("{:>10} {:>10.2f} {:>9.2f} {:>9.2f} {:>8.1f} {:>8} {:>9} {:>9}".format(
+            report["profile"], report["latency"]["detect"]["mean"], report["latency"]["embed"]["mean"], report["latency"]["total"]["mean"],
+            report["latency"]["fps"], percent(report["faces_found"]), percent(report["accuracy"]), percent(report.get("cross_validated"))))
+
+
+def benchmark(profile, args):
+    """Benchmark a profile
+
+    Arguments:
+        profile {str} -- A profile of models.py
+        args {argparse.Namespace} -- The options of the benchmark
+
+    Returns:
+        dict -- The report
+    """
+    backend = args.backend
+    if backend == "index" and model_store.embedder(args.store) != models.profile(profile)["embedder"]:
+        print("[INFO] {}: the embeddings of {} were computed with another embedder, cross-validation only".format(profile, args.store))
+        backend = "none"
+    engine = RecognitionEngine(profile=profile, backend=backend, store=args.store, headless=True)
+    engine.load()
+
+    frames = lambda: videoFrames(args.video, args.label, args.every) if args.video else datasetFrames(args.dataset)
+    records = run(engine, frames(), args.warmup)
+    if not records:
+        raise SystemExit("[INFO] no frame to benchmark")
+
+    report = {"profile": profile, "source": args.video or args.dataset, "backend": backend, "threads": args.threads,
+              "frames": len(records), "latency": latency(records), "accuracy": None,
+              "faces_found": sum(record["vec"] is not None for record in records) / float(len(records))}
+    if args.video and engine.args["liveness"]:
+        report["blinks"] = engine.liveness.blinks
+    if args.memory:
+        report["memory"] = dict(allocations(engine, list(itertools.islice(frames(), 10)), args.memory), frames=args.memory)
+    labels, columns, matrix = confusion(records)
+    if labels:
+        if backend != "none":
+            report["accuracy"] = float(np.trace(matrix[:, :len(labels)])) / matrix.sum()
+            report["confusion"] = {"labels": labels, "columns": columns, "matrix": matrix.tolist()}
+        if args.folds > 1 and len(labels) > 1:
+            report["folds"] = args.folds
+            report["cross_validated"] = crossValidate(records, args.folds)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark facial recognition offline on the dataset images or a recorded video")
+    parser.add_argument("--dataset", default="dataset", help="directory with one folder of images per person")
+    parser.add_argument("--video", help="recorded video to use instead of the dataset")
+    parser.add_argument("--label", help="person in the video (default: no accuracy)")
+    parser.add_argument("--every", type=int, default=1, help="keep one video frame out of this many")
+    parser.add_argument("--profiles", default="default", help="comma-separated profiles of models.py to compare")
+    parser.add_argument("--backend", default="index", help="recognizer of RecognitionEngine: index or svc")
+    parser.add_argument("--store", default="output", help="directory of the embeddings of the index backend")
+    parser.add_argument("--folds", type=int, default=5, help="cross-validate a nearest-neighbour index on the embeddings of the run (0: no)")
+    parser.add_argument("--threads", type=int, default=cv2.getNumThreads(), help="OpenCV threads")
+    parser.add_argument("--warmup", type=int, default=3, help="frames recognized before measuring")
+    parser.add_argument("--memory", type=int, default=0, help="trace the memory allocated by this many frames (0: no)")
+    parser.add_argument("--output", help="write the JSON report to this file (a list of reports with several profiles)")
+    args = parser.parse_args()
+
+    cv2.setNumThreads(args.threads)
+    reports = []
+    for profile in args.profiles.split(","):
+        print("[INFO] profile {}".format(profile))
+        reports.append(benchmark(profile, args))
+        printReport(reports[-1])
+    if len(reports) > 1:
+        printComparison(reports)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports[0] if len(reports) == 1 else reports, f, indent=2)
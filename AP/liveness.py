@@ -0,0 +1,109 @@
+from collections import deque
+import numpy as np
+import cv2
+
+class LivenessCheck:
+    """This class checks that a recognized face is a live person and not a photo held in front of the camera, by waiting for a blink.
+
+    It is only run once the face is recognized (see RecognitionEngine.recognize()), on the box the detector or the tracker already found in each frame:
+    - The face is cropped to size x size grayscale and normalised (zero mean, unit variance), so lighting changes do not count
+    - The eye band and the lower face (nose and mouth) are compared with the median of the last open-eye crops
+    - The eyes are closed when the eye band changes by more than min_change, ratio times more than the lower face, and loses more than drop of its contrast
+      (the eyelids cover the dark iris): a photo that is moved or tilted changes both bands alike and keeps its contrast. The blink is counted once the eyes are open again
+    - Optionally, a face whose crop is not sharp enough (variance of the Laplacian below min_sharpness) is refused, as prints and screens are often blurred
+
+    A face that does not blink within window frames is refused.
+    """
+    EYES = (0.28, 0.48)     # Rows of the eye band, as a share of the face box
+    LOWER = (0.55, 0.90)    # Rows of the nose and the mouth
+
+    def __init__(self, window=30, min_change=0.25, ratio=2.0, drop=0.2, history=5, min_sharpness=None, size=64):
+        """inits LivenessCheck
+
+        Keyword Arguments:
+            window {int} -- Frames to wait for a blink
+            min_change {float} -- Minimum change of the eye band for closed eyes (in standard deviations of the face)
+            ratio {float} -- Minimum ratio between the change of the eye band and of the lower face for closed eyes
+            drop {float} -- Minimum share of the contrast (standard deviation) of the eye band lost with closed eyes
+            history {int} -- Number of open-eye crops the eyes are compared with
+            min_sharpness {float} -- Minimum average variance of the Laplacian of the crops (None: not checked)
+            size {int} -- Width and height of the crops
+        """
+        self.window = window
+        self.min_change = min_change
+        self.ratio = ratio
+        self.drop = drop
+        self.history = history
+        self.min_sharpness = min_sharpness
+        self.size = size
+        self.eyes = slice(int(size * self.EYES[0]), int(size * self.EYES[1]))
+        self.lower = slice(int(size * self.LOWER[0]), int(size * self.LOWER[1]))
+        self.gray = np.empty((size, size), dtype=np.uint8)
+        self.reset()
+
+    def reset(self):
+        """Forget the face (for a new candidate)
+        """
+        self.crops = deque(maxlen=self.history)
+        self.closed = False
+        self.blinks = 0
+        self.frames = 0
+        self.sharpness = 0.0
+
+    def crop(self, face):
+        """Crop a face to the normalised grayscale crop the eyes are compared on
+
+        Arguments:
+            face {numpy.ndarray} -- The BGR face ROI (a view of the frame)
+
+        Returns:
+            numpy.ndarray -- The float32 crop
+        """
+        small = cv2.resize(face, (self.size, self.size), interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        crop = self.gray.astype(np.float32)
+        crop -= crop.mean()
+        crop /= max(float(crop.std()), 1e-6)
+        return crop
+
+    def update(self, face):
+        """Count a frame of the face
+
+        Arguments:
+            face {numpy.ndarray} -- The BGR face ROI
+
+        Returns:
+            bool -- True once the face blinked, False if it did not blink within window frames or is not sharp enough. None until then
+        """
+        crop = self.crop(face)
+        self.frames += 1
+        if self.min_sharpness is not None:
+            self.sharpness += float(cv2.Laplacian(self.gray, cv2.CV_32F).var())
+
+        closed = False
+        if len(self.crops) >= 3:
+            baseline = np.median(np.stack(self.crops), axis=0)
+            eyes = float(np.abs(crop[self.eyes] - baseline[self.eyes]).mean())
+            lower = float(np.abs(crop[self.lower] - baseline[self.lower]).mean())
+            contrast = float(crop[self.eyes].std()) / max(float(baseline[self.eyes].std()), 1e-6)
+            closed = eyes > self.min_change and eyes > self.ratio * lower and contrast < 1 - self.drop
+            if self.closed and not closed and contrast > 1 - self.drop / 2:
+                self.blinks += 1
+            self.closed = closed or (self.closed and contrast <= 1 - self.drop / 2)
+
+        # the baseline only keeps open eyes
+        if not self.closed:
+            self.crops.append(crop)
+        return self.decide()
+
+    def decide(self):
+        """The decision on the frames counted so far
+
+        Returns:
+            bool -- True if the face is live, False if it is refused, None if it is too early to tell
+        """
+        if self.blinks > 0:
+            return self.min_sharpness is None or self.sharpness / self.frames >= self.min_sharpness
+        if self.frames >= self.window:
+            return False
+        return None
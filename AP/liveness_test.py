@@ -0,0 +1,72 @@
+import unittest
+import numpy as np
+import cv2
+from liveness import LivenessCheck
+
+class LivenessTest(unittest.TestCase):
+    """These tests check that a face blinking is accepted and a photo moved in front of the camera is refused
+    """
+
+    def setUp(self):
+        self.random = np.random.RandomState(0)
+        background = self.random.randint(0, 255, (200, 200, 3)).astype(np.uint8)
+        self.face = cv2.GaussianBlur(background, (0, 0), 3)
+        for x in (60, 130):
+            cv2.circle(self.face, (x, 70), 12, (20, 20, 20), -1)
+        # the eyelids cover the irises
+        self.closed = self.face.copy()
+        cv2.rectangle(self.closed, (40, 58), (150, 82), (140, 140, 140), -1)
+
+    def noisy(self, image):
+        """The image with the noise of a camera
+        """
+        return np.clip(image.astype(int) + self.random.randint(-6, 7, image.shape), 0, 255).astype(np.uint8)
+
+    def test_blink(self):
+        """
+        Function: count frames with open eyes, 2 frames with closed eyes, then open eyes again
+
+        Assertion: no decision until the eyes open again, then the face is live
+        """
+        liveness = LivenessCheck()
+        decisions = [liveness.update(self.noisy(face)) for face in [self.face] * 6 + [self.closed] * 2]
+        self.assertEqual(decisions, [None] * 8)
+        decisions = [liveness.update(self.noisy(face)) for face in [self.face] * 2]
+        self.assertEqual(decisions[-1], True)
+        self.assertEqual(liveness.blinks, 1)
+
+    def test_photo(self):
+        """
+        Function: count the frames of a photo moved, scaled and lit differently in each frame
+
+        Assertion: no blink is seen and the face is refused after window frames
+        """
+        liveness = LivenessCheck(window=30)
+        decisions = []
+        for _ in range(30):
+            (dx, dy) = self.random.randint(-8, 9, 2)
+            scale = 1 + self.random.uniform(-0.1, 0.1)
+            moved = cv2.warpAffine(self.face, np.float32([[scale, 0, dx], [0, scale, dy]]), (200, 200), borderMode=cv2.BORDER_REFLECT)
+            decisions.append(liveness.update(self.noisy(cv2.convertScaleAbs(moved, alpha=self.random.uniform(0.8, 1.2)))))
+        self.assertEqual(decisions[:-1], [None] * 29)
+        self.assertEqual(decisions[-1], False)
+        self.assertEqual(liveness.blinks, 0)
+
+    def test_reset(self):
+        """
+        Function: refuse a face, reset the check, then blink
+
+        Assertion: the new face is live
+        """
+        liveness = LivenessCheck(window=5)
+        for _ in range(5):
+            liveness.update(self.noisy(self.face))
+        self.assertEqual(liveness.decide(), False)
+
+        liveness.reset()
+        for face in [self.face] * 3 + [self.closed] + [self.face]:
+            decision = liveness.update(self.noisy(face))
+        self.assertEqual(decision, True)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# python3 model_store.py --convert output/embeddings.pickle
+"""The on-disk format of the face embeddings in output/, replacing embeddings.pickle:
+
+- embeddings.npy -- float32 matrix of the L2-normalised embeddings, one row per face. It is memory-mapped when loaded, so it is neither copied nor parsed
+- labels.npy -- int32 index in the label table of each row
+- labels.json -- the label table: format version, embedding size, number of rows, the names of the people and the embedder (see models.py)
+
+Nothing is unpickled, so the files are safe to load from anywhere.
+labels.json is written last: a reader never sees labels.json describing half-written matrices.
+
+The embedding cache of train.py (output/embedding_cache/, see saveCache()) uses the same formats:
+
+- vectors.npy -- float32 matrix of the embeddings of the images where a face was found
+- hashes.npy -- uint8 matrix of the packed perceptual hashes of the images (see quality.py)
+- cache.json -- the models the embeddings were computed with, and for each image its modification time, size, SHA-1,
+  row in vectors.npy and quality scores with their row in hashes.npy
+"""
+import argparse
+import json
+import pickle
+import time
+import os
+import numpy as np
+
+VERSION = 1     # Version of the format, bumped on incompatible changes
+
+def paths(directory):
+    """The paths of the files of a store
+
+    Arguments:
+        directory {str} -- The directory of the store
+
+    Returns:
+        tuple -- The paths of embeddings.npy, labels.npy and labels.json
+    """
+    return (os.path.join(directory, "embeddings.npy"),
+            os.path.join(directory, "labels.npy"),
+            os.path.join(directory, "labels.json"))
+
+
+def writeArray(path, array):
+    """Write a .npy file (to a temporary file first, then renamed)
+
+    Arguments:
+        path {str} -- The path of the file
+        array {numpy.ndarray} -- The array
+    """
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, np.ascontiguousarray(array))
+    os.replace(path + ".tmp", path)
+
+
+def save(directory, vectors, names, embedder="openface"):
+    """Write embeddings and their names (each file is written to a temporary file first, then renamed)
+
+    Arguments:
+        directory {str} -- The directory of the store
+        vectors {numpy.ndarray} -- The embeddings, one per row (a list of embeddings is accepted)
+        names {list} -- The name of each embedding
+
+    Keyword Arguments:
+        embedder {str} -- The embedder of models.py the embeddings were computed with
+
+    Raises:
+        ValueError: There is no embedding to write
+    """
+    if len(names) == 0:
+        raise ValueError("no embedding to write to {}".format(directory))
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(len(names), -1)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    classes = sorted(set(names))
+    labels = np.array([classes.index(name) for name in names], dtype=np.int32)
+    table = {"version": VERSION, "dim": int(vectors.shape[1]), "count": len(names),
+             "classes": classes, "embedder": embedder, "created": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+    os.makedirs(directory, exist_ok=True)
+    embeddingsPath, labelsPath, tablePath = paths(directory)
+    for path, array in ((embeddingsPath, vectors), (labelsPath, labels)):
+        writeArray(path, array)
+    with open(tablePath + ".tmp", "w") as f:
+        json.dump(table, f, indent=1)
+    os.replace(tablePath + ".tmp", tablePath)
+
+
+def load(directory, mmap=True):
+    """Read embeddings and their names
+
+    Arguments:
+        directory {str} -- The directory of the store
+
+    Keyword Arguments:
+        mmap {bool} -- Memory-map the embeddings read-only instead of reading them into memory
+
+    Raises:
+        ValueError: The store has another version or its files do not match
+
+    Returns:
+        tuple -- The embeddings (one per row), the label of each row (index in the names) and the names of the people
+    """
+    embeddingsPath, labelsPath, tablePath = paths(directory)
+    with open(tablePath) as f:
+        table = json.load(f)
+    if table.get("version") != VERSION:
+        raise ValueError("{} has version {}, expected {}".format(tablePath, table.get("version"), VERSION))
+
+    vectors = np.load(embeddingsPath, mmap_mode="r" if mmap else None, allow_pickle=False)
+    labels = np.load(labelsPath, allow_pickle=False)
+    if vectors.shape != (table["count"], table["dim"]) or len(labels) != table["count"]:
+        raise ValueError("{} does not match the embeddings of {}".format(tablePath, directory))
+    return vectors, labels, table["classes"]
+
+
+def embedder(directory):
+    """The embedder the embeddings of a store were computed with
+
+    Arguments:
+        directory {str} -- The directory of the store
+
+    Returns:
+        str -- The name of the embedder in models.py ("openface" for stores written before it was recorded)
+    """
+    with open(paths(directory)[2]) as f:
+        return json.load(f).get("embedder", "openface")
+
+
+def names(directory):
+    """The name of each embedding of a store
+
+    Arguments:
+        directory {str} -- The directory of the store
+
+    Returns:
+        list -- The names, in the order of the rows
+    """
+    _, labels, classes = load(directory)
+    return [classes[label] for label in labels]
+
+
+def saveCache(directory, models, images):
+    """Write the embedding cache of train.py. cache.json is written last, like labels.json
+
+    Arguments:
+        directory {str} -- The directory of the cache
+        models {tuple} -- The detector, embedding model and confidence the embeddings were computed with
+        images {dict} -- For each image path, its "mtime", "size", "hash" and, once computed, its "vec" (None if no face was found)
+            and its "quality" ("phash", "sharpness" and "brightness", None if it is unreadable)
+    """
+    vectors, hashes, entries = [], [], {}
+    for (imagePath, image) in images.items():
+        entry = {"mtime": image["mtime"], "size": image["size"], "hash": image["hash"]}
+        if "vec" in image:
+            entry["vec"] = None
+            if image["vec"] is not None:
+                entry["vec"] = len(vectors)
+                vectors.append(np.asarray(image["vec"], dtype=np.float32).ravel())
+        if "quality" in image:
+            entry["quality"] = None
+            if image["quality"] is not None:
+                entry["quality"] = dict(image["quality"], phash=len(hashes))
+                hashes.append(np.asarray(image["quality"]["phash"], dtype=np.uint8))
+        entries[imagePath] = entry
+
+    os.makedirs(directory, exist_ok=True)
+    writeArray(os.path.join(directory, "vectors.npy"), np.stack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32))
+    writeArray(os.path.join(directory, "hashes.npy"), np.stack(hashes) if hashes else np.zeros((0, 0), dtype=np.uint8))
+    path = os.path.join(directory, "cache.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump({"version": VERSION, "models": list(models), "images": entries}, f)
+    os.replace(path + ".tmp", path)
+
+
+def loadCache(directory, models):
+    """Read the embedding cache of train.py. It is dropped if it was made with other models
+
+    Arguments:
+        directory {str} -- The directory of the cache
+        models {tuple} -- The detector, embedding model and confidence the embeddings are computed with
+
+    Returns:
+        dict -- For each image path, the entry given to saveCache(). Empty if there is no cache
+    """
+    path = os.path.join(directory, "cache.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        cache = json.load(f)
+    if cache.get("version") != VERSION or cache.get("models") != list(models):
+        print("[INFO] the models changed, every image is processed again")
+        return {}
+
+    vectors = np.load(os.path.join(directory, "vectors.npy"), allow_pickle=False)
+    hashes = np.load(os.path.join(directory, "hashes.npy"), allow_pickle=False)
+    images = {}
+    for (imagePath, entry) in cache["images"].items():
+        if entry.get("vec") is not None:
+            entry["vec"] = vectors[entry["vec"]]
+        if entry.get("quality") is not None:
+            entry["quality"]["phash"] = hashes[entry["quality"]["phash"]]
+        images[imagePath] = entry
+    return images
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert embeddings.pickle (from an older train.py) into the binary store")
+    parser.add_argument("--convert", default="output/embeddings.pickle", help="pickled embeddings to convert")
+    parser.add_argument("--output", default="output", help="directory of the store")
+    args = parser.parse_args()
+
+    data = pickle.loads(open(args.convert, "rb").read())
+    save(args.output, data["embeddings"], data["names"])
+    print("[INFO] {} embeddings written to {}".format(len(data["names"]), args.output))
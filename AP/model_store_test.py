@@ -0,0 +1,130 @@
+import unittest
+import tempfile
+import json
+import numpy as np
+import model_store
+from embedding_index import EmbeddingIndex
+
+class ModelStoreTest(unittest.TestCase):
+    """These tests check the binary store of the embeddings and loading the nearest-neighbour index from it
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        rng = np.random.RandomState(0)
+        self.vectors = rng.randn(6, 128)
+        self.names = ["Vinh", "Fahim", "Vinh", "Tyler", "Fahim", "Vinh"]
+
+    def test_roundtrip(self):
+        """
+        Function: save embeddings and load them back
+
+        Assertion: the embeddings are memory-mapped, L2-normalised and in the same order as their names
+        """
+        model_store.save(self.directory, self.vectors, self.names)
+        vectors, labels, classes = model_store.load(self.directory)
+
+        self.assertIsInstance(vectors, np.memmap)
+        self.assertEqual(vectors.dtype, np.float32)
+        self.assertEqual(classes, ["Fahim", "Tyler", "Vinh"])
+        self.assertEqual(model_store.names(self.directory), self.names)
+        expected = self.vectors / np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        self.assertTrue(np.allclose(vectors, expected, atol=1e-6))
+
+    def test_embedder(self):
+        """
+        Function: save embeddings of another embedder, then remove the embedder from the label table (like a store of an older train.py)
+
+        Assertion: the embedder is read back, and stores that do not record it are OpenFace ones
+        """
+        model_store.save(self.directory, self.vectors, self.names, embedder="facenet")
+        self.assertEqual(model_store.embedder(self.directory), "facenet")
+
+        tablePath = model_store.paths(self.directory)[2]
+        table = json.load(open(tablePath))
+        del table["embedder"]
+        json.dump(table, open(tablePath, "w"))
+        self.assertEqual(model_store.embedder(self.directory), "openface")
+
+    def test_version(self):
+        """
+        Function: load a store written with another version of the format
+
+        Assertion: ValueError is raised
+        """
+        model_store.save(self.directory, self.vectors, self.names)
+        tablePath = model_store.paths(self.directory)[2]
+        table = json.load(open(tablePath))
+        table["version"] = model_store.VERSION + 1
+        json.dump(table, open(tablePath, "w"))
+
+        with self.assertRaises(ValueError):
+            model_store.load(self.directory)
+
+    def test_empty(self):
+        """
+        Function: save a store with no embedding (no face found in the dataset)
+
+        Assertion: ValueError is raised and nothing is written
+        """
+        with self.assertRaises(ValueError):
+            model_store.save(self.directory, [], [])
+        with self.assertRaises(FileNotFoundError):
+            model_store.load(self.directory)
+
+    def test_cache(self):
+        """
+        Function: save the embedding cache of 4 images (embedded, no face, unreadable, not scored yet) and load it with the same and with other models
+
+        Assertion: every entry comes back as it was saved, the cache is dropped if the models changed
+        """
+        phash = np.arange(32, dtype=np.uint8)
+        images = {"dataset/Vinh/1.jpg": {"mtime": 1589000000.25, "size": 100, "hash": "a", "vec": self.vectors[0].astype(np.float32),
+                                         "quality": {"phash": phash, "sharpness": 20.5, "brightness": 100.0}},
+                  "dataset/Vinh/2.jpg": {"mtime": 1589000001.5, "size": 200, "hash": "b", "vec": None,
+                                         "quality": {"phash": phash[::-1], "sharpness": 3.0, "brightness": 90.0}},
+                  "dataset/Tyler/1.jpg": {"mtime": 1589000002.0, "size": 300, "hash": "c", "quality": None},
+                  "dataset/Tyler/2.jpg": {"mtime": 1589000003.0, "size": 400, "hash": "d"}}
+        models = ("dnn", "openface", 0.5)
+        model_store.saveCache(self.directory, models, images)
+
+        loaded = model_store.loadCache(self.directory, models)
+        self.assertEqual(sorted(loaded), sorted(images))
+        for (imagePath, image) in images.items():
+            entry = loaded[imagePath]
+            self.assertEqual(set(entry), set(image))
+            self.assertEqual((entry["mtime"], entry["size"], entry["hash"]), (image["mtime"], image["size"], image["hash"]))
+            if image.get("vec") is not None:
+                self.assertTrue(np.array_equal(entry["vec"], image["vec"]))
+            if image.get("quality") is not None:
+                self.assertTrue(np.array_equal(entry["quality"]["phash"], image["quality"]["phash"]))
+                self.assertEqual(entry["quality"]["sharpness"], image["quality"]["sharpness"])
+        self.assertIsNone(loaded["dataset/Vinh/2.jpg"]["vec"])
+        self.assertIsNone(loaded["dataset/Tyler/1.jpg"]["quality"])
+
+        self.assertEqual(model_store.loadCache(self.directory, ("dnn", "facenet", 0.5)), {})
+
+    def test_index(self):
+        """
+        Function: save an index, load it and enrol a new person
+
+        Assertion: the loaded index recognizes the same people, enrolling copies the read-only matrix and leaves the files untouched
+        """
+        index = EmbeddingIndex()
+        index.add(self.vectors, self.names)
+        index.save(self.directory)
+
+        loaded = EmbeddingIndex.load(self.directory)
+        self.assertEqual(loaded.names, self.names)
+        for vec in self.vectors:
+            self.assertEqual(loaded.classify(vec.reshape(1, -1))[0], index.classify(vec.reshape(1, -1))[0])
+
+        loaded.add(np.ones(128), "Nobody")
+        self.assertEqual(loaded.size, 7)
+        self.assertEqual(len(model_store.names(self.directory)), 6)
+
+        loaded.remove("Vinh")
+        self.assertEqual(loaded.names, ["Fahim", "Tyler", "Fahim", "Nobody"])
+
+if __name__ == "__main__":
+    unittest.main()
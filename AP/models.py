@@ -0,0 +1,178 @@
+"""The face detectors and face embedding models facial recognition can run, and the profiles combining them.
+
+A profile picks a detector, an embedder, an optional cascade pre-filter (the DNN detector is skipped on frames where the cascade finds no face,
+as long as no face is being followed) and the OpenCV DNN backend and target to run the networks on.
+Older Pis of a fleet can use a faster profile than the others, with CARSHARE_FACE_PROFILE=<profile> (recognition.py) and train.py --profile <profile>.
+
+Embeddings of different embedders cannot be compared: the embedder is recorded with the embeddings (see model_store.py), and recognition.py refuses a store
+computed with another embedder. Profiles sharing an embedder share their embeddings.
+"""
+import os
+import cv2
+
+# Face detectors. The model files are relative to the Agent Pi directory
+DETECTORS = {
+    # ResNet-10 SSD (Caffe, FP32)
+    "ssd": {"type": "caffe",
+            "config": "face_detection_model/deploy.prototxt",
+            "weights": "face_detection_model/res10_300x300_ssd_iter_140000.caffemodel",
+            "mean": (104.0, 177.0, 123.0)},
+    # The same SSD with 8-bit quantized weights (opencv_face_detector_uint8.pb of the OpenCV samples, 2.7 MB instead of 10.7 MB)
+    "ssd-uint8": {"type": "tensorflow",
+                  "config": "face_detection_model/opencv_face_detector.pbtxt",
+                  "weights": "face_detection_model/opencv_face_detector_uint8.pb",
+                  "mean": (104.0, 177.0, 123.0)},
+    # Cascades: no DNN, only frontal faces. Also used as pre-filters
+    "haar": {"type": "cascade", "weights": "haarcascade_frontalface_default.xml"},
+}
+
+# Face embedding models, all of them give 128-d embeddings
+EMBEDDERS = {
+    # OpenFace nn4.small2 (Torch, FP32)
+    "openface": {"type": "torch", "weights": "openface_nn4.small2.v1.t7",
+                 "size": 96, "scale": 1.0 / 255, "mean": (0.0, 0.0, 0.0), "swapRB": True},
+}
+
+PROFILES = {
+    # The models of the original code
+    "default": {"detector": "ssd", "embedder": "openface", "prefilter": None, "backend": "opencv", "target": "cpu"},
+    # Pi 3 and older Pi 4: quantized detector, skipped on frames without a face
+    "fast": {"detector": "ssd-uint8", "embedder": "openface", "prefilter": "haar", "backend": "opencv", "target": "cpu"},
+    # Pi Zero 2 and Pi 3: no DNN detector at all
+    "cascade": {"detector": "haar", "embedder": "openface", "prefilter": None, "backend": "opencv", "target": "cpu"},
+    # Intel Neural Compute Stick 2 (OpenVINO)
+    "ncs2": {"detector": "ssd", "embedder": "openface", "prefilter": None, "backend": "inference_engine", "target": "myriad"},
+}
+
+# Names of the OpenCV DNN backends and targets
+BACKENDS = {"default": "DNN_BACKEND_DEFAULT", "opencv": "DNN_BACKEND_OPENCV", "inference_engine": "DNN_BACKEND_INFERENCE_ENGINE", "cuda": "DNN_BACKEND_CUDA"}
+TARGETS = {"cpu": "DNN_TARGET_CPU", "cpu_fp16": "DNN_TARGET_CPU_FP16", "opencl": "DNN_TARGET_OPENCL", "opencl_fp16": "DNN_TARGET_OPENCL_FP16",
+           "myriad": "DNN_TARGET_MYRIAD", "cuda": "DNN_TARGET_CUDA", "cuda_fp16": "DNN_TARGET_CUDA_FP16"}
+
+
+def profile(name="default", detector=None, embedder=None):
+    """The models of a profile
+
+    Arguments:
+        name {str} -- A name of PROFILES
+
+    Keyword Arguments:
+        detector {str} -- A name of DETECTORS instead of the detector of the profile
+        embedder {str} -- A name of EMBEDDERS instead of the embedder of the profile
+
+    Raises:
+        ValueError: A name is not in the registry
+
+    Returns:
+        dict -- The profile, with the "detector", "embedder" and "prefilter" names, and their "detector_spec", "embedder_spec" and "prefilter_spec"
+    """
+    if name not in PROFILES:
+        raise ValueError("unknown profile {}, expected one of {}".format(name, ", ".join(sorted(PROFILES))))
+    models = dict(PROFILES[name], name=name)
+    models["detector"] = detector or models["detector"]
+    models["embedder"] = embedder or models["embedder"]
+
+    for key, registry in (("detector", DETECTORS), ("embedder", EMBEDDERS), ("prefilter", DETECTORS)):
+        if models[key] is not None and models[key] not in registry:
+            raise ValueError("unknown {} {}, expected one of {}".format(key, models[key], ", ".join(sorted(registry))))
+        models[key + "_spec"] = registry.get(models[key])
+    if models["prefilter_spec"] is not None and models["prefilter_spec"]["type"] != "cascade":
+        raise ValueError("the pre-filter must be a cascade, not {}".format(models["prefilter"]))
+    return models
+
+
+def setTarget(net, backend, target):
+    """Run a network on an OpenCV DNN backend and target
+
+    Arguments:
+        net {cv2.dnn.Net} -- The network
+        backend {str} -- A name of BACKENDS
+        target {str} -- A name of TARGETS
+
+    Raises:
+        ValueError: The name is unknown, or this OpenCV does not have the backend or the target
+    """
+    for names, value in ((BACKENDS, backend), (TARGETS, target)):
+        if value not in names or not hasattr(cv2.dnn, names[value]):
+            raise ValueError("{} is not available with OpenCV {}".format(value, cv2.__version__))
+    net.setPreferableBackend(getattr(cv2.dnn, BACKENDS[backend]))
+    net.setPreferableTarget(getattr(cv2.dnn, TARGETS[target]))
+
+
+def loadCascade(spec):
+    """Load a cascade classifier. A file that is not found is looked for in the cascades shipped with OpenCV
+
+    Arguments:
+        spec {dict} -- A cascade of DETECTORS
+
+    Returns:
+        cv2.CascadeClassifier -- The cascade
+    """
+    if not hasattr(cv2, "CascadeClassifier"):
+        raise ValueError("OpenCV {} has no cascade classifier".format(cv2.__version__))
+    path = spec["weights"]
+    if not os.path.exists(path) and hasattr(cv2, "data"):
+        path = os.path.join(cv2.data.haarcascades, os.path.basename(path))
+    cascade = cv2.CascadeClassifier(path)
+    if cascade.empty():
+        raise IOError("cannot load the cascade {}".format(spec["weights"]))
+    return cascade
+
+
+def loadDetector(models):
+    """Load the face detector of a profile
+
+    Arguments:
+        models {dict} -- A profile (see profile())
+
+    Returns:
+        object -- A cv2.dnn.Net, or a cv2.CascadeClassifier for a cascade
+    """
+    spec = models["detector_spec"]
+    if spec["type"] == "cascade":
+        return loadCascade(spec)
+    if spec["type"] == "caffe":
+        net = cv2.dnn.readNetFromCaffe(spec["config"], spec["weights"])
+    else:
+        net = cv2.dnn.readNetFromTensorflow(spec["weights"], spec["config"])
+    setTarget(net, models["backend"], models["target"])
+    return net
+
+
+def loadEmbedder(models):
+    """Load the face embedding model of a profile
+
+    Arguments:
+        models {dict} -- A profile (see profile())
+
+    Returns:
+        cv2.dnn.Net -- The network
+    """
+    spec = models["embedder_spec"]
+    if spec["type"] == "torch":
+        net = cv2.dnn.readNetFromTorch(spec["weights"])
+    else:
+        net = cv2.dnn.readNetFromONNX(spec["weights"])
+    setTarget(net, models["backend"], models["target"])
+    return net
+
+
+def cascadeFaces(cascade, gray, scale=1.0, minSize=20):
+    """Find faces with a cascade
+
+    Arguments:
+        cascade {cv2.CascadeClassifier} -- The cascade
+        gray {numpy.ndarray} -- A grayscale image
+
+    Keyword Arguments:
+        scale {float} -- Shrink the image by this factor first (faster, misses the smallest faces)
+        minSize {int} -- Smallest face, in pixels of gray
+
+    Returns:
+        list -- The (startX, startY, endX, endY) box of each face, in pixels of gray
+    """
+    if scale != 1.0:
+        gray = cv2.resize(gray, (int(gray.shape[1] / scale), int(gray.shape[0] / scale)), interpolation=cv2.INTER_AREA)
+    size = max(int(minSize / scale), 8)
+    faces = cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(size, size))
+    return [(int(x * scale), int(y * scale), int((x + w) * scale), int((y + h) * scale)) for (x, y, w, h) in faces]
@@ -0,0 +1,60 @@
+import unittest
+import cv2
+import models
+
+class FakeNet:
+    """Records the backend and the target it is set to, like a cv2.dnn.Net
+    """
+    def setPreferableBackend(self, backend):
+        self.backend = backend
+
+    def setPreferableTarget(self, target):
+        self.target = target
+
+class ModelsTest(unittest.TestCase):
+    """These tests check the profiles of the model registry (no model file needed)
+    """
+
+    def test_profiles(self):
+        """
+        Function: resolve every profile
+
+        Assertion: each one names a known detector and embedder, and its pre-filter is a cascade
+        """
+        for name in models.PROFILES:
+            profile = models.profile(name)
+            self.assertIn(profile["detector"], models.DETECTORS)
+            self.assertIn(profile["embedder"], models.EMBEDDERS)
+            self.assertEqual(profile["embedder_spec"]["size"], 96)
+            if profile["prefilter"] is not None:
+                self.assertEqual(profile["prefilter_spec"]["type"], "cascade")
+
+    def test_overrides(self):
+        """
+        Function: resolve the default profile with another detector, then with unknown names
+
+        Assertion: the detector is replaced, unknown names raise ValueError
+        """
+        profile = models.profile("default", detector="ssd-uint8")
+        self.assertEqual((profile["detector"], profile["embedder"]), ("ssd-uint8", "openface"))
+        self.assertEqual(profile["detector_spec"]["type"], "tensorflow")
+
+        with self.assertRaises(ValueError):
+            models.profile("turbo")
+        with self.assertRaises(ValueError):
+            models.profile("default", embedder="facenet")
+
+    def test_target(self):
+        """
+        Function: set a network to the CPU, then to an unknown target
+
+        Assertion: the OpenCV constants are set, the unknown target raises ValueError
+        """
+        net = FakeNet()
+        models.setTarget(net, "opencv", "cpu")
+        self.assertEqual((net.backend, net.target), (cv2.dnn.DNN_BACKEND_OPENCV, cv2.dnn.DNN_TARGET_CPU))
+        with self.assertRaises(ValueError):
+            models.setTarget(net, "opencv", "tpu")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,214 @@
+from collections import deque
+import threading
+import time
+
+class DropOldestQueue:
+    """A bounded queue between two stages of the pipeline.
+    When it is full, putting a new item drops the oldest one instead of blocking, so a slow stage always works on the newest frame.
+    """
+
+    def __init__(self, maxsize=1, on_drop=None):
+        """inits DropOldestQueue
+
+        Keyword Arguments:
+            maxsize {int} -- The number of items kept
+            on_drop {function} -- Called with each item that is dropped or cleared (to give its frame buffer back)
+        """
+        self.items = deque(maxlen=maxsize)
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.on_drop = on_drop
+
+    def put(self, item):
+        """Add an item, dropping the oldest one if the queue is full
+
+        Arguments:
+            item {object} -- The item
+        """
+        with self.condition:
+            if len(self.items) == self.items.maxlen:
+                self.dropped += 1
+                if self.on_drop is not None:
+                    self.on_drop(self.items[0])
+            self.items.append(item)
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """Remove and return the oldest item, waiting for one if the queue is empty
+
+        Keyword Arguments:
+            timeout {float} -- Seconds to wait (default: wait forever)
+
+        Returns:
+            object -- The item. None if no item came before the timeout
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.items, timeout):
+                return None
+            return self.items.popleft()
+
+    def clear(self):
+        """Remove every item
+        """
+        with self.condition:
+            if self.on_drop is not None:
+                for item in self.items:
+                    self.on_drop(item)
+            self.items.clear()
+
+
+class Stage(threading.Thread):
+    """A stage of the pipeline running in its own thread.
+    It takes an item from its input queue (if it has one), processes it and puts the result (if not None) in its output queue.
+    It counts the items it processed and the time it spent on them.
+    If work raises, the exception is kept in error and the thread stops (instead of dying silently).
+    """
+
+    def __init__(self, name, work, inbox, outbox, on_error=None):
+        """inits Stage
+
+        Arguments:
+            name {str} -- The name of the stage (for the report)
+            work {function} -- Processes an item and returns the result. It is called without argument for the first stage
+            inbox {DropOldestQueue} -- The input queue. None for the first stage
+            outbox {DropOldestQueue} -- The output queue
+
+        Keyword Arguments:
+            on_error {function} -- Called with the stage when work raises
+        """
+        super().__init__(name=name, daemon=True)
+        self.work = work
+        self.inbox = inbox
+        self.outbox = outbox
+        self.running = threading.Event()
+        self.processed = 0
+        self.busy = 0.0
+        self.started = None
+        self.error = None
+        self.on_error = on_error
+
+    def run(self):
+        """Process items until stop() is called or work raises
+        """
+        self.started = time.time()
+        self.running.set()
+        try:
+            while self.running.is_set():
+                if self.inbox is None:
+                    item = ()
+                else:
+                    item = self.inbox.get(timeout=0.1)
+                    if item is None:
+                        continue
+                    item = (item,)
+
+                begin = time.time()
+                result = self.work(*item)
+                if result is None:
+                    continue
+                self.busy += time.time() - begin
+                self.processed += 1
+                self.outbox.put(result)
+        except Exception as error:
+            self.error = error
+            self.running.clear()
+            if self.on_error is not None:
+                self.on_error(self)
+
+    def stop(self):
+        """Ask the thread to finish after its current item and wait for it
+        """
+        self.running.clear()
+        if self.is_alive():
+            self.join()
+
+    def stats(self):
+        """Throughput of the stage
+
+        Returns:
+            dict -- The number of items processed, items per second, and the share of the time the stage was busy
+        """
+        elapsed = max(time.time() - (self.started or time.time()), 1e-9)
+        return {"processed": self.processed,
+                "fps": self.processed / elapsed,
+                "busy": self.busy / elapsed}
+
+
+class RecognitionPipeline:
+    """This class runs facial recognition as 3 stages, each in its own thread, so they work on different frames at the same time (on different cores of the Pi):
+
+    - capture: read the newest frame from the video stream and resize it
+    - detect: find the faces in the frame
+    - embed: compute the embedding of each face and recognize it
+
+    The stages are connected by bounded queues that drop their oldest item, so frames that are already stale are skipped instead of processed.
+    The frames they drop are given back to the engine (engine.release()), so their buffers are reused.
+    The results are (frame, faces) tuples in the results queue, faces being a list of (box, name, probability, embedding).
+    If a stage fails, every stage stops and check() raises the exception of the stage in the thread consuming the results.
+    """
+
+    def __init__(self, engine, queue_size=1):
+        """inits RecognitionPipeline
+
+        Arguments:
+            engine {RecognitionEngine} -- Provides the frames, the detector and the embedder (already started)
+
+        Keyword Arguments:
+            queue_size {int} -- The number of items each queue keeps
+        """
+        self.engine = engine
+        self.frames = DropOldestQueue(queue_size, engine.release)
+        self.detections = DropOldestQueue(queue_size, lambda detection: engine.release(detection[0]))
+        self.results = DropOldestQueue(queue_size, lambda result: engine.release(result[0]))
+        self.stages = []
+        self.error = None
+
+    def start(self):
+        """Start the threads of the 3 stages
+        """
+        self.stop()
+        for queue in (self.frames, self.detections, self.results):
+            queue.clear()
+
+        self.error = None
+        self.stages = [Stage("capture", self.engine.capture, None, self.frames, self.fail),
+                       Stage("detect", self.engine.detectFrame, self.frames, self.detections, self.fail),
+                       Stage("embed", self.engine.recognizeFaces, self.detections, self.results, self.fail)]
+        for stage in self.stages:
+            stage.start()
+
+    def stop(self):
+        """Stop the threads of the 3 stages
+        """
+        for stage in self.stages:
+            stage.stop()
+
+    def fail(self, stage):
+        """Stop every stage after one of them failed, and keep its exception for check()
+
+        Arguments:
+            stage {Stage} -- The stage that failed
+        """
+        print("[INFO] the {} stage failed: {!r}".format(stage.name, stage.error))
+        if self.error is None:
+            self.error = stage.error
+        for other in self.stages:
+            other.running.clear()
+
+    def check(self):
+        """Raise the exception of the stage that failed, if any
+
+        Raises:
+            Exception -- The exception raised by the work of the stage
+        """
+        if self.error is not None:
+            raise self.error
+
+    def report(self):
+        """Print the throughput of each stage and the number of frames skipped
+        """
+        dropped = {"capture": self.frames.dropped, "detect": self.detections.dropped, "embed": self.results.dropped}
+        for stage in self.stages:
+            stats = stage.stats()
+            print("[INFO] {:>7}: {} frames, {:.2f} FPS, busy {:.0f}%, {} stale frames skipped".format(
+                stage.name, stats["processed"], stats["fps"], stats["busy"] * 100, dropped[stage.name]))
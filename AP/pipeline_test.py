@@ -0,0 +1,101 @@
+import unittest
+import time
+from pipeline import DropOldestQueue, Stage, RecognitionPipeline
+
+class PipelineTest(unittest.TestCase):
+    """These tests check the queues and stages of the recognition pipeline (no camera or model needed)
+    """
+
+    def test_dropOldest(self):
+        """
+        Function: put 3 items in a queue of size 2
+
+        Assertion: the oldest item is dropped and counted, the others come out in order
+        """
+        queue = DropOldestQueue(2)
+        for item in (1, 2, 3):
+            queue.put(item)
+
+        self.assertEqual(queue.dropped, 1)
+        self.assertEqual(queue.get(), 2)
+        self.assertEqual(queue.get(), 3)
+        self.assertIsNone(queue.get(timeout=0.01))
+
+    def test_onDrop(self):
+        """
+        Function: put 3 items in a queue of size 1 with a drop callback, then clear it
+
+        Assertion: the callback gets every item that never comes out of the queue
+        """
+        dropped = []
+        queue = DropOldestQueue(1, dropped.append)
+        for item in (1, 2, 3):
+            queue.put(item)
+        queue.clear()
+        self.assertEqual(dropped, [1, 2, 3])
+
+    def test_stages(self):
+        """
+        Function: connect a counting first stage to a doubling second stage
+
+        Assertion: the results are doubled and in order, stale items are skipped rather than queued, and the stages count their work
+        """
+        counter = iter(range(1, 1000000))
+        frames = DropOldestQueue(1)
+        results = DropOldestQueue(1000)
+        first = Stage("capture", lambda: next(counter), None, frames)
+        second = Stage("double", lambda x: x * 2, frames, results)
+
+        first.start()
+        second.start()
+        time.sleep(0.2)
+        first.stop()
+        second.stop()
+
+        values = []
+        while results.items:
+            values.append(results.get())
+        self.assertTrue(values)
+        self.assertEqual(values, sorted(values))
+        self.assertTrue(all(value % 2 == 0 for value in values))
+        self.assertEqual(second.stats()["processed"], len(values))
+        self.assertGreaterEqual(first.stats()["processed"], len(values))
+
+    def test_failure(self):
+        """
+        Function: run a pipeline whose detect stage raises from the third frame on
+
+        Assertion: every stage stops and check() raises the exception of the detect stage
+        """
+        class Engine:
+            def __init__(self):
+                self.frames = iter(range(1000000))
+
+            def capture(self):
+                time.sleep(0.01)
+                return next(self.frames)
+
+            def detectFrame(self, frame):
+                if frame >= 2:
+                    raise ValueError("detector failed")
+                return (frame, [])
+
+            def recognizeFaces(self, detection):
+                return detection
+
+            def release(self, frame):
+                pass
+
+        pipeline = RecognitionPipeline(Engine())
+        pipeline.start()
+        for stage in pipeline.stages:
+            stage.join(2)
+
+        self.assertFalse(any(stage.is_alive() for stage in pipeline.stages))
+        self.assertIsInstance(pipeline.stages[1].error, ValueError)
+        with self.assertRaisesRegex(ValueError, "detector failed"):
+            pipeline.check()
+        pipeline.stop()
+
+if __name__ == '__main__':
+    unittest.main()
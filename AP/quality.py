@@ -0,0 +1,128 @@
+"""Skip the dataset images that would add nothing to training, before the DNNs run on them (see train.py):
+
+- near-duplicates, such as the burst shots of a webcam (WIN_..._Pro.jpg and WIN_..._Pro (2).jpg): images of a person whose perceptual hashes
+  differ by at most max_distance bits of HASH * HASH. The sharpest image of each group is kept
+- blurry images: the variance of the Laplacian is below min_sharpness
+- images too dark or too bright: their mean brightness is out of brightness
+
+Each image is decoded at a quarter of its size (the JPEG decoder skips most of the work) and shrunk to SIZE x SIZE grayscale.
+The scores of all the images are then computed at once on the stacked images with NumPy: the Laplacian is computed with array slices,
+the perceptual hash is the sign of the low frequencies of the 2-D DCT of the images shrunk to HASH_SIZE (two matrix products for the whole stack),
+and the Hamming distances of every pair of hashes come from one XOR and a bit count.
+"""
+import cv2
+import numpy as np
+
+SIZE = 256      # Width and height the sharpness and the brightness are measured at
+HASH_SIZE = 64  # Width and height the hash is computed at
+HASH = 16       # The hash is the sign of the HASH x HASH lowest frequencies, HASH * HASH bits
+
+
+def dctMatrix(n):
+    """The orthonormal DCT-II matrix, the DCT of an n x n image X is D @ X @ D.T
+
+    Arguments:
+        n {int} -- The size
+
+    Returns:
+        numpy.ndarray -- An n x n float32 matrix
+    """
+    k = np.arange(n).reshape(-1, 1)
+    matrix = np.cos(np.pi * (2 * np.arange(n) + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+
+def thumbnail(imagePath):
+    """Read an image as a SIZE x SIZE grayscale thumbnail
+
+    Arguments:
+        imagePath {str} -- The path of the image
+
+    Returns:
+        numpy.ndarray -- The uint8 thumbnail. None if the image cannot be read
+    """
+    image = cv2.imread(imagePath, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if image is None:
+        return None
+    return cv2.resize(image, (SIZE, SIZE), interpolation=cv2.INTER_AREA)
+
+
+def scores(thumbnails):
+    """The perceptual hash, the sharpness and the brightness of images
+
+    Arguments:
+        thumbnails {numpy.ndarray} -- The (images, SIZE, SIZE) stack of thumbnails
+
+    Returns:
+        dict -- "hash": (images, HASH * HASH / 8) uint8 array of packed bits, "sharpness": variance of the Laplacian of each image,
+                "brightness": mean gray level of each image
+    """
+    images = np.asarray(thumbnails, dtype=np.float32)
+
+    # the DCT of every image at once, then the sign of the lowest frequencies compared with their median (pHash)
+    step = SIZE // HASH_SIZE
+    small = images.reshape(len(images), HASH_SIZE, step, HASH_SIZE, step).mean(axis=(2, 4))
+    dct = dctMatrix(HASH_SIZE)
+    low = (dct[:HASH] @ small @ dct[:HASH].T).reshape(len(images), -1)
+    bits = low > np.median(low[:, 1:], axis=1, keepdims=True)
+
+    # 4-neighbour Laplacian of the inside pixels
+    laplacian = (images[:, :-2, 1:-1] + images[:, 2:, 1:-1] + images[:, 1:-1, :-2] + images[:, 1:-1, 2:] - 4 * images[:, 1:-1, 1:-1])
+    return {"hash": np.packbits(bits, axis=1),
+            "sharpness": laplacian.reshape(len(images), -1).var(axis=1),
+            "brightness": images.reshape(len(images), -1).mean(axis=1)}
+
+
+def distances(hashes):
+    """The Hamming distance between every pair of hashes
+
+    Arguments:
+        hashes {numpy.ndarray} -- The (images, bytes) packed hashes of scores()
+
+    Returns:
+        numpy.ndarray -- An (images, images) matrix of the number of different bits
+    """
+    hashes = np.asarray(hashes, dtype=np.uint8)
+    return np.unpackbits(hashes[:, None, :] ^ hashes[None, :, :], axis=2).sum(axis=2)
+
+
+def select(names, stats, max_distance=4, min_sharpness=15.0, brightness=(40.0, 220.0)):
+    """Choose the images to train on
+
+    Arguments:
+        names {list} -- The person of each image
+        stats {dict} -- The "hash", "sharpness" and "brightness" of each image (see scores())
+
+    Keyword Arguments:
+        max_distance {int} -- Images of a person whose hashes differ by at most this many bits are duplicates (-1: no duplicate)
+        min_sharpness {float} -- Minimum variance of the Laplacian
+        brightness {tuple} -- Minimum and maximum mean gray level
+
+    Returns:
+        list -- The reason to skip each image: None to train on it, "blurry", "dark", "bright" or "duplicate"
+    """
+    sharpness = np.asarray(stats["sharpness"])
+    levels = np.asarray(stats["brightness"])
+    reasons = [None] * len(names)
+    for i in np.flatnonzero(sharpness < min_sharpness):
+        reasons[i] = "blurry"
+    for i in np.flatnonzero(levels < brightness[0]):
+        reasons[i] = "dark"
+    for i in np.flatnonzero(levels > brightness[1]):
+        reasons[i] = "bright"
+
+    names = np.asarray(names)
+    for name in np.unique(names):
+        # the good images of the person, sharpest first: each one makes its duplicates that are not sharper redundant
+        rows = [i for i in np.flatnonzero(names == name) if reasons[i] is None]
+        rows.sort(key=lambda i: -sharpness[i])
+        if len(rows) < 2:
+            continue
+        close = distances(np.asarray(stats["hash"])[rows]) <= max_distance
+        for a in range(len(rows)):
+            if reasons[rows[a]] is not None:
+                continue
+            for b in np.flatnonzero(close[a, a + 1:]) + a + 1:
+                reasons[rows[b]] = "duplicate"
+    return reasons
@@ -0,0 +1,56 @@
+import unittest
+import numpy as np
+import cv2
+import quality
+
+class QualityTest(unittest.TestCase):
+    """These tests check which dataset images are left out of training
+    """
+
+    def setUp(self):
+        random = np.random.RandomState(0)
+        # 3 different scenes, smooth enough to be hashed the same when slightly changed
+        self.scenes = [cv2.resize(random.randint(30, 220, (16, 16)).astype(np.uint8), (quality.SIZE, quality.SIZE), interpolation=cv2.INTER_CUBIC)
+                       for _ in range(3)]
+        self.random = random
+
+    def noisy(self, image, amount=3):
+        return np.clip(image.astype(int) + self.random.randint(-amount, amount + 1, image.shape), 0, 255).astype(np.uint8)
+
+    def test_hash(self):
+        """
+        Function: hash 2 shots of the same scene and a different scene
+
+        Assertion: the shots of the same scene differ by a few bits, the other scene by many
+        """
+        stats = quality.scores(np.stack([self.noisy(self.scenes[0]), self.noisy(self.scenes[0]), self.scenes[1]]))
+        self.assertEqual(stats["hash"].shape, (3, quality.HASH * quality.HASH // 8))
+        distances = quality.distances(stats["hash"])
+        self.assertLessEqual(distances[0, 1], 4)
+        self.assertGreater(distances[0, 2], 64)
+        self.assertEqual(distances[1, 0], distances[0, 1])
+
+    def test_duplicates(self):
+        """
+        Function: select among a burst of 3 shots of one scene (one sharper), another scene of the same person, and a shot of the scene for another person
+
+        Assertion: only the sharpest shot of the burst is kept, the other scene and the other person are kept
+        """
+        burst = [cv2.GaussianBlur(self.noisy(self.scenes[0]), (0, 0), 0.8), self.noisy(self.scenes[0], 20), cv2.GaussianBlur(self.noisy(self.scenes[0]), (0, 0), 0.8)]
+        images = burst + [self.scenes[1], self.scenes[0]]
+        reasons = quality.select(["Fahim"] * 4 + ["Tyler"], quality.scores(np.stack(images)), min_sharpness=0.0)
+        self.assertEqual(reasons, ["duplicate", None, "duplicate", None, None])
+
+    def test_quality(self):
+        """
+        Function: select a blurred image, a dark one, a bright one and a good one
+
+        Assertion: the reason of each skipped image is given, the good one is kept
+        """
+        scene = self.noisy(self.scenes[2], 20)
+        images = [cv2.GaussianBlur(self.scenes[2], (0, 0), 4), (scene * 0.1).astype(np.uint8), np.full_like(scene, 250), scene]
+        reasons = quality.select(["Vinh"] * 4, quality.scores(np.stack(images)), max_distance=-1)
+        self.assertEqual(reasons, ["blurry", "dark", "bright", None])
+
+if __name__ == "__main__":
+    unittest.main()
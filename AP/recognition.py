@@ -0,0 +1,590 @@
+from imutils.video import VideoStream
+from imutils.video import FPS
+from collections import deque
+from pipeline import RecognitionPipeline
+from tracker import FaceTracker
+from voting import TemporalVote
+from resolution import AdaptiveResolution
+from buffers import FramePool, BlobBuffer
+from liveness import LivenessCheck
+from embedding_index import EmbeddingIndex
+from enrolment import ContinuousEnrolment
+from sklearn.svm import SVC
+from remote_recognizer import RemoteRecognizer
+import model_store
+import models
+import numpy as np
+import threading
+import pickle
+import time
+import cv2
+import os
+
+class RecognitionEngine:
+    """This class keeps everything facial recognition needs in memory between logins, so that logging in only costs a few frames.
+    The process was adapted from the following source: https://www.pyimagesearch.com/2018/09/24/opencv-face-recognition/
+
+    - The face detector, the face embedding model, the recognizer and the label encoder are loaded once (on the first call of load())
+    - The video stream is started once (on the first call of start()) and kept running until stop() is called
+    - Capture, detection and embedding run in parallel threads (see pipeline.py), unless args "pipeline" is False
+    - The face detector only runs every few frames, faces are followed in between and their embedding is reused while they do not move (see tracker.py)
+    - The detector looks at a region around the last faces, and at a smaller input size when the frame rate is too low (see resolution.py)
+    - The detector and the embedder come from a profile of models.py (args "profile"), with a cascade pre-filter and another DNN target on the faster profiles
+    - Frames, the grayscale frame and the DNN inputs are preallocated buffers reused from frame to frame, and faces are views of the frame (see buffers.py)
+    - A person is logged in once the recognitions of several frames agree with enough confidence (see voting.py),
+      and the face blinked in the next frames (args "liveness", see liveness.py), so a photo of the person is not enough
+    - The recognizer is reloaded at the next login when train.py wrote new model files (see reload() and train.py --watch)
+    - Optionally (args "learn"), the embeddings of the logged in person are kept and the recognizer is refreshed with them in the background (see enrolment.ContinuousEnrolment)
+    - In headless mode (args "headless", the default without a display) nothing is drawn or shown, the whole frame budget goes to inference.
+      Recognition is given up with cancel() or Ctrl+C instead of the "q" key, and annotated frames can be saved to args "snapshots" now and then to see what the camera sees
+
+    It is used by menu.py to log in with facial recognition.
+    """
+    args = {
+        "profile": os.environ.get("CARSHARE_FACE_PROFILE", "default"),  # Models to run (see models.py)
+        "detector": None,       # Name of a detector of models.py instead of the detector of the profile
+        "embedder": None,       # Name of an embedder of models.py instead of the embedder of the profile
+        "recognizer": "output/recognizer.pickle",
+        "le": "output/le.pickle",
+        "backend": os.environ.get("CARSHARE_FACE_BACKEND", "index"),  # Recognizer: "index" (the nearest-neighbour index of store, see embedding_index.py),
+                                # "remote" (the Master Pi at server recognizes the embeddings, see remote_recognizer.py, names are User IDs)
+                                # or "svc" (the pickled recognizer and le). "none" only detects and embeds (see face_benchmark.py)
+        "store": "output",      # Directory of the embeddings (see model_store.py)
+        "server": None,         # (host, port) of the TCP server of the Master Pi ("remote" backend)
+        "confidence": 0.5,      # Minimum probability of a detection to be a face
+        "threshold": 0.6,       # Minimum average probability of the recognitions to log in ("average" voting)
+        "src": 0,               # Camera
+        "pipeline": True,       # Capture, detect and embed in parallel threads (see pipeline.py)
+        "detect_every": 10,     # Run the face detector at least every this many frames (see tracker.py)
+        "detector_sizes": (300, 240, 180, 150),  # Input sizes of the face detector, the smaller ones are used when the frame rate is too low (see resolution.py)
+        "target_fps": 10.0,     # Frame rate to keep up by shrinking the detector input (None: always the largest size)
+        "full_every": 5,        # Run the detector on the whole frame at least every this many detections, on a region around the faces otherwise (1: always the whole frame)
+        "voting": "sprt",       # How the recognitions of several frames are combined: "sprt" or "average" (see voting.py)
+        "window": 15,           # Number of recognitions the decision is made on
+        "liveness": os.environ.get("CARSHARE_LIVENESS", "on") != "off",  # Check that a recognized face blinks before logging in (see liveness.py)
+        "liveness_window": 30,  # Frames a recognized face has to blink in
+        "learn": os.environ.get("CARSHARE_FACE_LEARN", "off") == "on",  # Keep the embeddings of successful logins ("index" and "svc" backends, see enrolment.py)
+        "learn_min_proba": 0.9, # Minimum probability of a recognition to keep its embedding
+        "learn_cap": 50,        # Maximum number of embeddings kept per person
+        "headless": os.environ.get("CARSHARE_HEADLESS", "off" if os.environ.get("DISPLAY") else "on") != "off",  # No drawing and no window (default: without a display)
+        "snapshots": os.environ.get("CARSHARE_SNAPSHOTS"),  # Directory to save an annotated frame to in headless mode (default: no snapshot)
+        "snapshot_every": 2.0   # Seconds between 2 snapshots
+    }
+
+    def __init__(self, **args):
+        """inits RecognitionEngine. Nothing is loaded until load() or start() is called.
+
+        Keyword Arguments:
+            Any key of RecognitionEngine.args to override its default value
+        """
+        self.args = dict(RecognitionEngine.args, **args)
+        self.models = models.profile(self.args["profile"], self.args["detector"], self.args["embedder"])
+        self.detector = None
+        self.embedder = None
+        self.prefilter = None
+        self.gray = None
+        self.recognizer = None
+        self.le = None
+        self.vs = None
+        self.lastFrame = None
+        self.frames = FramePool()
+        spec = self.models["embedder_spec"]
+        self.faceBlob = BlobBuffer(spec["size"], spec["scale"], spec["mean"], spec["swapRB"], batch=4)
+        self.pipeline = RecognitionPipeline(self)
+        self.tracker = FaceTracker(self.args["detect_every"])
+        self.resolution = AdaptiveResolution(self.args["detector_sizes"], self.args["target_fps"], full_every=self.args["full_every"],
+                                             mean=self.models["detector_spec"].get("mean", (0.0, 0.0, 0.0)))
+        self.vote = TemporalVote(self.args["voting"], self.args["window"], threshold=self.args["threshold"])
+        self.liveness = LivenessCheck(self.args["liveness_window"])
+        self.learner = None
+        self.loaded = None      # stamp() of the model files the recognizer was loaded from
+        self.lock = threading.Lock()
+        self.cancelled = threading.Event()
+
+    def load(self):
+        """Load the face detector, the face embedding model, the recognizer and the label encoder from disk, if they are not loaded yet.
+        It is safe to call from a background thread at startup.
+        """
+        with self.lock:
+            if self.detector is not None:
+                return
+
+            # load our serialized face detector from disk
+            print("[INFO] loading face detector ({} profile: {})...".format(self.models["name"], self.models["detector"]))
+            detector = models.loadDetector(self.models)
+            if self.models["prefilter"] is not None:
+                self.prefilter = models.loadCascade(self.models["prefilter_spec"])
+
+            # load our serialized face embedding model from disk
+            print("[INFO] loading face recognizer ({})...".format(self.models["embedder"]))
+            self.embedder = models.loadEmbedder(self.models)
+
+            self.loadRecognizer()
+            self.detector = detector
+
+    def modelFiles(self):
+        """The files the recognizer is loaded from, for reload()
+
+        Returns:
+            list -- The paths (labels.json is written last by train.py, see model_store.py)
+        """
+        if self.args["backend"] == "index":
+            return [model_store.paths(self.args["store"])[2]]
+        if self.args["backend"] == "svc":
+            return [self.args["recognizer"], self.args["le"]]
+        return []
+
+    def stamp(self):
+        """The modification times of modelFiles()
+
+        Returns:
+            tuple -- The modification time of each file (None for a missing file)
+        """
+        return tuple(os.stat(path).st_mtime if os.path.exists(path) else None for path in self.modelFiles())
+
+    def loadRecognizer(self):
+        """Load the actual face recognition model along with the label encoder, and the embeddings learned from the logins (args "learn")
+
+        Raises:
+            ValueError: The embeddings of the store were computed with another embedder than the embedder of the profile
+        """
+        self.loaded = self.stamp()
+        if self.args["backend"] == "index":
+            embedder = model_store.embedder(self.args["store"])
+            if embedder != self.models["embedder"]:
+                raise ValueError("the embeddings of {} were computed with {}, not {}: run train.py --profile {}".format(
+                    self.args["store"], embedder, self.models["embedder"], self.models["name"]))
+            self.recognizer = EmbeddingIndex.load(self.args["store"])
+        elif self.args["backend"] == "remote":
+            self.recognizer = RemoteRecognizer(self.args["server"])
+        elif self.args["backend"] == "none":
+            self.recognizer = None
+        else:
+            recognizer = pickle.loads(open(self.args["recognizer"], "rb").read())
+            self.le = pickle.loads(open(self.args["le"], "rb").read())
+            self.recognizer = recognizer
+
+        if self.args["learn"] and self.args["backend"] in ("index", "svc"):
+            self.learner = ContinuousEnrolment(self.args["store"], self.args["learn_min_proba"], cap=self.args["learn_cap"],
+                                               embedder=self.models["embedder"])
+            if self.learner.names:
+                self.refreshRecognizer()
+
+    def reload(self):
+        """Load the recognizer again if train.py wrote new model files since it was loaded (train.py --watch retrains while the Agent Pi runs).
+        Called at the start of each recognition, when no frame is being recognized. The old recognizer is kept if the new files cannot be loaded
+
+        Returns:
+            bool -- True if the recognizer was reloaded
+        """
+        if self.detector is None or self.stamp() == self.loaded:
+            return False
+        with self.lock:
+            previous = (self.recognizer, self.le, self.learner, self.loaded)
+            try:
+                self.loadRecognizer()
+            except (ValueError, IOError, pickle.UnpicklingError, EOFError) as e:
+                # half written (the next check tries again) or computed with another embedder
+                print("[INFO] cannot reload the recognizer: {}".format(e))
+                (self.recognizer, self.le, self.learner, self.loaded) = previous
+                return False
+        print("[INFO] recognizer reloaded: the model files changed")
+        return True
+
+    def start(self):
+        """Load the models and start the video stream, if they are not started yet. The camera sensor is only warmed up the first time.
+        """
+        self.load()
+
+        if self.vs is None:
+            # initialize the video stream, then allow the camera sensor to warm up
+            print("[INFO] starting video stream...")
+            self.vs = VideoStream(src=self.args["src"]).start()
+            time.sleep(2.0)
+
+    def stop(self):
+        """Stop the video stream. The models stay loaded.
+        """
+        if self.vs is not None:
+            self.vs.stop()
+            self.vs = None
+
+    def detect(self, frame):
+        """Find the faces in a frame with the face detector.
+        The detector only looks at the region around the faces of the last frames, resized to the current size of self.resolution.
+        With a pre-filter, the detector is skipped if no face is being followed and the pre-filter finds no face
+
+        Arguments:
+            frame {numpy.ndarray} -- A BGR image
+
+        Returns:
+            list -- The (startX, startY, endX, endY) box of each face, filtering out weak detections and faces that are too small
+        """
+        (h, w) = frame.shape[:2]
+        if self.prefilter is not None or self.models["detector_spec"]["type"] == "cascade":
+            self.gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.gray)
+            if self.prefilter is not None and not self.tracker.tracks and not models.cascadeFaces(self.prefilter, self.gray, scale=2.0):
+                return []
+
+        (x0, y0, x1, y1) = self.resolution.region(frame.shape, [track.box for track in self.tracker.tracks])
+        if self.models["detector_spec"]["type"] == "cascade":
+            return [(startX + x0, startY + y0, endX + x0, endY + y0)
+                    for (startX, startY, endX, endY) in models.cascadeFaces(self.detector, self.gray[y0:y1, x0:x1])]
+        size = self.resolution.size
+
+        # construct a blob from the region, resized once into a preallocated blob
+        imageBlob = self.resolution.blob(frame[y0:y1, x0:x1], size)
+
+        # apply OpenCV's deep learning-based face detector to localize
+        # faces in the input image
+        self.detector.setInput(imageBlob)
+        detections = self.detector.forward()
+
+        boxes = []
+        for i in range(0, detections.shape[2]):
+            # filter out weak detections
+            if detections[0, 0, i, 2] > self.args["confidence"]:
+                # compute the (x, y)-coordinates of the bounding box for
+                # the face in the frame (clipped to the frame)
+                box = detections[0, 0, i, 3:7] * np.array([x1 - x0, y1 - y0, x1 - x0, y1 - y0]) + np.array([x0, y0, x0, y0])
+                (startX, startY, endX, endY) = box.astype("int")
+                (startX, startY) = (max(startX, 0), max(startY, 0))
+                (endX, endY) = (min(endX, w), min(endY, h))
+
+                # ensure the face width and height are sufficiently large
+                if endX - startX < 20 or endY - startY < 20:
+                    continue
+
+                boxes.append((startX, startY, endX, endY))
+        return boxes
+
+    def embed(self, face):
+        """Compute the 128-d embedding of a face
+
+        Arguments:
+            face {numpy.ndarray} -- The face ROI of a frame
+
+        Returns:
+            numpy.ndarray -- The embedding, with shape (1, 128)
+        """
+        return self.embedFaces([face])
+
+    def embedFaces(self, faces):
+        """Compute the 128-d embeddings of several faces with a single forward pass of the embedding model
+
+        Arguments:
+            faces {list} -- The face ROIs of a frame
+
+        Returns:
+            numpy.ndarray -- The embeddings, with shape (len(faces), 128)
+        """
+        self.embedder.setInput(self.faceBlob.fill(faces))
+        return self.embedder.forward()
+
+    def classify(self, vec):
+        """Recognize the person of an embedding
+
+        Arguments:
+            vec {numpy.ndarray} -- The embedding, with shape (1, 128)
+
+        Returns:
+            tuple -- The name of the person ("unknown" if nobody is similar enough, "index" backend) and its probability
+        """
+        if self.le is None:
+            return self.recognizer.classify(vec)
+
+        preds = self.recognizer.predict_proba(vec)[0]
+        j = np.argmax(preds)
+        return self.le.classes_[j], preds[j]
+
+    def refreshRecognizer(self):
+        """Rebuild the recognizer from the embeddings of the store and the embeddings learned from the logins (args "learn"), then swap it in.
+        The index gets the learned embeddings (its centroids follow), the SVC is fitted again. Called from the background thread of the ContinuousEnrolment.
+        The SVC is not refreshed if its label encoder does not know every person of the store
+        """
+        vectors, names = self.learner.learned()
+        # people no longer in the store (removed from the dataset) are not learned back
+        _, _, classes = model_store.load(self.args["store"])
+        keep = [i for i, name in enumerate(names) if name in classes]
+        vectors, names = vectors[keep], [names[i] for i in keep]
+        if self.args["backend"] == "index":
+            recognizer = EmbeddingIndex.load(self.args["store"])
+            recognizer.add(vectors, names)
+        else:
+            stored, _, _ = model_store.load(self.args["store"])
+            storedNames = model_store.names(self.args["store"])
+            missing = sorted(set(storedNames) - set(self.le.classes_))
+            if missing:
+                # le.pickle is older than the store (train.py was run without --svc since), its classes cannot label the embeddings
+                print("[INFO] recognizer not refreshed: {} are not in {}, run train.py --svc".format(", ".join(missing), self.args["le"]))
+                return
+            labels = self.le.transform(storedNames + names)
+            recognizer = SVC(C=1.0, kernel="linear", probability=True)
+            recognizer.fit(np.vstack([stored, vectors]), labels)
+        # one assignment, classify() sees either the old or the new recognizer
+        self.recognizer = recognizer
+        print("[INFO] recognizer refreshed with {} learned embeddings".format(len(names)))
+
+    def resize(self, frame):
+        """Resize a camera frame to have a width of 600 pixels (while maintaining the aspect ratio), into a buffer of self.frames
+
+        Arguments:
+            frame {numpy.ndarray} -- A camera frame
+
+        Returns:
+            numpy.ndarray -- The resized frame. Give it back with release() once it is not used anymore
+        """
+        (h, w) = frame.shape[:2]
+        height = int(h * 600 / float(w))
+        return cv2.resize(frame, (600, height), dst=self.frames.acquire((height, 600) + frame.shape[2:]), interpolation=cv2.INTER_AREA)
+
+    def release(self, frame):
+        """Give back a frame from resize(), its buffer is reused for a next frame
+
+        Arguments:
+            frame {numpy.ndarray} -- The frame
+        """
+        self.frames.release(frame)
+
+    def capture(self):
+        """Grab the newest frame from the threaded video stream and resize it (see resize())
+
+        Returns:
+            numpy.ndarray -- The frame. None if the camera has not produced a new frame since the last call
+        """
+        frame = self.vs.read()
+        if frame is None or frame is self.lastFrame:
+            time.sleep(0.005)
+            return None
+        self.lastFrame = frame
+        return self.resize(frame)
+
+    def detectFrame(self, frame):
+        """Find the faces of a frame, with the face detector or by following the faces of the previous frames
+
+        Arguments:
+            frame {numpy.ndarray} -- The frame
+
+        Returns:
+            tuple -- The frame and the list of TrackState (see tracker.py) of its faces, which the next frames do not change
+        """
+        return frame, self.tracker.update(frame, self.detect)
+
+    def recognizeFaces(self, detection):
+        """Compute the embedding of each face of a frame (all in one forward pass) and recognize it.
+        The last embedding and recognition of a face are reused if it has not moved since.
+        The faces are cropped with their box in this frame, even if the detect stage of the pipeline already follows them in the next frames.
+
+        Arguments:
+            detection {tuple} -- The frame and the list of TrackState of its faces (from detectFrame())
+
+        Returns:
+            tuple -- The frame and the list of (box, name, probability, embedding) of its faces
+        """
+        frame, faces = detection
+        moved = [i for (i, face) in enumerate(faces) if not face.stable]
+        if moved:
+            faces = list(faces)
+            rois = [frame[startY:endY, startX:endX] for (startX, startY, endX, endY) in (faces[i].box for i in moved)]
+            for i, vec in zip(moved, self.embedFaces(rois)):
+                vec = vec.reshape(1, -1)
+                name, proba = self.classify(vec)
+                self.tracker.remember(faces[i], vec, name, proba)
+                faces[i] = faces[i]._replace(vec=vec, name=name, proba=proba)
+        return frame, [(face.box, face.name, face.proba, face.vec) for face in faces]
+
+    def annotate(self, frame, faces):
+        """Draw the bounding box of each face along with its name and probability
+
+        Arguments:
+            frame {numpy.ndarray} -- The frame, drawn on in place
+            faces {list} -- The (box, name, probability, embedding) of its faces
+        """
+        for ((startX, startY, endX, endY), name, proba, vec) in faces:
+            text = "{}: {:.2f}%".format(name, proba * 100)
+            y = startY - 10 if startY - 10 > 10 else startY + 10
+            cv2.rectangle(frame, (startX, startY), (endX, endY),
+                        (0, 0, 255), 2)
+            cv2.putText(frame, text, (startX, y),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 0, 255), 2)
+
+    def snapshot(self, frame, faces):
+        """Save an annotated frame as snapshot.jpg in args "snapshots" (written to a temporary file first, so a reader never sees half a file)
+
+        Arguments:
+            frame {numpy.ndarray} -- The frame
+            faces {list} -- The (box, name, probability, embedding) of its faces
+        """
+        frame = frame.copy()
+        self.annotate(frame, faces)
+        os.makedirs(self.args["snapshots"], exist_ok=True)
+        path = os.path.join(self.args["snapshots"], "snapshot.jpg")
+        cv2.imwrite(path + ".tmp.jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
+        os.replace(path + ".tmp.jpg", path)
+
+    def cancel(self):
+        """Give up the current recognition (from another thread, instead of the "q" key in headless mode)
+        """
+        self.cancelled.set()
+
+    def observations(self, end):
+        """Recognize the faces of the frames from the video stream, either in this thread (one frame at a time) or with a RecognitionPipeline (args "pipeline")
+
+        Arguments:
+            end {float} -- Time to stop at. None for no limit (stops anyway after cancel())
+
+        Yields:
+            tuple -- A frame and the list of (box, name, probability, embedding) of its faces. The frame is released when the next one is asked for
+
+        Raises:
+            Exception -- The exception of a stage of the pipeline that failed
+        """
+        self.frames.reset()
+        if not self.args["pipeline"]:
+            while not self.cancelled.is_set() and (end is None or time.time() < end):
+                frame = self.capture()
+                if frame is not None:
+                    yield self.recognizeFaces(self.detectFrame(frame))
+                    self.release(frame)
+            return
+
+        self.pipeline.start()
+        try:
+            while not self.cancelled.is_set() and (end is None or time.time() < end):
+                self.pipeline.check()
+                result = self.pipeline.results.get(timeout=0.1)
+                if result is not None:
+                    yield result
+                    self.release(result[0])
+        finally:
+            self.pipeline.stop()
+            self.pipeline.report()
+
+    def checkLiveness(self, frame, faces, name):
+        """Count a frame for the liveness check of a recognized person, on the box of the face the tracker or the detector already found
+
+        Arguments:
+            frame {numpy.ndarray} -- The frame
+            faces {list} -- The (box, name, probability, embedding) of its faces
+            name {str} -- The recognized person
+
+        Returns:
+            bool -- True if the face is live, False if it is refused, None if it is too early to tell or the person is not in the frame
+        """
+        boxes = [box for (box, faceName, proba, vec) in faces if faceName == name]
+        if not boxes:
+            return None
+        (startX, startY, endX, endY) = max(boxes, key=lambda box: (box[2] - box[0]) * (box[3] - box[1]))
+        return self.liveness.update(frame[startY:endY, startX:endX])
+
+    def recognize(self, timeout=None, known=None):
+        """Read frames from the video stream until a person is recognized.
+
+        Keyword Arguments:
+            timeout {float} -- Seconds to give up after (default: no limit, press "q", Ctrl+C or call cancel() to give up)
+            known {collection} -- Only these names are accepted (default: any name but "unknown")
+
+        Returns:
+            str -- The name of the recognized person. None if nobody was recognized
+
+        Raises:
+            Exception -- The exception of a stage of the pipeline that failed
+        """
+        self.start()
+        self.reload()
+        self.tracker.reset()
+        self.vote.reset()
+        self.resolution.reset()
+        self.cancelled.clear()
+        headless = self.args["headless"]
+        nextSnapshot = time.time()
+        detected = None
+        candidate = None        # Recognized person whose face has not blinked yet
+        recognitions = deque(maxlen=2 * self.args["window"])   # (name, probability, embedding) of the last faces, for args "learn"
+        livenessTime = 0.0
+        end = None if timeout is None else time.time() + timeout
+
+        # start the FPS throughput estimator
+        fps = FPS().start()
+
+        # loop over the recognized frames
+        observations = self.observations(end)
+        try:
+            for frame, faces in observations:
+                if candidate is not None:
+                    # the person is recognized, the frames only check that the face is live
+                    begin = time.perf_counter()
+                    live = self.checkLiveness(frame, faces, candidate)
+                    livenessTime += time.perf_counter() - begin
+                    if live:
+                        detected = str(candidate)
+                    elif live is not None:
+                        print("[INFO] {} did not blink, the face may be a photo".format(candidate))
+                        candidate = None
+                        self.vote.reset()
+
+                if self.learner is not None:
+                    recognitions.extend((name, proba, vec) for (box, name, proba, vec) in faces
+                                        if not any(vec is seen for (_, _, seen) in recognitions))
+
+                for (box, name, proba, vec) in faces if candidate is None else []:
+                    decision = self.vote.update(name, proba, vec)
+                    if decision is not None:
+                        print("Detected Person's Name is : {} (after {} recognitions)".format(decision, self.vote.frames))
+                        if decision != "unknown" and (known is None or str(decision) in known):      #See if the detected name is valid
+                            if self.args["liveness"]:
+                                candidate = decision
+                                self.liveness.reset()
+                                print("[INFO] checking that the face is live, please blink")
+                            else:
+                                detected = str(decision)
+                            break
+                        self.vote.reset()
+
+                if detected is not None or self.cancelled.is_set():
+                    break
+
+                # update the FPS counter and adapt the detector input to it
+                fps.update()
+                self.resolution.tick(time.perf_counter())
+
+                if headless:
+                    # no window, only an annotated snapshot now and then
+                    if self.args["snapshots"] and time.time() >= nextSnapshot:
+                        self.snapshot(frame, faces)
+                        nextSnapshot = time.time() + self.args["snapshot_every"]
+                    continue
+
+                # show the output frame, with the bounding box of each face along with the associated probability
+                self.annotate(frame, faces)
+                cv2.imshow("Frame", frame)
+                key = cv2.waitKey(1) & 0xFF
+
+                # if the `q` key was pressed, break from the loop
+                if key == ord("q"):
+                    break
+        except KeyboardInterrupt:
+            print("[INFO] facial recognition cancelled")
+        finally:
+            observations.close()
+
+        # stop the timer and display FPS information
+        fps.stop()
+        print("[INFO] elasped time: {:.2f}".format(fps.elapsed()))
+        print("[INFO] approx. FPS: {:.2f}".format(fps.fps()))
+        self.tracker.report()
+        if self.liveness.frames:
+            print("[INFO] liveness: {} frames, {:.2f} ms per frame".format(self.liveness.frames, livenessTime * 1000 / self.liveness.frames))
+        print("[INFO] face detector input: {}x{}".format(self.resolution.size, self.resolution.size))
+        print("[INFO] frame buffers: {} allocated, {} reused".format(self.frames.allocated, self.frames.reused))
+
+        # close the window, the video stream is kept running for the next login
+        if not headless:
+            cv2.destroyAllWindows()
+
+        if detected is not None and self.learner is not None:
+            verified = [(vec, proba) for (name, proba, vec) in recognitions if str(name) == detected]
+            if verified:
+                self.learner.learn(detected, np.vstack([vec for (vec, _) in verified]), [proba for (_, proba) in verified], self.refreshRecognizer)
+
+        return detected
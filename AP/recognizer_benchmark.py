@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# python3 recognizer_benchmark.py --store output --folds 5
+"""Compare the SVC fitted by train.py with the nearest-neighbour index (embedding_index.py) on the embeddings of the dataset images:
+
+- accuracy with stratified k-fold cross-validation
+- latency of recognizing one face (one call per face, like the recognition loop)
+- time to add one person: refitting the SVC on everything vs adding the person's embeddings to the index
+"""
+import argparse
+import time
+import numpy as np
+from sklearn.model_selection import StratifiedKFold
+from sklearn.preprocessing import LabelEncoder
+from sklearn.svm import SVC
+from embedding_index import EmbeddingIndex
+import model_store
+
+def fitSVC(vectors, names):
+    """Fit the recognizer the way train.py does
+
+    Returns:
+        function -- Recognizes one embedding, returns the name
+    """
+    le = LabelEncoder()
+    recognizer = SVC(C=1.0, kernel="linear", probability=True)
+    recognizer.fit(vectors, le.fit_transform(names))
+
+    def classify(vec):
+        preds = recognizer.predict_proba(vec)[0]
+        return le.classes_[np.argmax(preds)]
+    return classify
+
+
+def fitIndex(mode):
+    """Fill an EmbeddingIndex
+
+    Returns:
+        function -- Fills the index with the embeddings and returns a function recognizing one embedding
+    """
+    def fit(vectors, names):
+        index = EmbeddingIndex(mode, min_similarity=-1.0)
+        index.add(vectors, list(names))
+        return lambda vec: index.classify(vec)[0]
+    return fit
+
+
+def timed(function, *args):
+    """Call a function
+
+    Returns:
+        tuple -- Its result and the seconds it took
+    """
+    begin = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - begin
+
+
+def evaluate(fit, vectors, names, folds):
+    """Cross-validate a recognizer
+
+    Arguments:
+        fit {function} -- Fits the recognizer on embeddings and names, returns a function recognizing one embedding
+        vectors {numpy.ndarray} -- The embeddings (one per row)
+        names {numpy.ndarray} -- The name of each embedding
+        folds {int} -- Number of folds
+
+    Returns:
+        dict -- Accuracy, fit time (ms) and latency per face (microseconds)
+    """
+    correct, fits, latencies = 0, [], []
+    for train, test in StratifiedKFold(folds, shuffle=True, random_state=0).split(vectors, names):
+        classify, seconds = timed(fit, vectors[train], names[train])
+        fits.append(seconds)
+        for i in test:
+            name, seconds = timed(classify, vectors[i:i + 1])
+            latencies.append(seconds)
+            correct += name == names[i]
+
+    return {"accuracy": correct / float(len(names)),
+            "fit_ms": np.mean(fits) * 1000,
+            "p50_us": np.percentile(latencies, 50) * 1e6,
+            "p95_us": np.percentile(latencies, 95) * 1e6}
+
+
+def enrolment(vectors, names):
+    """Time adding the last person to recognizers that know the others
+
+    Returns:
+        dict -- Milliseconds to add the person to each recognizer
+    """
+    person = names == np.unique(names)[-1]
+
+    # the SVC has to be fitted again on everything
+    _, svc = timed(fitSVC, vectors, names)
+
+    index = EmbeddingIndex()
+    index.add(vectors[~person], list(names[~person]))
+    _, added = timed(index.add, vectors[person], list(names[person]))
+    return {"svc": svc * 1000, "index": added * 1000}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the SVC recognizer with the nearest-neighbour index")
+    parser.add_argument("--store", default="output", help="directory of the embeddings of the dataset (from train.py)")
+    parser.add_argument("--folds", type=int, default=5, help="number of cross-validation folds")
+    args = parser.parse_args()
+
+    vectors = np.array(model_store.load(args.store)[0])
+    names = np.array(model_store.names(args.store))
+    print("[INFO] {} embeddings of {} people, {} folds".format(len(names), len(np.unique(names)), args.folds))
+
+    print("{:>14} {:>9} {:>9} {:>12} {:>12}".format("recognizer", "accuracy", "fit ms", "p50 us/face", "p95 us/face"))
+    for label, fit in (("svc", fitSVC), ("index centroid", fitIndex("centroid")), ("index knn", fitIndex("knn"))):
+        stats = evaluate(fit, vectors, names, args.folds)
+        print("{:>14} {:>8.1f}% {:>9.2f} {:>12.1f} {:>12.1f}".format(
+            label, stats["accuracy"] * 100, stats["fit_ms"], stats["p50_us"], stats["p95_us"]))
+
+    added = enrolment(vectors, names)
+    print("[INFO] adding one person: svc {:.2f} ms (refit), index {:.3f} ms".format(added["svc"], added["index"]))
@@ -0,0 +1,72 @@
+import socket
+import base64
+import json
+import numpy as np
+
+class RemoteRecognizer:
+    """A recognizer that sends the embedding of a face to the Master Pi, which recognizes it against the faces of every user (see flask_face.py on the Master Pi).
+    Only the 128-d embedding leaves the car, never an image, and the Agent Pi needs no recognizer or dataset of its own.
+
+    Each face is sent on its own TCP connection, closed once the reply is received, like the other messages of client_TCP.py:
+    the TCP server of the Master Pi serves one connection at a time, so a connection kept open would block every other Agent Pi.
+    It is the "remote" backend of recognition.py: it has the same classify() as the nearest-neighbour index, the name being the User ID.
+    """
+
+    def __init__(self, address, timeout=5.0):
+        """inits RemoteRecognizer
+
+        Arguments:
+            address {tuple} -- (host, port) of the TCP server of the Master Pi
+
+        Keyword Arguments:
+            timeout {float} -- Seconds to wait for the Master Pi
+        """
+        self.address = address
+        self.timeout = timeout
+
+    @staticmethod
+    def encode(vec):
+        """Encode an embedding for the TCP message (base64 of little-endian float32)
+
+        Arguments:
+            vec {numpy.ndarray} -- The embedding, with shape (1, 128)
+
+        Returns:
+            str -- The encoded embedding
+        """
+        return base64.b64encode(np.asarray(vec, dtype="<f4").ravel().tobytes()).decode()
+
+    def request(self, message):
+        """Send a message to the TCP server on a new connection and return its JSON reply
+
+        Arguments:
+            message {str} -- The message
+
+        Returns:
+            dict -- The reply. None if the server could not be reached
+        """
+        try:
+            with socket.create_connection(self.address, timeout=self.timeout) as s:
+                s.sendall(message.encode())
+                data = s.recv(4096) # 4096 is the buffersize
+            if not data:
+                raise ConnectionError("connection closed")
+            return json.loads(data.decode())
+        except (OSError, ValueError) as e:
+            print("[INFO] face verification failed: {}".format(e))
+            return None
+
+    def classify(self, vec):
+        """Recognize the person of an embedding on the Master Pi
+
+        Arguments:
+            vec {numpy.ndarray} -- The embedding, with shape (1, 128)
+
+        Returns:
+            tuple -- The User ID ("unknown" if nobody is similar enough or the Master Pi could not be reached) and its probability
+        """
+        reply = self.request("verify {}".format(self.encode(vec)))
+        if reply is None or reply.get("user_id") is None:
+            return "unknown", 0.0 if reply is None else reply["proba"]
+        return str(reply["user_id"]), reply["proba"]
+
@@ -0,0 +1,72 @@
+import unittest
+import socket
+import threading
+import json
+import numpy as np
+from remote_recognizer import RemoteRecognizer
+
+class RemoteRecognizerTest(unittest.TestCase):
+    """These tests check the faces sent to a TCP server that, like the one of the Master Pi, serves one connection at a time
+    """
+
+    def setUp(self):
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.received = []
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        """Unblock accept (close alone does not) and wait for the server thread to stop
+        """
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.server.close()
+        self.thread.join(2)
+
+    def serve(self):
+        """Reply to every verify message of a connection until the client closes it, then accept the next connection
+        """
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            with conn:
+                while True:
+                    message = conn.recv(4096)
+                    if not message:
+                        break
+                    self.received.append(message.decode())
+                    conn.sendall(json.dumps({"user_id": 1 if len(self.received) % 2 else None, "proba": 0.9}).encode())
+
+    def test_twoAgents(self):
+        """
+        Function: 2 recognizers (2 Agent Pis) send faces one after the other
+
+        Assertion: every face gets its reply, a recognizer never blocks the other one
+        """
+        first = RemoteRecognizer(self.server.getsockname(), timeout=2)
+        second = RemoteRecognizer(self.server.getsockname(), timeout=2)
+        vec = np.arange(128, dtype=np.float32).reshape(1, 128)
+
+        self.assertEqual(first.classify(vec), ("1", 0.9))
+        self.assertEqual(second.classify(vec), ("unknown", 0.9))
+        self.assertEqual(first.classify(vec), ("1", 0.9))
+        self.assertEqual(self.received[0], "verify {}".format(RemoteRecognizer.encode(vec)))
+
+    def test_unreachable(self):
+        """
+        Function: send a face to a port nobody listens on (bound then closed, unlike the server which may still accept)
+
+        Assertion: the face is unknown
+        """
+        probe = socket.socket()
+        probe.bind(("127.0.0.1", 0))
+        address = probe.getsockname()
+        probe.close()
+        self.assertEqual(RemoteRecognizer(address, timeout=1).classify(np.zeros((1, 128))), ("unknown", 0.0))
+
+if __name__ == "__main__":
+    unittest.main()
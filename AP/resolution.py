@@ -0,0 +1,108 @@
+from buffers import BlobBuffer
+
+class AdaptiveResolution:
+    """This class chooses what the face detector looks at, so it costs less when the frame rate is too low:
+
+    - The detector input shrinks one size (sizes) when the frame rate falls below target_fps, and grows back when the frame rate is well above it
+    - The detector only looks at a square region around the last known faces (their box grown by margin), and at the whole frame
+      every full_every detections, or when no face is known, so new faces are still found
+    - The region is resized once and written into a preallocated blob of the detector input size (see buffers.py), nothing is allocated per frame
+    """
+
+    def __init__(self, sizes=(300, 240, 180, 150), target_fps=10.0, margin=0.75, full_every=5, hold=10, smoothing=0.2, mean=(104.0, 177.0, 123.0)):
+        """inits AdaptiveResolution, at the largest size
+
+        Keyword Arguments:
+            sizes {tuple} -- Detector input sizes (square), from the largest
+            target_fps {float} -- Frame rate to keep up (None: always the largest size)
+            margin {float} -- Margin around the last faces, as a share of their size
+            full_every {int} -- Look at the whole frame at least every this many detections (1: never crop)
+            hold {int} -- Frames to wait after a size change before changing again
+            smoothing {float} -- Weight of the last frame in the average frame time
+            mean {tuple} -- Mean subtracted from the channels of the detector input
+        """
+        self.sizes = tuple(sizes)
+        self.target_fps = target_fps
+        self.margin = margin
+        self.full_every = full_every
+        self.hold = hold
+        self.smoothing = smoothing
+        self.blobs = {size: BlobBuffer(size, mean=mean) for size in self.sizes}
+        self.reset()
+
+    def reset(self):
+        """Go back to the largest size and the whole frame (at the start of a login)
+        """
+        self.level = 0
+        self.frameTime = None   # Average seconds per frame
+        self.last = None        # Time of the last frame
+        self.held = 0           # Frames since the last size change
+        self.since = 0          # Detections since the last whole frame
+
+    @property
+    def size(self):
+        """The current detector input size
+        """
+        return self.sizes[self.level]
+
+    def tick(self, now):
+        """Count a frame and adapt the size to the frame rate
+
+        Arguments:
+            now {float} -- The time of the frame (time.perf_counter())
+        """
+        if self.last is not None:
+            seconds = now - self.last
+            self.frameTime = seconds if self.frameTime is None else self.frameTime + self.smoothing * (seconds - self.frameTime)
+        self.last = now
+        self.held += 1
+        if self.target_fps is None or self.frameTime is None or self.held < self.hold:
+            return
+
+        fps = 1.0 / max(self.frameTime, 1e-6)
+        if fps < self.target_fps and self.level + 1 < len(self.sizes):
+            self.level += 1
+            self.held = 0
+        elif fps > self.target_fps * 1.5 and self.level > 0:
+            self.level -= 1
+            self.held = 0
+
+    def region(self, shape, boxes):
+        """The region of the frame to run the detector on
+
+        Arguments:
+            shape {tuple} -- The shape of the frame
+            boxes {list} -- The (startX, startY, endX, endY) of the last known faces
+
+        Returns:
+            tuple -- (startX, startY, endX, endY) of the region, the whole frame if there is no face or it is time for a whole frame
+        """
+        (h, w) = shape[:2]
+        self.since += 1
+        if not boxes or self.since >= self.full_every:
+            self.since = 0
+            return (0, 0, w, h)
+
+        startX, startY = min(box[0] for box in boxes), min(box[1] for box in boxes)
+        endX, endY = max(box[2] for box in boxes), max(box[3] for box in boxes)
+
+        # a square around the faces, the detector is trained on faces that are not stretched
+        side = int(max(endX - startX, endY - startY) * (1 + 2 * self.margin))
+        if side >= min(w, h):
+            self.since = 0
+            return (0, 0, w, h)
+        x0 = min(max((startX + endX - side) // 2, 0), w - side)
+        y0 = min(max((startY + endY - side) // 2, 0), h - side)
+        return (x0, y0, x0 + side, y0 + side)
+
+    def blob(self, image, size):
+        """Resize an image and write it into the preallocated blob of a detector input size
+
+        Arguments:
+            image {numpy.ndarray} -- A BGR image (a region of the frame)
+            size {int} -- One of sizes (read size once per frame, tick() may change it from another thread)
+
+        Returns:
+            numpy.ndarray -- The blob, with shape (1, 3, size, size). It is overwritten by the next call with the same size
+        """
+        return self.blobs[size].fill([image])
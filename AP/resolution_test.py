@@ -0,0 +1,72 @@
+import unittest
+import numpy as np
+import cv2
+from resolution import AdaptiveResolution
+
+class ResolutionTest(unittest.TestCase):
+    """These tests check the size and the region the face detector is given
+    """
+
+    def test_frameRate(self):
+        """
+        Function: count frames at 5 FPS, then at 30 FPS, with a target of 10 FPS
+
+        Assertion: the size shrinks one step at a time down to the smallest, then grows back to the largest
+        """
+        resolution = AdaptiveResolution(target_fps=10.0, hold=3)
+        now = 0.0
+        for _ in range(40):
+            now += 0.2
+            resolution.tick(now)
+        self.assertEqual(resolution.size, 150)
+
+        for _ in range(60):
+            now += 1 / 30.0
+            resolution.tick(now)
+        self.assertEqual(resolution.size, 300)
+
+    def test_fixedSize(self):
+        """
+        Function: count slow frames without a target frame rate
+
+        Assertion: the size stays the largest
+        """
+        resolution = AdaptiveResolution(target_fps=None, hold=1)
+        for i in range(20):
+            resolution.tick(i * 1.0)
+        self.assertEqual(resolution.size, 300)
+
+    def test_region(self):
+        """
+        Function: ask for the regions of 6 detections with a face known, then without
+
+        Assertion: a square around the face inside the frame, the whole frame every full_every detections and when no face is known
+        """
+        resolution = AdaptiveResolution(full_every=3, margin=0.5)
+        shape = (450, 600, 3)
+        face = (500, 20, 580, 100)
+        regions = [resolution.region(shape, [face]) for _ in range(6)]
+
+        self.assertEqual(regions[0], (440, 0, 600, 160))
+        self.assertEqual(regions[2], (0, 0, 600, 450))
+        self.assertEqual(regions[5], (0, 0, 600, 450))
+        self.assertEqual(resolution.region(shape, []), (0, 0, 600, 450))
+
+    def test_blob(self):
+        """
+        Function: make the blobs of 2 regions at the current size
+
+        Assertion: both are written into the same preallocated blob, with the values of cv2.dnn.blobFromImage()
+        """
+        resolution = AdaptiveResolution()
+        frame = np.random.RandomState(0).randint(0, 255, (450, 600, 3)).astype(np.uint8)
+        first = resolution.blob(frame, resolution.size)
+        second = resolution.blob(frame[100:200, 100:300], resolution.size)
+        self.assertTrue(np.shares_memory(first, second))
+
+        expected = cv2.dnn.blobFromImage(cv2.resize(frame[100:200, 100:300], (300, 300)), 1.0, (300, 300),
+                                         (104.0, 177.0, 123.0), swapRB=False, crop=False)
+        np.testing.assert_allclose(second, expected)
+
+if __name__ == "__main__":
+    unittest.main()
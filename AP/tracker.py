@@ -0,0 +1,192 @@
+import threading
+from collections import namedtuple
+import cv2
+
+def iou(a, b):
+    """Intersection over union of 2 boxes
+
+    Arguments:
+        a {tuple} -- (startX, startY, endX, endY)
+        b {tuple} -- (startX, startY, endX, endY)
+
+    Returns:
+        float -- 1 for identical boxes, 0 for boxes that do not overlap
+    """
+    w = min(a[2], b[2]) - max(a[0], b[0])
+    h = min(a[3], b[3]) - max(a[1], b[1])
+    if w <= 0 or h <= 0:
+        return 0.0
+    inter = w * h
+    return inter / float((a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter)
+
+
+# A face in one frame: its Track and a copy of the state of the track in that frame, which does not change when the track follows the face in the next frames
+TrackState = namedtuple("TrackState", ["track", "box", "stable", "vec", "name", "proba"])
+
+
+class Track:
+    """A face followed from frame to frame.
+    It remembers the last embedding and recognition of the face, so they can be reused while the face does not move.
+    """
+
+    def __init__(self, box, template):
+        """inits Track
+
+        Arguments:
+            box {tuple} -- (startX, startY, endX, endY) of the face in the frame
+            template {numpy.ndarray} -- The grayscale face, to find it in the next frames
+        """
+        self.box = box
+        self.anchor = box       # The box of the face when its embedding was computed
+        self.template = template
+        self.score = 1.0        # How well the template matched in the last frame
+        self.stable = False     # Whether the face has not moved since its embedding was computed
+        self.vec = None         # The last embedding of the face
+        self.age = 0            # Frames since the embedding was computed
+        self.name = None        # The last recognition of the face
+        self.proba = 0.0
+
+    def state(self):
+        """A copy of the state of the track in the current frame
+
+        Returns:
+            TrackState -- The track, its box, whether it is stable, and its last embedding and recognition
+        """
+        return TrackState(self, self.box, self.stable, self.vec, self.name, self.proba)
+
+
+class FaceTracker:
+    """This class avoids running the face detector on every frame.
+
+    - The detector runs every detect_every frames, when there is no face to follow, or when a face was lost (template match score below min_score)
+    - In between, each face is followed by matching its grayscale template in a window around its last position
+    - A face whose box overlaps the box of its last embedding by more than stable (IoU) is marked stable, so its embedding and recognition are reused,
+      for reuse frames at most: a still face still brings a new recognition now and then (see voting.py)
+
+    update() returns a copy of the state of each face in the frame (TrackState): with the pipeline of recognition.py, the faces of a frame are embedded
+    while the next frames already move the tracks. The tracks are only changed with the lock held, by update() and remember()
+    """
+
+    def __init__(self, detect_every=10, min_score=0.6, search=0.5, stable=0.85, reuse=5):
+        """inits FaceTracker
+
+        Keyword Arguments:
+            detect_every {int} -- Run the detector at least every this many frames (1 disables tracking)
+            min_score {float} -- Minimum template match score to keep following a face
+            search {float} -- Margin around the last box to search the face in, as a share of the box size
+            stable {float} -- Minimum IoU with the box of the last embedding to reuse it
+            reuse {int} -- Maximum number of frames an embedding is reused for
+        """
+        self.detect_every = detect_every
+        self.min_score = min_score
+        self.search = search
+        self.stable = stable
+        self.reuse = reuse
+        self.tracks = []
+        self.since = 0          # Frames since the last detection
+        self.frames = 0         # Frames processed
+        self.detections = 0     # Detector calls
+        self.gray = None        # Grayscale frame, reused from frame to frame
+        self.lock = threading.Lock()
+
+    def reset(self):
+        """Forget every face and the counters (at the start of a login)
+        """
+        with self.lock:
+            self.tracks = []
+            self.since = 0
+            self.frames = 0
+            self.detections = 0
+
+    def update(self, frame, detect):
+        """Find the faces of a new frame, by following the known faces or running the detector.
+        The detector runs without the lock, so remember() is not held up by it
+
+        Arguments:
+            frame {numpy.ndarray} -- A BGR frame
+            detect {function} -- The detector, returns the list of face boxes of a frame
+
+        Returns:
+            list -- The TrackState of each face in the frame
+        """
+        self.frames += 1
+        self.gray = gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.gray)
+
+        with self.lock:
+            if self.tracks and self.since + 1 < self.detect_every and all(self.follow(gray, track) for track in self.tracks):
+                self.since += 1
+                return [track.state() for track in self.tracks]
+
+        # (re)detect, keeping the embedding of faces that did not move
+        self.detections += 1
+        self.since = 0
+        boxes = detect(frame)
+        with self.lock:
+            tracks = []
+            for box in boxes:
+                (startX, startY, endX, endY) = box
+                track = Track(box, gray[startY:endY, startX:endX].copy())
+                previous = max(self.tracks, key=lambda t: iou(t.anchor, box), default=None)
+                if previous is not None and previous.vec is not None and iou(previous.anchor, box) > self.stable:
+                    track.vec, track.name, track.proba = previous.vec, previous.name, previous.proba
+                    track.anchor = previous.anchor
+                    track.age = previous.age + 1
+                    track.stable = track.age <= self.reuse
+                tracks.append(track)
+            self.tracks = tracks
+            return [track.state() for track in tracks]
+
+    def follow(self, gray, track):
+        """Find a face in a new frame by template matching around its last box
+
+        Arguments:
+            gray {numpy.ndarray} -- The grayscale frame
+            track {Track} -- The face
+
+        Returns:
+            bool -- True if the face was found (the track is updated), False if it was lost
+        """
+        (startX, startY, endX, endY) = track.box
+        (h, w) = gray.shape[:2]
+        (tH, tW) = track.template.shape[:2]
+        marginX, marginY = int(tW * self.search), int(tH * self.search)
+
+        # search window around the last box (clipped to the frame)
+        x0, y0 = max(startX - marginX, 0), max(startY - marginY, 0)
+        x1, y1 = min(endX + marginX, w), min(endY + marginY, h)
+        if x1 - x0 < tW or y1 - y0 < tH:
+            track.score = 0.0
+            return False
+
+        result = cv2.matchTemplate(gray[y0:y1, x0:x1], track.template, cv2.TM_CCOEFF_NORMED)
+        (_, score, _, (x, y)) = cv2.minMaxLoc(result)
+        track.score = score
+        if score < self.min_score:
+            return False
+
+        track.box = (x0 + x, y0 + y, x0 + x + tW, y0 + y + tH)
+        track.age += 1
+        track.stable = track.vec is not None and track.age <= self.reuse and iou(track.anchor, track.box) > self.stable
+        return True
+
+    def remember(self, state, vec, name, proba):
+        """Store a new embedding and recognition of a face, computed from the frame of state. The box of the face in that frame becomes the reference for stability,
+        the track may have followed the face in newer frames since
+
+        Arguments:
+            state {TrackState} -- The face, as returned by update()
+            vec {numpy.ndarray} -- The embedding
+            name {str} -- The recognized name
+            proba {float} -- The probability of the name
+        """
+        with self.lock:
+            track = state.track
+            track.vec, track.name, track.proba = vec, name, proba
+            track.anchor = state.box
+            track.age = 0
+            track.stable = iou(state.box, track.box) > self.stable
+
+    def report(self):
+        """Print how many frames needed the detector
+        """
+        print("[INFO] detector ran on {} of {} frames".format(self.detections, self.frames))
@@ -0,0 +1,103 @@
+import unittest
+import numpy as np
+from tracker import FaceTracker, iou
+
+class TrackerTest(unittest.TestCase):
+    """These tests check that the face tracker follows a synthetic face without calling the detector on every frame (no camera or model needed)
+    """
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.background = (rng.rand(450, 600, 3) * 255).astype(np.uint8)
+        self.face = (rng.rand(120, 100, 3) * 255).astype(np.uint8)
+        self.position = (100, 100)
+        self.calls = 0
+
+    def frame(self):
+        frame = self.background.copy()
+        (x, y) = self.position
+        frame[y:y + 120, x:x + 100] = self.face
+        return frame
+
+    def detect(self, frame):
+        self.calls += 1
+        (x, y) = self.position
+        return [(x, y, x + 100, y + 120)]
+
+    def test_iou(self):
+        """
+        Function: compute the IoU of identical, half overlapping and separate boxes
+
+        Assertion: 1, 1/3 and 0
+        """
+        self.assertEqual(iou((0, 0, 10, 10), (0, 0, 10, 10)), 1.0)
+        self.assertAlmostEqual(iou((0, 0, 10, 10), (5, 0, 15, 10)), 1 / 3.0)
+        self.assertEqual(iou((0, 0, 10, 10), (20, 20, 30, 30)), 0.0)
+
+    def test_follow(self):
+        """
+        Function: move the face 1 pixel per frame for 30 frames, detecting every 10 frames
+
+        Assertion: the box follows the face on every frame and the detector runs on 3 frames only
+        """
+        tracker = FaceTracker(detect_every=10)
+        for i in range(30):
+            self.position = (100 + i, 100 + i // 2)
+            tracks = tracker.update(self.frame(), self.detect)
+            self.assertEqual(len(tracks), 1)
+            self.assertEqual(tracks[0].box[:2], self.position)
+
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(tracker.frames, 30)
+
+    def test_reuse(self):
+        """
+        Function: remember an embedding, then keep the face still and move it far away
+
+        Assertion: the embedding is reused while the face is still, and recomputed once it has moved
+        """
+        tracker = FaceTracker(detect_every=10)
+        track = tracker.update(self.frame(), self.detect)[0]
+        self.assertFalse(track.stable)
+        tracker.remember(track, "vec", "Fahim", 0.9)
+
+        track = tracker.update(self.frame(), self.detect)[0]
+        self.assertTrue(track.stable)
+        self.assertEqual(track.name, "Fahim")
+
+        self.position = (130, 100)
+        track = tracker.update(self.frame(), self.detect)[0]
+        self.assertFalse(track.stable)
+
+    def test_reuseLimit(self):
+        """
+        Function: remember an embedding and keep the face still for 6 frames, reusing embeddings for 5 frames at most
+
+        Assertion: the embedding is reused for 5 frames, then recomputed
+        """
+        tracker = FaceTracker(detect_every=10, reuse=5)
+        tracker.remember(tracker.update(self.frame(), self.detect)[0], "vec", "Fahim", 0.9)
+
+        stable = [tracker.update(self.frame(), self.detect)[0].stable for _ in range(6)]
+        self.assertEqual(stable, [True] * 5 + [False])
+
+    def test_pipelined(self):
+        """
+        Function: follow the face in the next frame before the embedding of the first frame is remembered (like the pipeline of recognition.py)
+
+        Assertion: the state of the first frame keeps its box, and the embedding is anchored to the box of the frame it was computed from
+        """
+        tracker = FaceTracker(detect_every=10)
+        first = tracker.update(self.frame(), self.detect)[0]
+        self.position = (140, 100)
+        second = tracker.update(self.frame(), self.detect)[0]
+        self.assertEqual((first.box[:2], second.box[:2]), ((100, 100), (140, 100)))
+        self.assertIs(first.track, second.track)
+
+        tracker.remember(first, "vec", "Fahim", 0.9)
+        self.assertEqual(first.track.anchor, first.box)
+        self.assertFalse(first.track.stable)
+        self.assertIsNone(first.vec)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,156 +1,428 @@
 # import the necessary packages
+from concurrent.futures import ProcessPoolExecutor
 from imutils import paths
 import numpy as np
 import argparse
+import hashlib
 import imutils
 import pickle
+import shutil
+import time
 import cv2
 import os
 from sklearn.preprocessing import LabelEncoder
 from sklearn.svm import SVC
+import model_store
+import quality
+import models
 
-if __name__ == "__main__":
-	"""This program is used to train out Agent Pi to recognise faces with the available dataset.
+# The models of a worker process, loaded once by initWorker()
+detector = None
+embedder = None
+profile = None
+confidence = 0.5
 
-	The general steps are:
-	- Load our serialized face detector from disk
-	- Load our serialized face embedding model from disk
-	- Grab the paths to the input images in our dataset
-	- Loop over the image paths, detect faces and encode
-	- Dump the facial embeddings and names to disk
-	- Load the face embeddings
-	- Encode the labels
-	- Train the model used to accept the 128-d embeddings of the face and then produce the actual face recognition
-	- Write the face recognition model to disk
-	- Write the label encoder to disk
+def initWorker(args):
+	"""Load the face detector and the face embedding model in a worker process
+
+	Arguments:
+		args {dict} -- The "profile" (see models.py) and "confidence" of the training
 	"""
-	
-	args = {"dataset":"dataset",
-	"embeddings":"output/embeddings.pickle",
-	"detector":"face_detection_model",
-	"embedding_model":"openface_nn4.small2.v1.t7",
-	"confidence":0.5}
-
-	# load our serialized face detector from disk
-	print("[INFO] loading face detector...")
-	protoPath = os.path.sep.join([args["detector"], "deploy.prototxt"])
-	modelPath = os.path.sep.join([args["detector"],
-		"res10_300x300_ssd_iter_140000.caffemodel"])
-	detector = cv2.dnn.readNetFromCaffe(protoPath, modelPath)
-
-	# load our serialized face embedding model from disk
-	print("[INFO] loading face recognizer...")
-	embedder = cv2.dnn.readNetFromTorch(args["embedding_model"])
+	global detector, embedder, profile, confidence
 
-	# grab the paths to the input images in our dataset
-	print("[INFO] quantifying faces...")
-	imagePaths = list(paths.list_images(args["dataset"]))
-
-	# initialize our lists of extracted facial embeddings and
-	# corresponding people names
-	knownEmbeddings = []
-	knownNames = []
-
-	# initialize the total number of faces processed
-	total = 0
-
-	# loop over the image paths
-	for (i, imagePath) in enumerate(imagePaths):
-		# extract the person name from the image path
-		print("[INFO] processing image {}/{}".format(i + 1,
-			len(imagePaths)))
-		name = imagePath.split(os.path.sep)[-2]
-
-		# load the image, resize it to have a width of 600 pixels (while
-		# maintaining the aspect ratio), and then grab the image
-		# dimensions
-		image = cv2.imread(imagePath)
-		image = imutils.resize(image, width=600)
-		(h, w) = image.shape[:2]
+	# every core already runs its own worker process
+	cv2.setNumThreads(1)
 
-		# construct a blob from the image
-		imageBlob = cv2.dnn.blobFromImage(
-			cv2.resize(image, (300, 300)), 1.0, (300, 300),
-			(104.0, 177.0, 123.0), swapRB=False, crop=False)
+	# load our serialized face detector and face embedding model from disk
+	profile = models.profile(args["profile"])
+	detector = models.loadDetector(profile)
+	embedder = models.loadEmbedder(profile)
+	confidence = args["confidence"]
 
-		# apply OpenCV's deep learning-based face detector to localize
-		# faces in the input image
-		detector.setInput(imageBlob)
-		detections = detector.forward()
+def detectBatch(images):
+	"""Find the most probable face of each image with the DNN face detector, in a single forward pass for all the images
+
+	Arguments:
+		images {list} -- The images
+
+	Returns:
+		list -- The (startX, startY, endX, endY) box of the face of each image. None for the images where no face was found
+	"""
+	# construct a single blob from the images and apply OpenCV's deep
+	# learning-based face detector to localize faces in all of them
+	imageBlob = cv2.dnn.blobFromImages(
+		[cv2.resize(image, (300, 300)) for image in images], 1.0, (300, 300),
+		profile["detector_spec"]["mean"], swapRB=False, crop=False)
+	detector.setInput(imageBlob)
+	detections = detector.forward()[0, 0]
+
+	boxes = []
+	for (b, image) in enumerate(images):
+		(h, w) = image.shape[:2]
+
+		# the first column of each detection is the index of its image in the batch
+		found = detections[detections[:, 0] == b]
 
 		# ensure at least one face was found
-		if len(detections) > 0:
-			# we're making the assumption that each image has only ONE
-			# face, so find the bounding box with the largest probability
-			i = np.argmax(detections[0, 0, :, 2])
-			confidence = detections[0, 0, i, 2]
-
-			# ensure that the detection with the largest probability also
-			# means our minimum probability test (thus helping filter out
-			# weak detections)
-			if confidence > args["confidence"]:
-				# compute the (x, y)-coordinates of the bounding box for
-				# the face
-				box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-				(startX, startY, endX, endY) = box.astype("int")
-
-				# extract the face ROI and grab the ROI dimensions
-				face = image[startY:endY, startX:endX]
-				(fH, fW) = face.shape[:2]
-
-				# ensure the face width and height are sufficiently large
-				if fW < 20 or fH < 20:
-					continue
-
-				# construct a blob for the face ROI, then pass the blob
-				# through our face embedding model to obtain the 128-d
-				# quantification of the face
-				faceBlob = cv2.dnn.blobFromImage(face, 1.0 / 255,
-					(96, 96), (0, 0, 0), swapRB=True, crop=False)
-				embedder.setInput(faceBlob)
-				vec = embedder.forward()
-
-				# add the name of the person + corresponding face
-				# embedding to their respective lists
-				knownNames.append(name)
-				knownEmbeddings.append(vec.flatten())
-				total += 1
-
-	# dump the facial embeddings + names to disk
-	print("[INFO] serializing {} encodings...".format(total))
-	data = {"embeddings": knownEmbeddings, "names": knownNames}
-	f = open(args["embeddings"], "wb")
-	f.write(pickle.dumps(data))
-	f.close()
+		if len(found) == 0:
+			boxes.append(None)
+			continue
+
+		# we're making the assumption that each image has only ONE
+		# face, so find the bounding box with the largest probability
+		i = np.argmax(found[:, 2])
+
+		# ensure that the detection with the largest probability also
+		# means our minimum probability test (thus helping filter out
+		# weak detections)
+		if found[i, 2] <= confidence:
+			boxes.append(None)
+			continue
+
+		# compute the (x, y)-coordinates of the bounding box for
+		# the face
+		box = found[i, 3:7] * np.array([w, h, w, h])
+		boxes.append(tuple(box.astype("int")))
+	return boxes
+
+def embedImages(imagePaths):
+	"""Detect the face of dataset images and compute their embedding (in a worker process).
+	The DNN detector and the embedder each run a single forward pass on the whole batch.
+
+	Arguments:
+		imagePaths {list} -- The paths of the images
+
+	Returns:
+		list -- The 128-d embedding of the face of each image. None for the images where no face was found
+	"""
+	# load the images and resize them to have a width of 600 pixels (while
+	# maintaining the aspect ratio)
+	images = [imutils.resize(cv2.imread(imagePath), width=600) for imagePath in imagePaths]
+
+	if profile["detector_spec"]["type"] == "cascade":
+		# a cascade finds the faces of one image at a time, take the largest one
+		boxes = []
+		for image in images:
+			found = models.cascadeFaces(detector, cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+			boxes.append(max(found, key=lambda box: (box[2] - box[0]) * (box[3] - box[1]), default=None))
+	else:
+		boxes = detectBatch(images)
+
+	faces = []
+	owners = []
+	for (b, (image, box)) in enumerate(zip(images, boxes)):
+		if box is None:
+			continue
+
+		# extract the face ROI and grab the ROI dimensions
+		(startX, startY, endX, endY) = box
+		face = image[startY:endY, startX:endX]
+		(fH, fW) = face.shape[:2]
+
+		# ensure the face width and height are sufficiently large
+		if fW < 20 or fH < 20:
+			continue
+		faces.append(face)
+		owners.append(b)
+
+	vecs = [None] * len(images)
+	if not faces:
+		return vecs
+
+	# construct a single blob for the face ROIs, then pass it through
+	# our face embedding model to obtain the 128-d quantification of
+	# every face at once
+	spec = profile["embedder_spec"]
+	faceBlob = cv2.dnn.blobFromImages(faces, spec["scale"],
+		(spec["size"], spec["size"]), spec["mean"], swapRB=spec["swapRB"], crop=False)
+	embedder.setInput(faceBlob)
+	for (b, vec) in zip(owners, embedder.forward()):
+		vecs[b] = vec.flatten()
+	return vecs
+
+def contentHash(imagePath):
+	"""The SHA-1 of the content of a file
+
+	Arguments:
+		imagePath {str} -- The path of the file
+
+	Returns:
+		str -- The hexadecimal digest
+	"""
+	sha1 = hashlib.sha1()
+	with open(imagePath, "rb") as f:
+		for chunk in iter(lambda: f.read(1 << 20), b""):
+			sha1.update(chunk)
+	return sha1.hexdigest()
+
+def filterDataset(imagePaths, images, options):
+	"""Choose the images of the dataset worth embedding (see quality.py). The scores of the images are computed once and kept in the cache with their embedding
+
+	Arguments:
+		imagePaths {list} -- The paths of the images
+		images {dict} -- The cache entry of each image, given a "quality" entry if it has none
+		options {dict} -- Keyword arguments of quality.select(). None to keep every image
+
+	Returns:
+		dict -- The reason to skip each image ("duplicate", "blurry", "dark", "bright" or "unreadable"), None to embed it
+	"""
+	missing = [imagePath for imagePath in imagePaths if "quality" not in images[imagePath]]
+	thumbnails = [quality.thumbnail(imagePath) for imagePath in missing]
+	readable = [i for (i, thumbnail) in enumerate(thumbnails) if thumbnail is not None]
+	if readable:
+		stats = quality.scores(np.stack([thumbnails[i] for i in readable]))
+		for (j, i) in enumerate(readable):
+			images[missing[i]]["quality"] = {"phash": stats["hash"][j], "sharpness": float(stats["sharpness"][j]), "brightness": float(stats["brightness"][j])}
+	for (i, thumbnail) in enumerate(thumbnails):
+		if thumbnail is None:
+			images[missing[i]]["quality"] = None
+
+	reasons = {imagePath: None if images[imagePath]["quality"] is not None else "unreadable" for imagePath in imagePaths}
+	if options is None:
+		return reasons
+	scored = [imagePath for imagePath in imagePaths if reasons[imagePath] is None]
+	if scored:
+		stats = {"hash": np.stack([images[imagePath]["quality"]["phash"] for imagePath in scored]),
+			"sharpness": [images[imagePath]["quality"]["sharpness"] for imagePath in scored],
+			"brightness": [images[imagePath]["quality"]["brightness"] for imagePath in scored]}
+		names = [imagePath.split(os.path.sep)[-2] for imagePath in scored]
+		reasons.update(zip(scored, quality.select(names, stats, **options)))
+	return reasons
+
+def embedDataset(args, workers, batch=8):
+	"""Compute the embedding of every image of the dataset. An image is only processed if it is new or its content changed since the last training,
+	the others come from the cache (keyed by path, modification time and SHA-1 of the content, see model_store.saveCache()). Images are processed in batches by a pool of worker processes.
+	Near-duplicate, blurry, too dark and too bright images are left out before the models run on them, unless args "filter" is None (see filterDataset())
 
-	args = {
-	"embeddings":"output/embeddings.pickle",
-	"recognizer":"output/recognizer.pickle",
-	"le":"output/le.pickle"
-	}
+	Arguments:
+		args {dict} -- The "dataset", "cache", "profile", "confidence" and "filter" of the training
+		workers {int} -- Number of worker processes
 
+	Keyword Arguments:
+		batch {int} -- Number of images per forward pass of the models
+
+	Returns:
+		tuple -- The list of embeddings and the list of names of the people, for the images where a face was found
+	"""
+	selected = models.profile(args["profile"])
+	key = (selected["detector"], selected["embedder"], args["confidence"])
+	cache = model_store.loadCache(args["cache"], key)
+
+	# grab the paths to the input images in our dataset
+	imagePaths = sorted(paths.list_images(args["dataset"]))
+	images = {}
+	for imagePath in imagePaths:
+		stat = os.stat(imagePath)
+		entry = cache.get(imagePath)
+		if entry is not None and (entry["mtime"], entry["size"]) == (stat.st_mtime, stat.st_size):
+			images[imagePath] = entry
+			continue
+
+		# the file was touched, its content may not have changed
+		digest = contentHash(imagePath)
+		if entry is not None and entry["hash"] == digest:
+			images[imagePath] = dict(entry, mtime=stat.st_mtime, size=stat.st_size)
+			continue
+		images[imagePath] = {"mtime": stat.st_mtime, "size": stat.st_size, "hash": digest}
+
+	# leave out the images that would add nothing, before the models run on them
+	begin = time.time()
+	reasons = filterDataset(imagePaths, images, args.get("filter"))
+	filterTime = time.time() - begin
+	skipped = [imagePath for imagePath in imagePaths if reasons[imagePath] is not None]
+	# the images embedded before, or skipped before, are not embedded now anyway
+	saved = [imagePath for imagePath in skipped if "vec" not in images[imagePath]]
+	todo = [imagePath for imagePath in imagePaths if reasons[imagePath] is None and "vec" not in images[imagePath]]
+	counts = {reason: sum(reasons[imagePath] == reason for imagePath in skipped) for reason in sorted(set(reasons.values()) - {None})}
+	print("[INFO] quality filter: {} of {} images skipped ({}) in {:.2f}s".format(len(skipped), len(imagePaths),
+		", ".join("{} {}".format(count, reason) for (reason, count) in counts.items()) or "none", filterTime))
+
+	print("[INFO] quantifying faces: {} images to embed out of {}...".format(len(todo), len(imagePaths)))
+	if todo:
+		begin = time.time()
+		batches = [todo[i:i + batch] for i in range(0, len(todo), batch)]
+		with ProcessPoolExecutor(workers, initializer=initWorker, initargs=(args,)) as pool:
+			done = 0
+			for (imageBatch, vecs) in zip(batches, pool.map(embedImages, batches)):
+				for (imagePath, vec) in zip(imageBatch, vecs):
+					images[imagePath]["vec"] = vec
+				done += len(imageBatch)
+				print("[INFO] processing image {}/{}".format(done, len(todo)))
+		perImage = (time.time() - begin) / len(todo)
+		if saved:
+			print("[INFO] {:.2f}s per embedded image: about {:.1f}s saved by skipping {} images".format(perImage, perImage * len(saved) - filterTime, len(saved)))
+	model_store.saveCache(args["cache"], key, images)
+
+	# extract the person name from the image path
+	kept = [imagePath for imagePath in imagePaths if reasons[imagePath] is None and images[imagePath]["vec"] is not None]
+	knownEmbeddings = [images[imagePath]["vec"] for imagePath in kept]
+	knownNames = [imagePath.split(os.path.sep)[-2] for imagePath in kept]
+	return knownEmbeddings, knownNames
+
+def trainSVC(args):
+	"""Train the SVC recognizer of the "svc" backend of recognition.py on the embeddings of the store
+
+	Arguments:
+		args {dict} -- The "store" directory, and the "recognizer" and "le" paths to write to
+	"""
 	# load the face embeddings
 	print("[INFO] loading face embeddings...")
-	data = pickle.loads(open(args["embeddings"], "rb").read())
+	vectors, _, _ = model_store.load(args["store"])
+	names = model_store.names(args["store"])
 
 	# encode the labels
 	print("[INFO] encoding labels...")
 	le = LabelEncoder()
-	labels = le.fit_transform(data["names"])
+	labels = le.fit_transform(names)
 
 	# train the model used to accept the 128-d embeddings of the face and
 	# then produce the actual face recognition
 	print("[INFO] training model...")
 	recognizer = SVC(C=1.0, kernel="linear", probability=True)
-	recognizer.fit(data["embeddings"], labels)
-
-	# write the actual face recognition model to disk
-	f = open(args["recognizer"], "wb")
-	f.write(pickle.dumps(recognizer))
-	f.close()
-
-	# write the label encoder to disk
-	f = open(args["le"], "wb")
-	f.write(pickle.dumps(le))
-	f.close()
-	print("[INFO] training finished...")
\ No newline at end of file
+	recognizer.fit(vectors, labels)
+
+	# write the actual face recognition model and the label encoder to disk
+	# (to temporary files first, so a recognizer reloading them never reads half a file)
+	for (path, model) in ((args["recognizer"], recognizer), (args["le"], le)):
+		f = open(path + ".tmp", "wb")
+		f.write(pickle.dumps(model))
+		f.close()
+		os.replace(path + ".tmp", path)
+
+def train(args, options):
+	"""Train on the dataset: embed the new or changed images, write the embeddings and names to the store and, with --svc, train the SVC recognizer
+
+	Arguments:
+		args {dict} -- The "dataset", "store", "cache", "profile" and "confidence" of the training
+		options {argparse.Namespace} -- The options of the command line
+
+	Raises:
+		ValueError: No face was found in the dataset (the store is left as it is)
+	"""
+	knownEmbeddings, knownNames = embedDataset(args, options.workers, options.batch)
+	total = len(knownEmbeddings)
+	if not total:
+		raise ValueError("no face was found in the images of {}, there is nothing to train on".format(args["dataset"]))
+
+	# write the facial embeddings + names to disk (see model_store.py),
+	# the nearest-neighbour index of recognition.py loads them as they are
+	print("[INFO] serializing {} encodings...".format(total))
+	model_store.save(args["store"], knownEmbeddings, knownNames, models.profile(args["profile"])["embedder"])
+
+	if options.svc:
+		trainSVC({"store":args["store"],
+		"recognizer":os.path.join(args["store"], "recognizer.pickle"),
+		"le":os.path.join(args["store"], "le.pickle")})
+	print("[INFO] training finished...")
+
+def snapshot(dataset):
+	"""The modification time and the size of every image of the dataset
+
+	Arguments:
+		dataset {str} -- The directory of the dataset
+
+	Returns:
+		dict -- (mtime, size) of each image path
+	"""
+	images = {}
+	for imagePath in paths.list_images(dataset):
+		try:
+			stat = os.stat(imagePath)
+		except FileNotFoundError:
+			continue	# removed while listing
+		images[imagePath] = (stat.st_mtime, stat.st_size)
+	return images
+
+def watch(args, options):
+	"""Train again each time the dataset changes, until interrupted (--watch).
+	The dataset is polled every --interval seconds. A training starts once the dataset has not changed for --debounce seconds,
+	so copying a batch of photos only trains once, and never on half-copied files.
+	A failed training is tried again after a delay that doubles after each failure (up to --max-backoff seconds), or after the next change.
+	Only the new or changed images are embedded (see embedDataset()). The store is replaced file by file with labels.json last,
+	which the running recognizer of menu.py watches to reload it (see RecognitionEngine.reload())
+
+	Arguments:
+		args {dict} -- The "dataset", "store", "cache", "profile" and "confidence" of the training
+		options {argparse.Namespace} -- The options of the command line
+	"""
+	trained = None
+	pending = None
+	changed = 0.0
+	failures = 0	# failed trainings of the pending dataset in a row
+	retry = 0.0		# time before which a failed training is not tried again
+	print("[INFO] watching {} (Ctrl+C to stop)...".format(args["dataset"]))
+	try:
+		while True:
+			current = snapshot(args["dataset"])
+			if current != trained:
+				if current != pending:
+					# a new change may fix a failed training, it is tried after the debounce only
+					pending = current
+					changed = time.time()
+					retry = 0.0
+				elif time.time() - changed >= options.debounce and time.time() >= retry:
+					print("[INFO] the dataset changed, training..." if not failures else "[INFO] training again...")
+					try:
+						train(args, options)
+						trained = current
+						failures = 0
+					except Exception as e:
+						# the dataset stays pending: try again later, waiting twice as long after each failure
+						failures += 1
+						delay = min(options.debounce * 2 ** failures, options.max_backoff)
+						retry = time.time() + delay
+						print("[INFO] training failed: {}, trying again in {:.0f} seconds".format(e, delay))
+			time.sleep(options.interval)
+	except KeyboardInterrupt:
+		print("[INFO] stopped watching")
+
+if __name__ == "__main__":
+	"""This program is used to train out Agent Pi to recognise faces with the available dataset.
+
+	The general steps are:
+	- Grab the paths to the input images in our dataset
+	- Leave out near-duplicate, blurry, too dark and too bright images (see quality.py)
+	- Detect faces and encode the new or changed images, in parallel worker processes which load the face detector and the face embedding model
+	- Take the embeddings of the other images from the cache
+	- Write the facial embeddings and names to disk (see model_store.py), the nearest-neighbour index (see embedding_index.py) needs no training
+	- With --svc, for the "svc" backend of recognition.py:
+		- Load the face embeddings
+		- Encode the labels
+		- Train the model used to accept the 128-d embeddings of the face and then produce the actual face recognition
+		- Write the face recognition model to disk
+		- Write the label encoder to disk
+	- With --watch, keep running and do all of this again each time images are added, changed or removed in the dataset
+	"""
+	parser = argparse.ArgumentParser(description="Train the facial recognition of the Agent Pi on the dataset")
+	parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes (default: one per core)")
+	parser.add_argument("--batch", type=int, default=8, help="number of images per forward pass of the models")
+	parser.add_argument("--no-cache", action="store_true", help="process every image again")
+	parser.add_argument("--svc", action="store_true", help="also train the SVC recognizer (output/recognizer.pickle and output/le.pickle)")
+	parser.add_argument("--watch", action="store_true", help="keep running and train again each time the dataset changes")
+	parser.add_argument("--interval", type=float, default=2.0, help="seconds between 2 checks of the dataset (--watch)")
+	parser.add_argument("--debounce", type=float, default=10.0, help="seconds without change before training (--watch)")
+	parser.add_argument("--max-backoff", type=float, default=600.0, help="longest wait before trying a failed training again (--watch)")
+	parser.add_argument("--no-filter", action="store_true", help="embed every image, even near-duplicates and blurry, dark or bright ones (see quality.py)")
+	parser.add_argument("--max-distance", type=int, default=4, help="images of a person whose perceptual hashes differ by at most this many bits are duplicates")
+	parser.add_argument("--min-sharpness", type=float, default=15.0, help="minimum variance of the Laplacian of an image")
+	parser.add_argument("--profile", default=os.environ.get("CARSHARE_FACE_PROFILE", "default"), choices=sorted(models.PROFILES),
+		help="models to compute the embeddings with (see models.py), the same as the recognition of the Agent Pi")
+	options = parser.parse_args()
+
+	args = {"dataset":"dataset",
+	"store":"output",
+	"cache":"output/embedding_cache",
+	"profile":options.profile,
+	"confidence":0.5,
+	"filter":None if options.no_filter else {"max_distance":options.max_distance, "min_sharpness":options.min_sharpness}}
+
+	if options.no_cache and os.path.exists(args["cache"]):
+		shutil.rmtree(args["cache"])
+
+	if options.watch:
+		watch(args, options)
+	else:
+		try:
+			train(args, options)
+		except ValueError as e:
+			raise SystemExit("[INFO] training failed: {}".format(e))
@@ -0,0 +1,95 @@
+from collections import deque
+import math
+
+class TemporalVote:
+    """This class decides who is in front of the camera from the recognitions of several frames, instead of the first frame that passes the threshold.
+    The last window recognitions are kept and a decision is made as soon as they are confident enough:
+
+    - "sprt": sequential probability ratio test. Each recognition of a name with probability p adds log(p / (1 - p)) to the score of that name
+      and subtracts it from the other names. A name is accepted when its score reaches log((1 - beta) / alpha).
+      A very confident frame decides on its own, a doubtful one needs several agreeing frames.
+    - "average": a name is accepted when its average probability over the window (0 for frames recognizing someone else) passes threshold,
+      after at least min_frames frames.
+
+    Embeddings reused by the tracker (see tracker.py) are the same object as the one counted before for that face, they bring no new evidence and are ignored.
+    The embeddings of the recognitions in the window are kept, so a reused embedding is recognized even when several faces are tracked.
+    """
+
+    def __init__(self, mode="sprt", window=15, alpha=0.01, beta=0.1, threshold=0.6, min_frames=3):
+        """inits TemporalVote
+
+        Keyword Arguments:
+            mode {str} -- "sprt" or "average"
+            window {int} -- Number of recognitions kept
+            alpha {float} -- Accepted rate of logging in the wrong person ("sprt")
+            beta {float} -- Accepted rate of missing the right person ("sprt")
+            threshold {float} -- Minimum average probability ("average")
+            min_frames {int} -- Minimum number of recognitions ("average")
+        """
+        if mode not in ("sprt", "average"):
+            raise ValueError("Unknown voting mode: {}".format(mode))
+        self.mode = mode
+        self.window = window
+        self.bound = math.log((1 - beta) / alpha)
+        self.threshold = threshold
+        self.min_frames = min_frames
+        self.votes = deque(maxlen=window)
+        self.seen = deque(maxlen=window)    # Embeddings of the recognitions in the window
+        self.frames = 0         # Recognitions counted since the last reset
+
+    def reset(self):
+        """Forget every recognition (at the start of a login, or after a decision that was not accepted)
+        """
+        self.votes.clear()
+        self.seen.clear()
+        self.frames = 0
+
+    def update(self, name, proba, vec=None):
+        """Count a recognition and check if a decision can be made
+
+        Arguments:
+            name {str} -- The recognized name
+            proba {float} -- Its probability
+
+        Keyword Arguments:
+            vec {numpy.ndarray} -- The embedding it was recognized from, to ignore reused embeddings
+
+        Returns:
+            str -- The decided name. None if the recognitions are not confident enough yet
+        """
+        if vec is not None:
+            # compared by identity: the tracker reuses the object itself, a new embedding is never the same object
+            if any(vec is seen for seen in self.seen):
+                return None
+            self.seen.append(vec)
+
+        proba = min(max(float(proba), 1e-6), 1 - 1e-6)
+        self.votes.append((name, proba))
+        self.frames += 1
+        return self.decide()
+
+    def decide(self):
+        """The decision on the recognitions in the window
+
+        Returns:
+            str -- The decided name. None if the recognitions are not confident enough yet
+        """
+        if not self.votes:
+            return None
+
+        if self.mode == "sprt":
+            scores = dict.fromkeys((name for name, _ in self.votes), 0.0)
+            for name, proba in self.votes:
+                evidence = math.log(proba / (1 - proba))
+                for other in scores:
+                    scores[other] += evidence if other == name else -evidence
+            best = max(scores, key=scores.get)
+            return best if scores[best] >= self.bound else None
+
+        if len(self.votes) < self.min_frames:
+            return None
+        totals = {}
+        for name, proba in self.votes:
+            totals[name] = totals.get(name, 0.0) + proba
+        best = max(totals, key=totals.get)
+        return best if totals[best] / len(self.votes) > self.threshold else None
@@ -0,0 +1,76 @@
+import unittest
+import numpy as np
+from voting import TemporalVote
+
+class VotingTest(unittest.TestCase):
+    """These tests check the decisions made on the recognitions of several frames
+    """
+
+    def test_confidentFrame(self):
+        """
+        Function: count one recognition with probability 0.99
+
+        Assertion: it decides on its own
+        """
+        vote = TemporalVote()
+        self.assertEqual(vote.update("Tyler", 0.99), "Tyler")
+
+    def test_doubtfulFrames(self):
+        """
+        Function: count recognitions with probability 0.8
+
+        Assertion: several agreeing frames are needed, a disagreeing frame delays the decision
+        """
+        vote = TemporalVote()
+        self.assertIsNone(vote.update("Vinh", 0.8))
+        self.assertIsNone(vote.update("Vinh", 0.8))
+        self.assertIsNone(vote.update("Fahim", 0.8))
+        decisions = [vote.update("Vinh", 0.8) for _ in range(5)]
+        self.assertEqual(decisions[-1], "Vinh")
+        self.assertIsNone(decisions[0])
+
+    def test_reusedEmbedding(self):
+        """
+        Function: count the same embedding object several times
+
+        Assertion: only the first one is counted
+        """
+        vote = TemporalVote()
+        vec = np.zeros((1, 128))
+        for _ in range(5):
+            self.assertIsNone(vote.update("Vinh", 0.7, vec))
+        self.assertEqual(vote.frames, 1)
+
+    def test_reusedEmbeddings(self):
+        """
+        Function: count the embeddings of 2 tracked faces, each reused for several frames, then a new embedding of the first face
+
+        Assertion: each embedding is counted once
+        """
+        vote = TemporalVote()
+        first, second = np.zeros((1, 128)), np.ones((1, 128))
+        for _ in range(3):
+            vote.update("Vinh", 0.7, first)
+            vote.update("unknown", 0.7, second)
+        self.assertEqual(vote.frames, 2)
+        vote.update("Vinh", 0.7, np.zeros((1, 128)))
+        self.assertEqual(vote.frames, 3)
+
+    def test_average(self):
+        """
+        Function: average voting with 3 frames minimum
+
+        Assertion: no decision before 3 frames, then the name with the highest average probability above the threshold
+        """
+        vote = TemporalVote("average", window=5, threshold=0.6, min_frames=3)
+        self.assertIsNone(vote.update("Fahim", 0.9))
+        self.assertIsNone(vote.update("Fahim", 0.9))
+        self.assertEqual(vote.update("Fahim", 0.7), "Fahim")
+
+        vote.reset()
+        for _ in range(2):
+            vote.update("Fahim", 0.9)
+        self.assertIsNone(vote.update("Tyler", 0.9))
+
+if __name__ == "__main__":
+    unittest.main()
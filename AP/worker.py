@@ -0,0 +1,406 @@
+from imutils.video import VideoStream
+from multiprocessing import shared_memory
+from recognition import RecognitionEngine
+import multiprocessing
+import numpy as np
+import threading
+import signal
+import time
+import cv2
+
+class FrameRing:
+    """This class is a ring of frame buffers in shared memory, so frames go from the process of the camera to the process of recognition without being pickled or copied.
+
+    - The producer reserves a slot, resizes the camera frame straight into it and publishes it
+    - The consumer takes the newest published frame, the older ones are stale and given back (like DropOldestQueue in pipeline.py)
+    - A frame taken by the consumer is a view of the shared memory, its slot is not written until the consumer releases it
+    - When every slot is in use, the producer overwrites the oldest published frame, or drops the new one if there is none
+
+    The state, the sequence number and the shape of each slot are in a small shared array protected by a lock, only the slot numbers change hands.
+    A FrameRing given to a multiprocessing.Process is attached to the same memory in the child process.
+    """
+    FREE, WRITING, READY, USED = 0, 1, 2, 3
+    FIELDS = 4      # state, sequence, height, width of each slot
+
+    def __init__(self, slots=8, shape=(600, 600, 3), context=None):
+        """inits FrameRing and allocates its shared memory
+
+        Keyword Arguments:
+            slots {int} -- Number of frames
+            shape {tuple} -- Largest shape of a frame
+            context {multiprocessing.context.BaseContext} -- The multiprocessing context of the processes sharing the ring (default: spawn)
+        """
+        context = context or multiprocessing.get_context("spawn")
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.slotBytes = int(np.prod(shape))
+        self.memory = shared_memory.SharedMemory(create=True, size=self.slotBytes * slots)
+        self.meta = context.Array("q", slots * self.FIELDS, lock=False)
+        self.lock = context.Lock()
+        self.owner = True
+        self.attach()
+
+    def __getstate__(self):
+        return {"name": self.memory.name, "slots": self.slots, "shape": self.shape, "meta": self.meta, "lock": self.lock}
+
+    def __setstate__(self, state):
+        self.slots = state["slots"]
+        self.shape = state["shape"]
+        self.slotBytes = int(np.prod(self.shape))
+        self.memory = shared_memory.SharedMemory(name=state["name"])
+        self.meta = state["meta"]
+        self.lock = state["lock"]
+        self.owner = False
+        self.attach()
+
+    def attach(self):
+        """Map the shared memory and reset the counters of this process
+        """
+        self.buffer = np.ndarray((self.slots * self.slotBytes,), dtype=np.uint8, buffer=self.memory.buf)
+        self.address = self.buffer.ctypes.data
+        self.sequence = 0
+        self.dropped = 0
+        self.skipped = 0
+
+    def view(self, slot, shape):
+        """The frame of a slot
+
+        Arguments:
+            slot {int} -- The slot
+            shape {tuple} -- The shape of the frame
+
+        Returns:
+            numpy.ndarray -- A contiguous view of the shared memory
+        """
+        size = int(np.prod(shape))
+        return self.buffer[slot * self.slotBytes:slot * self.slotBytes + size].reshape(shape)
+
+    def reserve(self, shape):
+        """Reserve a slot to write a frame into (producer)
+
+        Arguments:
+            shape {tuple} -- The shape of the frame, (height, width, 3)
+
+        Raises:
+            ValueError: The frame is larger than the slots
+
+        Returns:
+            tuple -- The slot and its frame to write into. (None, None) if every slot is in use
+        """
+        if np.prod(shape) > self.slotBytes or len(shape) != len(self.shape):
+            raise ValueError("a frame of {} does not fit in slots of {}".format(shape, self.shape))
+        meta = self.meta
+        with self.lock:
+            states = meta[0::self.FIELDS]
+            if self.FREE in states:
+                slot = states.index(self.FREE)
+            else:
+                ready = [slot for slot in range(self.slots) if states[slot] == self.READY]
+                if not ready:
+                    self.dropped += 1
+                    return None, None
+                slot = min(ready, key=lambda slot: meta[slot * self.FIELDS + 1])
+                self.dropped += 1
+            meta[slot * self.FIELDS] = self.WRITING
+        return slot, self.view(slot, shape)
+
+    def publish(self, slot, shape):
+        """Make a written frame available to the consumer (producer)
+
+        Arguments:
+            slot {int} -- The slot from reserve()
+            shape {tuple} -- The shape of the frame written
+        """
+        self.sequence += 1
+        base = slot * self.FIELDS
+        with self.lock:
+            self.meta[base + 1] = self.sequence
+            self.meta[base + 2] = shape[0]
+            self.meta[base + 3] = shape[1]
+            self.meta[base] = self.READY
+
+    def get(self):
+        """Take the newest frame (consumer). The older frames published are given back
+
+        Returns:
+            numpy.ndarray -- The frame, a view of the shared memory. Give it back with release(). None if no new frame was published
+        """
+        meta = self.meta
+        with self.lock:
+            ready = [slot for slot in range(self.slots) if meta[slot * self.FIELDS] == self.READY]
+            if not ready:
+                return None
+            newest = max(ready, key=lambda slot: meta[slot * self.FIELDS + 1])
+            for slot in ready:
+                meta[slot * self.FIELDS] = self.FREE
+            self.skipped += len(ready) - 1
+            meta[newest * self.FIELDS] = self.USED
+            shape = (meta[newest * self.FIELDS + 2], meta[newest * self.FIELDS + 3]) + self.shape[2:]
+        return self.view(newest, shape)
+
+    def release(self, frame):
+        """Give back a frame from get(), its slot can be written again. Frames that are not views of the ring are ignored
+
+        Arguments:
+            frame {numpy.ndarray} -- The frame
+        """
+        offset = frame.ctypes.data - self.address
+        if offset < 0 or offset >= self.slots * self.slotBytes:
+            return
+        slot = offset // self.slotBytes
+        with self.lock:
+            if self.meta[slot * self.FIELDS] == self.USED:
+                self.meta[slot * self.FIELDS] = self.FREE
+
+    def reclaim(self):
+        """Give back every frame taken by the consumer (at the start of a recognition, the frames of the last one are not used anymore)
+        """
+        with self.lock:
+            for slot in range(self.slots):
+                if self.meta[slot * self.FIELDS] == self.USED:
+                    self.meta[slot * self.FIELDS] = self.FREE
+
+    def close(self):
+        """Unmap the shared memory, and free it in the process that allocated it
+        """
+        self.buffer = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+class RingEngine(RecognitionEngine):
+    """The recognition engine of the worker process: its frames come from a FrameRing filled by the process of the camera instead of a video stream
+    """
+
+    def __init__(self, ring, cancelled, **args):
+        """inits RingEngine
+
+        Arguments:
+            ring {FrameRing} -- The frames
+            cancelled {multiprocessing.Event} -- Set by the other process to give up the current recognition
+
+        Keyword Arguments:
+            Any key of RecognitionEngine.args
+        """
+        super().__init__(**args)
+        self.ring = ring
+        self.cancelled = cancelled
+
+    def start(self):
+        """Load the models, there is no video stream in this process
+        """
+        self.load()
+
+    def capture(self):
+        """Take the newest frame of the ring
+
+        Returns:
+            numpy.ndarray -- The frame. None if no new frame was published
+        """
+        frame = self.ring.get()
+        if frame is None:
+            time.sleep(0.005)
+        return frame
+
+    def release(self, frame):
+        """Give back a frame of the ring
+
+        Arguments:
+            frame {numpy.ndarray} -- The frame
+        """
+        self.ring.release(frame)
+
+    def observations(self, end):
+        """Recognize the faces of the frames of the ring (see RecognitionEngine.observations())
+        """
+        self.ring.reclaim()
+        yield from super().observations(end)
+
+
+def serve(conn, ring, cancelled, args):
+    """The worker process: load the models, then recognize faces each time the other process asks for it, until it asks to stop.
+    Requests are ("recognize", timeout, known) and ("stop",). Replies are ("ready", None) once the models are loaded, ("result", name) and ("error", message)
+
+    Arguments:
+        conn {multiprocessing.connection.Connection} -- The pipe to the other process
+        ring {FrameRing} -- The frames
+        cancelled {multiprocessing.Event} -- Set by the other process to give up the current recognition
+        args {dict} -- Arguments of the RecognitionEngine
+    """
+    # Ctrl+C reaches every process of the terminal, the other process cancels the recognition instead
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        engine = RingEngine(ring, cancelled, **args)
+        engine.load()
+        conn.send(("ready", None))
+        while True:
+            try:
+                request = conn.recv()
+            except EOFError:
+                break
+            if request[0] == "stop":
+                break
+            try:
+                conn.send(("result", engine.recognize(timeout=request[1], known=request[2])))
+            except Exception as e:
+                conn.send(("error", "{}: {}".format(type(e).__name__, e)))
+    except Exception as e:
+        conn.send(("error", "{}: {}".format(type(e).__name__, e)))
+    finally:
+        ring.close()
+        conn.close()
+
+
+class RecognitionWorker:
+    """This class runs facial recognition in a worker process, so detection, embedding and the recognizer do not compete for the GIL with the menu and the TCP client.
+    It is used by menu.py like a RecognitionEngine: load(), recognize(), cancel() and stop().
+
+    - load() starts the worker process (spawned, not forked, as this process already runs threads), which loads the models in the background
+    - This process keeps the camera: while a recognition runs, a thread resizes each new camera frame into a FrameRing in shared memory
+    - The worker process recognizes the frames of the ring with a RingEngine (its own capture, detection and embedding threads, see pipeline.py)
+    - Requests and results are small tuples over a pipe, a frame is never pickled
+    - stop() stops the camera and the worker process and frees the shared memory
+    """
+
+    def __init__(self, slots=8, shape=(600, 600, 3), **args):
+        """inits RecognitionWorker. Nothing is started until load() or recognize() is called.
+
+        Keyword Arguments:
+            slots {int} -- Number of frames of the FrameRing
+            shape {tuple} -- Largest shape of a resized frame (600 pixels wide)
+            Any key of RecognitionEngine.args to override its default value
+        """
+        self.args = dict(RecognitionEngine.args, **args)
+        self.slots = slots
+        self.shape = shape
+        self.context = multiprocessing.get_context("spawn")
+        self.cancelled = self.context.Event()
+        self.process = None
+        self.conn = None
+        self.ring = None
+        self.vs = None
+        self.lastFrame = None
+        self.feeding = threading.Event()
+        self.feeder = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Start the worker process, if it is not started yet. The models are loaded in the worker process, this does not wait for them.
+        It is safe to call from a background thread at startup.
+        """
+        with self.lock:
+            if self.process is not None and self.process.is_alive():
+                return
+            self.close()
+            self.ring = FrameRing(self.slots, self.shape, self.context)
+            self.conn, child = self.context.Pipe()
+            self.process = self.context.Process(target=serve, args=(child, self.ring, self.cancelled, self.args), name="recognition", daemon=True)
+            print("[INFO] starting the recognition worker...")
+            self.process.start()
+            child.close()
+
+    def start(self):
+        """Start the worker process and the video stream, if they are not started yet. The camera sensor is only warmed up the first time.
+        """
+        self.load()
+
+        if self.vs is None:
+            # initialize the video stream, then allow the camera sensor to warm up
+            print("[INFO] starting video stream...")
+            self.vs = VideoStream(src=self.args["src"]).start()
+            time.sleep(2.0)
+
+    def feed(self):
+        """Resize each new camera frame to a width of 600 pixels into the ring, until the recognition is over (thread of this process)
+        """
+        while self.feeding.is_set():
+            frame = self.vs.read()
+            if frame is None or frame is self.lastFrame:
+                time.sleep(0.005)
+                continue
+            self.lastFrame = frame
+            (h, w) = frame.shape[:2]
+            shape = (int(h * 600 / float(w)), 600) + frame.shape[2:]
+            slot, buffer = self.ring.reserve(shape)
+            if buffer is None:
+                time.sleep(0.005)
+                continue
+            cv2.resize(frame, (600, shape[0]), dst=buffer, interpolation=cv2.INTER_AREA)
+            self.ring.publish(slot, shape)
+
+    def cancel(self):
+        """Give up the current recognition (from another thread)
+        """
+        self.cancelled.set()
+
+    def recognize(self, timeout=None, known=None):
+        """Recognize a person in the worker process, feeding it the camera frames meanwhile.
+
+        Keyword Arguments:
+            timeout {float} -- Seconds to give up after (default: no limit, press "q", Ctrl+C or call cancel() to give up)
+            known {iterable} -- Only these names are accepted (default: any name but "unknown")
+
+        Returns:
+            str -- The name of the recognized person. None if nobody was recognized or the worker failed
+        """
+        self.start()
+        self.cancelled.clear()
+        self.conn.send(("recognize", timeout, None if known is None else frozenset(known)))
+
+        self.feeding.set()
+        self.feeder = threading.Thread(target=self.feed, name="feeder", daemon=True)
+        self.feeder.start()
+        try:
+            while True:
+                try:
+                    if not self.conn.poll(0.1):
+                        if not self.process.is_alive():
+                            print("[INFO] the recognition worker stopped")
+                            return None
+                        continue
+                    kind, value = self.conn.recv()
+                except KeyboardInterrupt:
+                    print("[INFO] facial recognition cancelled")
+                    self.cancel()
+                    continue
+                if kind == "result":
+                    return value
+                if kind == "error":
+                    print("[INFO] facial recognition failed: {}".format(value))
+                    return None
+        finally:
+            self.feeding.clear()
+            self.feeder.join()
+            print("[INFO] ring: {} frames dropped".format(self.ring.dropped))
+
+    def close(self):
+        """Wait for the worker process to finish (killing it if it does not) and free the shared memory
+        """
+        if self.process is not None:
+            self.process.join(5.0)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join()
+            self.process = None
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+    def stop(self):
+        """Stop the video stream and the worker process
+        """
+        if self.vs is not None:
+            self.vs.stop()
+            self.vs = None
+        with self.lock:
+            if self.process is not None and self.process.is_alive():
+                self.cancel()
+                try:
+                    self.conn.send(("stop",))
+                except (BrokenPipeError, OSError):
+                    pass
+            self.close()
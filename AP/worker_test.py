@@ -0,0 +1,97 @@
+import unittest
+import multiprocessing
+from worker import FrameRing
+
+def readFrames(ring, conn):
+    """Child process of test_processes: send the sum and the shape of each frame of the ring back, until a frame of zeros
+    """
+    while True:
+        frame = ring.get()
+        if frame is None:
+            continue
+        conn.send((int(frame.sum()), frame.shape))
+        ring.release(frame)
+        if not frame.any():
+            break
+    ring.close()
+
+
+class FrameRingTest(unittest.TestCase):
+    """These tests check that frames go through the shared memory ring newest first, and that a frame in use is never overwritten
+    """
+
+    def setUp(self):
+        self.ring = FrameRing(3, (4, 6, 3))
+
+    def tearDown(self):
+        self.ring.close()
+
+    def put(self, value, shape=(4, 6, 3)):
+        slot, frame = self.ring.reserve(shape)
+        if frame is not None:
+            frame[:] = value
+            self.ring.publish(slot, shape)
+        return slot
+
+    def test_newest(self):
+        """
+        Function: publish 2 frames, then get a frame twice
+
+        Assertion: the newest frame is returned, the older one is skipped, and there is no new frame the second time
+        """
+        self.put(1)
+        self.put(2, (2, 6, 3))
+        frame = self.ring.get()
+        self.assertEqual(frame.shape, (2, 6, 3))
+        self.assertTrue((frame == 2).all())
+        self.assertEqual(self.ring.skipped, 1)
+        self.assertIsNone(self.ring.get())
+
+    def test_inUse(self):
+        """
+        Function: take 2 frames, then publish more frames than the free slots
+
+        Assertion: the frames taken keep their values, the oldest published frame is overwritten, and nothing is written once every slot is in use
+        """
+        self.put(1)
+        first = self.ring.get()
+        self.put(2)
+        second = self.ring.get()
+        slots = [self.put(value) for value in (3, 4)]
+        self.assertEqual(slots[0], slots[1])
+        self.assertEqual(self.ring.dropped, 1)
+        self.assertTrue((first == 1).all() and (second == 2).all())
+
+        self.assertTrue((self.ring.get() == 4).all())
+        self.assertIsNone(self.put(5))
+        self.ring.release(first)
+        self.assertIsNotNone(self.put(5))
+
+    def test_tooLarge(self):
+        """
+        Function: reserve a slot for a frame larger than the slots
+
+        Assertion: ValueError is raised
+        """
+        with self.assertRaises(ValueError):
+            self.ring.reserve((5, 6, 3))
+
+    def test_processes(self):
+        """
+        Function: publish frames that a child process reads from the ring, a frame of zeros last
+
+        Assertion: the child process sees the values written by this process
+        """
+        context = multiprocessing.get_context("spawn")
+        conn, child = context.Pipe()
+        process = context.Process(target=readFrames, args=(self.ring, child))
+        process.start()
+        received = []
+        for value in (7, 0):
+            self.put(value)
+            received.append(conn.recv())
+        process.join(10)
+        self.assertEqual(received, [(7 * 72, (4, 6, 3)), (0, (4, 6, 3))])
+
+if __name__ == "__main__":
+    unittest.main()
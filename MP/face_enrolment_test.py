@@ -0,0 +1,83 @@
+import unittest
+from unittest import mock
+from flask import Flask
+from flask_api import api, db, User, FaceEnrolment, setFaceEnrolment
+
+# The test app uses an in-memory SQLite database instead of Google Cloud SQL
+app = Flask(__name__)
+app.secret_key = "test key"
+app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+db.init_app(app)
+app.register_blueprint(api)
+
+class FaceEnrolmentTest(unittest.TestCase):
+    """This is the set up for the test case, create the tables with 2 users
+    """
+    def setUp(self):
+        with app.app_context():
+            db.create_all()
+            db.session.add(User("fahim", "hash", "fahim@example.com", "Fahim", "A", "Customer"))
+            db.session.add(User("tyler", "hash", "tyler@example.com", "Tyler", "B", "Customer"))
+            db.session.commit()
+
+        self.client = app.test_client()
+
+    def tearDown(self):
+        with app.app_context():
+            db.drop_all()
+
+    def test_enrol(self):
+        """
+        Function: enrol 2 labels, then a label of a user that does not exist
+
+        Assertion: each enrolment gets the next version, the unknown user is rejected
+        """
+        self.assertEqual(self.client.post("/face/enrol", data = {"label": "Fahim", "user_id": "1"}).get_json(),
+                         {"label": "Fahim", "user_id": "1", "version": 1})
+        self.assertEqual(self.client.post("/face/enrol", data = {"label": "Tyler", "user_id": "2"}).get_json()["version"], 2)
+        self.assertEqual(self.client.post("/face/enrol", data = {"label": "Vinh", "user_id": "3"}).status_code, 404)
+
+    def test_conflict(self):
+        """
+        Function: enrol a label while another enrolment takes the same version first
+
+        Assertion: the enrolment is retried with the next version
+        """
+        with app.app_context():
+            query = FaceEnrolment.query
+
+            def get(label):
+                # the other enrolment is committed after the version was chosen, the first time only
+                if FaceEnrolment.query.get.call_count == 1:
+                    db.session.add(FaceEnrolment(label = "Tyler", user_id = "2", version = 1))
+                    db.session.commit()
+                return query.get(label)
+
+            with mock.patch.object(FaceEnrolment, "query", mock.Mock(get = mock.Mock(side_effect = get))):
+                enrolment = setFaceEnrolment("Fahim", "1")
+                self.assertEqual(FaceEnrolment.query.get.call_count, 2)
+
+            self.assertEqual((enrolment.label, enrolment.version), ("Fahim", 2))
+            self.assertEqual(FaceEnrolment.query.get("Tyler").version, 1)
+
+    def test_mapping(self):
+        """
+        Function: enrol 2 labels, remember the version, then move one label to the other user and unenrol the other label
+
+        Assertion: the whole mapping is returned since version 0, and only the 2 changes since the remembered version, the unenrolled label as null
+        """
+        self.client.post("/face/enrol", data = {"label": "Fahim", "user_id": "1"})
+        self.client.post("/face/enrol", data = {"label": "Tyler", "user_id": "2"})
+        self.assertEqual(self.client.get("/face/mapping?since=0").get_json(),
+                         {"version": 2, "changes": {"Fahim": "1", "Tyler": "2"}})
+
+        self.client.post("/face/enrol", data = {"label": "Fahim", "user_id": "2"})
+        self.client.post("/face/unenrol", data = {"label": "Tyler"})
+        self.assertEqual(self.client.get("/face/mapping?since=2").get_json(),
+                         {"version": 4, "changes": {"Fahim": "2", "Tyler": None}})
+        self.assertEqual(self.client.get("/face/mapping?since=4").get_json(), {"version": 4, "changes": {}})
+        self.assertEqual(self.client.post("/face/unenrol", data = {"label": "Vinh"}).status_code, 404)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,249 @@
+from flask import Blueprint, jsonify
+import threading
+import numpy as np
+from flask_api import db, Car, History, ArchivedHistory
+from history_archive import HistoryArchiver
+
+analytics = Blueprint("analytics", __name__)
+
+HOURS_PER_WEEK = 7 * 24
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+class FleetAnalytics:
+    """This class computes fleet statistics from the Histories (and ArchivedHistories) table for the /analytics endpoints:
+        - Per car: number of trips, rented hours, revenue (cost_per_hour x duration) and utilisation
+        - A weekday x hour heatmap of how many cars were on the road
+
+    Histories are loaded in chunks of CHUNK_SIZE rows into NumPy arrays and every statistic is computed with vectorised operations.
+    The results are cached: the watermark is the highest History ID already counted, so each update only loads the new rows.
+    The watermark alone would skip a row committed after a row with a higher ID (concurrent transactions), or moved to the archive by a compaction
+    between the reads of the two tables. So each update reads the last SAFETY_MARGIN IDs below the watermark again and only adds the rows not counted yet
+    (the IDs counted in that range are kept). A row that shows up further below the watermark is only counted after a reset.
+    Revenue uses the cars' cost per hour, so the cache is reset (and every history counted again) when the cost of a car changes.
+    Archived histories keep their History ID, so moving a row to the archive never counts it twice.
+    The months exported to cold storage by history_archive.py are no longer in the tables, they are read from their files on the first update.
+    """
+    CHUNK_SIZE      = 10000
+    SAFETY_MARGIN   = 1000
+
+    def __init__(self, archive_dir = HistoryArchiver.ARCHIVE_DIR):
+        """inits FleetAnalytics with empty statistics
+
+        Keyword Arguments:
+            archive_dir {str} -- Directory of the partitions exported by history_archive.py
+        """
+        self.archive_dir    = archive_dir
+        self.lock           = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget every statistic, the next update counts every history again
+        """
+        self.watermark      = 0
+        self.counted        = set() # IDs counted above watermark - SAFETY_MARGIN
+        self.trips          = np.zeros(0, dtype = np.int64)      # indexed by car ID
+        self.hours          = np.zeros(0, dtype = np.float64)    # indexed by car ID
+        self.revenue        = np.zeros(0, dtype = np.float64)    # indexed by car ID
+        self.heatmap        = np.zeros(HOURS_PER_WEEK, dtype = np.int64)
+        self.first          = None  # earliest begin time counted (datetime64)
+        self.last           = None  # latest return time counted (datetime64)
+        self.prices         = None  # cost per hour of each car ID the revenue was computed with
+
+    def chunks(self, model, start):
+        """Load the histories of a table with an ID above start, in chunks ordered by ID
+
+        Arguments:
+            model {db.Model} -- History or ArchivedHistory
+            start {int} -- The ID the histories are newer than
+
+        Yields:
+            tuple -- NumPy arrays of IDs, car IDs, begin times and return times
+        """
+        last_id = start
+        while True:
+            rows = db.session.query(model.id, model.car_id, model.begin_time, model.return_time) \
+                             .filter(model.id > last_id).order_by(model.id).limit(self.CHUNK_SIZE).all()
+            if not rows:
+                break
+
+            ids, car_ids, begin_times, return_times = zip(*rows)
+            last_id = ids[-1]
+            yield ( np.array(ids, dtype = np.int64),
+                    np.array(car_ids, dtype = np.int64),
+                    np.array(begin_times, dtype = "datetime64[s]"),
+                    np.array(return_times, dtype = "datetime64[s]"))
+
+    def exports(self):
+        """Load the histories of the partitions exported to cold storage, one partition at a time
+
+        Yields:
+            tuple -- NumPy arrays of IDs, car IDs, begin times and return times
+        """
+        archiver = HistoryArchiver(None, archive_dir = self.archive_dir)
+        for partition in archiver.exported():
+            rows = archiver.readPartition(partition)
+            if not rows:
+                continue
+
+            yield ( np.array([row["id"] for row in rows], dtype = np.int64),
+                    np.array([int(row["car_id"]) for row in rows], dtype = np.int64),
+                    np.array([row["begin_time"] for row in rows], dtype = "datetime64[s]"),
+                    np.array([row["return_time"] for row in rows], dtype = "datetime64[s]"))
+
+    def costs(self):
+        """Load the cost per hour of every car
+
+        Returns:
+            numpy.ndarray -- The cost per hour, indexed by car ID
+        """
+        rows = db.session.query(Car.id, Car.cost_per_hour).all()
+        costs = np.zeros(max([row[0] for row in rows], default = 0) + 1)
+        if rows:
+            ids, cost_per_hour = zip(*rows)
+            costs[np.array(ids)] = cost_per_hour
+        return costs
+
+    def grow(self, size):
+        """Make the per car arrays long enough to be indexed by every car ID below size
+
+        Arguments:
+            size {int} -- The new minimum length
+        """
+        if size > len(self.trips):
+            extra = size - len(self.trips)
+            self.trips      = np.concatenate([self.trips,   np.zeros(extra, dtype = np.int64)])
+            self.hours      = np.concatenate([self.hours,   np.zeros(extra)])
+            self.revenue    = np.concatenate([self.revenue, np.zeros(extra)])
+
+    def add(self, car_ids, begin_times, return_times, costs):
+        """Add a chunk of histories to the statistics
+
+        Arguments:
+            car_ids {numpy.ndarray} -- Car ID of each history
+            begin_times {numpy.ndarray} -- Begin time of each history (datetime64)
+            return_times {numpy.ndarray} -- Return time of each history (datetime64)
+            costs {numpy.ndarray} -- The cost per hour, indexed by car ID
+        """
+        size = int(car_ids.max()) + 1
+        self.grow(size)
+
+        # Durations in hours, revenue uses the car's cost per hour (cars deleted since cost 0)
+        durations = np.maximum(return_times - begin_times, np.timedelta64(0, "s")) / np.timedelta64(1, "h")
+        known = car_ids < len(costs)
+        revenue = np.where(known, durations * costs[np.where(known, car_ids, 0)], 0.0)
+
+        self.trips      += np.bincount(car_ids, minlength = len(self.trips))
+        self.hours      += np.bincount(car_ids, weights = durations, minlength = len(self.hours))
+        self.revenue    += np.bincount(car_ids, weights = revenue, minlength = len(self.revenue))
+
+        # Heatmap: every hour slot a booking touches is counted once.
+        # Hours are counted from the epoch (a Thursday), so slot (hour + 72) % 168 is Monday 00:00 based.
+        start = (begin_times.astype("datetime64[h]")).astype(np.int64)
+        end = (return_times - np.timedelta64(1, "s")).astype("datetime64[h]").astype(np.int64) + 1
+        length = np.where(return_times > begin_times, end - start, 0)
+
+        # Whole weeks cover every slot, the remainder is added with a difference array over 2 weeks
+        self.heatmap += int((length // HOURS_PER_WEEK).sum())
+        slot = (start + 72) % HOURS_PER_WEEK
+        diff = np.zeros(2 * HOURS_PER_WEEK + 1, dtype = np.int64)
+        np.add.at(diff, slot, 1)
+        np.add.at(diff, slot + length % HOURS_PER_WEEK, -1)
+        occupied = np.cumsum(diff)[:2 * HOURS_PER_WEEK]
+        self.heatmap += occupied[:HOURS_PER_WEEK] + occupied[HOURS_PER_WEEK:]
+
+        first, last = begin_times.min(), return_times.max()
+        self.first = first if self.first is None else min(self.first, first)
+        self.last = last if self.last is None else max(self.last, last)
+
+    def changed(self, costs):
+        """Check whether the cost per hour of a car that has trips changed since the revenue was computed (adding a car changes nothing)
+
+        Arguments:
+            costs {numpy.ndarray} -- The cost per hour, indexed by car ID
+
+        Returns:
+            bool -- True if the cached revenue is out of date
+        """
+        if self.prices is None:
+            return False
+
+        counted = np.flatnonzero(self.trips)
+        size = max(len(costs), len(self.prices), len(self.trips))
+        before = np.pad(self.prices, (0, size - len(self.prices)))
+        after = np.pad(costs, (0, size - len(costs)))
+        return not np.array_equal(before[counted], after[counted])
+
+    def update(self):
+        """Count every history newer than the watermark (in the Histories and ArchivedHistories tables) and move the watermark.
+        The last SAFETY_MARGIN IDs below the watermark are read again, only the histories not counted yet are added.
+        Every history is counted again if the cost of a car changed.
+        """
+        with self.lock:
+            costs = self.costs()
+            if self.changed(costs):
+                self.reset()
+            self.prices = costs
+            watermark = self.watermark
+
+            # The exported partitions are older than every row left in the tables, they are only read once
+            start = max(self.watermark - self.SAFETY_MARGIN, 0)
+            sources = [self.chunks(ArchivedHistory, start), self.chunks(History, start)]
+            if self.watermark == 0:
+                sources.insert(0, self.exports())
+
+            for source in sources:
+                for ids, car_ids, begin_times, return_times in source:
+                    new = ~np.isin(ids, np.fromiter(self.counted, dtype = np.int64, count = len(self.counted)))
+                    if new.any():
+                        self.add(car_ids[new], begin_times[new], return_times[new], costs)
+                    self.counted.update(ids.tolist())
+                    watermark = max(watermark, int(ids.max()))
+
+            self.watermark = watermark
+            self.counted = {counted for counted in self.counted if counted > watermark - self.SAFETY_MARGIN}
+
+    def cars(self):
+        """Per car statistics
+
+        Returns:
+            list -- A dict for each car that has at least one history
+        """
+        span = 0.0
+        if self.first is not None:
+            span = (self.last - self.first) / np.timedelta64(1, "h")
+        utilisation = self.hours / span if span > 0 else np.zeros_like(self.hours)
+
+        return [{   "car_id"        : int(car_id),
+                    "trips"         : int(self.trips[car_id]),
+                    "hours"         : round(float(self.hours[car_id]), 2),
+                    "revenue"       : round(float(self.revenue[car_id]), 2),
+                    "utilisation"   : round(float(utilisation[car_id]), 4)}
+                for car_id in np.flatnonzero(self.trips)]
+
+
+fleet = FleetAnalytics()
+
+
+# Endpoint for per car utilisation and revenue
+@analytics.route("/analytics/cars", methods = ["GET"])
+def carAnalytics():
+    """
+    Returns the number of trips, rented hours, revenue and utilisation (rented hours / hours covered by all histories) of every car
+    """
+    fleet.update()
+
+    return jsonify(fleet.cars())
+
+
+# Endpoint for the peak hour heatmap
+@analytics.route("/analytics/heatmap", methods = ["GET"])
+def heatmapAnalytics():
+    """
+    Returns, for each weekday and hour of the day, the number of bookings that had a car on the road
+    """
+    fleet.update()
+
+    heatmap = fleet.heatmap.reshape(7, 24)
+
+    return jsonify({"days": DAYS, "hours": heatmap.tolist(), "watermark": fleet.watermark})
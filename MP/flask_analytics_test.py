@@ -0,0 +1,185 @@
+import unittest, tempfile
+import numpy as np
+from datetime import datetime, timedelta
+from flask import Flask
+from flask_api import api, db, Car, History, ArchivedHistory
+from flask_analytics import analytics, FleetAnalytics
+from history_archive import HistoryArchiver
+
+# The test app uses an in-memory SQLite database instead of Google Cloud SQL
+app = Flask(__name__)
+app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+db.init_app(app)
+app.register_blueprint(api)
+app.register_blueprint(analytics)
+
+class FleetAnalyticsTest(unittest.TestCase):
+    """This is the set up for the test case, create the tables with 3 cars (10, 20 and 5 AUD per hour) and 40 random histories
+    """
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self.histories = []
+        for _ in range(40):
+            begin_time = datetime(2020, 3, 1) + timedelta(minutes = int(random.randint(0, 60 * 24 * 60)))
+            # a few bookings are longer than a week, a few are empty
+            return_time = begin_time + timedelta(minutes = int(random.choice([0, 30, 95, 60 * 26, 60 * 24 * 9])))
+            self.histories.append((str(random.randint(1, 4)), str(random.randint(1, 4)), begin_time, return_time))
+
+        with app.app_context():
+            db.create_all()
+            for cost_per_hour in (10.0, 20.0, 5.0):
+                db.session.add(Car("Toyota", "Sedan", "Black", 5, "-37.814, 144.96332", cost_per_hour, False))
+            db.session.add_all([History(*history) for history in self.histories])
+            db.session.commit()
+
+        self.archive_dir = tempfile.mkdtemp()
+        self.fleet = FleetAnalytics(archive_dir = self.archive_dir)
+        self.fleet.CHUNK_SIZE = 7
+
+    def tearDown(self):
+        with app.app_context():
+            db.drop_all()
+
+    def expected(self, histories, costs = (10.0, 20.0, 5.0)):
+        """Count the statistics of histories one by one
+
+        Returns:
+            tuple -- {car_id: [trips, hours, revenue]} and the weekday x hour heatmap
+        """
+        cars = {}
+        heatmap = np.zeros((7, 24), dtype = np.int64)
+        for _, car_id, begin_time, return_time in histories:
+            hours = (return_time - begin_time).total_seconds() / 3600
+            stats = cars.setdefault(int(car_id), [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += hours
+            stats[2] += hours * costs[int(car_id) - 1]
+
+            # every hour the booking touches (none if it is empty)
+            hour = begin_time.replace(minute = 0, second = 0)
+            while begin_time < return_time and hour < return_time:
+                heatmap[hour.weekday(), hour.hour] += 1
+                hour += timedelta(hours = 1)
+        return cars, heatmap
+
+    def assertStats(self, histories, costs = (10.0, 20.0, 5.0)):
+        cars, heatmap = self.expected(histories, costs)
+        self.assertEqual({car["car_id"]: [car["trips"], car["hours"], car["revenue"]] for car in self.fleet.cars()},
+                         {car_id: [trips, round(hours, 2), round(revenue, 2)] for car_id, (trips, hours, revenue) in cars.items()})
+        self.assertEqual(self.fleet.heatmap.reshape(7, 24).tolist(), heatmap.tolist())
+
+    def test_chunks(self):
+        """
+        Function: count the histories in chunks of 7 rows
+
+        Assertion: the trips, hours, revenue and heatmap match the histories counted one by one
+        """
+        with app.app_context():
+            self.fleet.update()
+        self.assertEqual(self.fleet.watermark, 40)
+        self.assertStats(self.histories)
+
+    def test_watermark(self):
+        """
+        Function: count, archive the oldest histories, add new histories, then count again
+
+        Assertion: the watermark is the highest ID of both tables, archived histories are not counted twice and only new histories are added
+        """
+        with app.app_context():
+            self.fleet.update()
+            HistoryArchiver(app, hot_months = 1).compact(datetime(2020, 4, 15))
+            self.assertGreater(ArchivedHistory.query.count(), 0)
+
+            # SQLite would reuse the ID of an archived row, MySQL does not
+            new = [("1", "2", datetime(2020, 6, 1, 10), datetime(2020, 6, 1, 12, 30))]
+            history = History(*new[0])
+            history.id = 41
+            db.session.add(history)
+            db.session.commit()
+            self.fleet.update()
+        self.assertEqual(self.fleet.watermark, 41)
+        self.assertStats(self.histories + new)
+
+        # a fresh cache counts both tables, its watermark is the highest ID of the archive if the Histories table has no newer row
+        with app.app_context():
+            History.query.filter(History.id == 41).delete()
+            db.session.commit()
+            fleet = FleetAnalytics(archive_dir = self.archive_dir)
+            fleet.update()
+            archived = db.session.query(db.func.max(ArchivedHistory.id)).scalar()
+            newest = db.session.query(db.func.max(History.id)).scalar()
+        self.assertEqual(fleet.watermark, max(archived, newest))
+
+    def test_outOfOrder(self):
+        """
+        Function: count while the history with ID 35 is not committed yet, commit it, then count again after a compaction
+
+        Assertion: the late history is counted once, the histories read again below the watermark are not counted twice
+        """
+        with app.app_context():
+            late = History.query.get(35)
+            db.session.delete(late)
+            db.session.commit()
+            self.fleet.update()
+            self.assertEqual(self.fleet.watermark, 40)
+
+            history = History(*self.histories[34])
+            history.id = 35
+            db.session.add(history)
+            db.session.commit()
+            self.fleet.update()
+            HistoryArchiver(app, hot_months = 1).compact(datetime(2020, 4, 15))
+            self.fleet.update()
+        self.assertEqual(self.fleet.watermark, 40)
+        self.assertStats(self.histories)
+
+    def test_exported(self):
+        """
+        Function: archive and export every history, then count with a fresh cache
+
+        Assertion: the histories of the exported partitions (no longer in the tables) are counted
+        """
+        archiver = HistoryArchiver(app, hot_months = 1, archive_dir = self.archive_dir)
+        archiver.compact(datetime(2020, 12, 1))
+        archiver.export(datetime(2020, 12, 1))
+        with app.app_context():
+            self.assertEqual(History.query.count() + ArchivedHistory.query.count(), 0)
+            self.fleet.update()
+        self.assertEqual(self.fleet.watermark, 40)
+        self.assertStats(self.histories)
+
+    def test_costChanged(self):
+        """
+        Function: count, change the cost per hour of car 2, add a car, then count again
+
+        Assertion: the revenue is computed again with the new cost, adding a car does not reset the cache
+        """
+        with app.app_context():
+            self.fleet.update()
+            Car.query.get(2).cost_per_hour = 30.0
+            db.session.commit()
+            self.fleet.update()
+        self.assertStats(self.histories, (10.0, 30.0, 5.0))
+
+        with app.app_context():
+            db.session.add(Car("Honda", "SUV", "White", 7, "-37.814, 144.96332", 40.0, False))
+            db.session.commit()
+            self.assertFalse(self.fleet.changed(self.fleet.costs()))
+
+    def test_endpoints(self):
+        """
+        Function: request the car statistics and the heatmap
+
+        Assertion: the endpoints return the statistics of the histories
+        """
+        client = app.test_client()
+        cars, heatmap = self.expected(self.histories)
+        self.assertEqual(sorted(car["car_id"] for car in client.get("/analytics/cars").get_json()), sorted(cars))
+
+        response = client.get("/analytics/heatmap").get_json()
+        self.assertEqual(response["days"][0], "Monday")
+        self.assertEqual(sum(map(sum, response["hours"])), int(heatmap.sum()))
+
+if __name__ == "__main__":
+    unittest.main()
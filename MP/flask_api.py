@@ -2,9 +2,12 @@ from flask import Flask, Blueprint, request, jsonify, render_template, flash, re
 from flask_sqlalchemy import SQLAlchemy 
 from flask_marshmallow import Marshmallow 
 import os, requests, json
+from datetime import datetime
 from flask import current_app as app
 from passlib.hash import sha256_crypt
 from sqlalchemy import or_, and_
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
 from calendar_for_api import Calendar
 from flask_googlemaps import GoogleMaps
 from flask_googlemaps import Map, icons
@@ -16,8 +19,8 @@ db = SQLAlchemy() # for accessing database
 ma = Marshmallow() # for serializing objects
 
 
-# Declare Calendar object
-calendar = Calendar()
+# Declare Calendar object (CARSHARE_CALENDAR=off disables Google Calendar, e.g. for benchmark.py)
+calendar = Calendar() if os.environ.get("CARSHARE_CALENDAR", "on") != "off" else None
 
 
 # DECLARING THE MODELS
@@ -207,6 +210,291 @@ class HistorySchema(ma.Schema):
 history_schema = HistorySchema()            # an instance of HistorySchema
 histories_schema = HistorySchema(many=True) # instances of list of HistorySchema
 
+
+# ARCHIVED HISTORY
+class ArchivedHistory(db.Model):
+    """Declaring ArchivedHistory model with its fields and properties (the ArchivedHistories table in Carshare database on Google Cloud SQL).
+    Old rows are moved here from the Histories table by history_archive.py so the Histories table stays small.
+    Each row keeps its original History ID and is tagged with the month (partition) it was returned in.
+
+    Arguments:
+        db {SQLAlchemy} -- for accessing Carshare database on Google Cloud SQL
+    """
+    __tablename__   = "ArchivedHistories"
+    id              = db.Column(db.Integer,     primary_key = True,         autoincrement = False)
+    user_id         = db.Column(db.String(20),  nullable = False,           index = True)
+    car_id          = db.Column(db.String(20),  nullable = False)
+    begin_time      = db.Column(db.DateTime(),  nullable = False)
+    return_time     = db.Column(db.DateTime(),  nullable = False)
+    partition       = db.Column(db.String(7),   nullable = False,           index = True)
+
+    def __init__(self, id, user_id, car_id, begin_time, return_time, partition):
+        """inits ArchivedHistory with data
+
+        Arguments:
+            id {int} -- The original ID of the row in the Histories table
+            user_id {int} -- User ID of the user who books the car
+            car_id {int} -- Car ID of the car which is booked
+            begin_time {datetime} -- The beginning date and time of the finished booking
+            return_time {datetime} -- The return date and time of the finished booking
+            partition {str} -- The month of the return time (YYYY-MM)
+        """
+        self.id             = id
+        self.user_id        = user_id
+        self.car_id         = car_id
+        self.begin_time     = begin_time
+        self.return_time    = return_time
+        self.partition      = partition
+
+
+def toDateTime(value):
+    """Convert a date and time from form data ("YYYY-MM-DD HH:MM" or "YYYY-MM-DD HH:MM:SS") to datetime, so it can be stored and compared in any database
+
+    Arguments:
+        value {str} -- The date and time
+
+    Returns:
+        datetime -- The date and time. The value is returned unchanged if it is in another format
+    """
+    for format in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"):
+        try:
+            return datetime.strptime(value.strip(), format)
+        except (ValueError, AttributeError):
+            pass
+    return value
+
+
+# USER STATS
+class UserStats(db.Model):
+    """Declaring UserStats model with its fields and properties (the UserStats table in Carshare database on Google Cloud SQL).
+    One row per user, kept up to date by lockCar() so the stats never need a scan of the Histories table.
+
+    Arguments:
+        db {SQLAlchemy} -- for accessing Carshare database on Google Cloud SQL
+    """
+    __tablename__   = "UserStats"
+    user_id         = db.Column(db.String(20),  primary_key = True)
+    trips           = db.Column(db.Integer(),   nullable = False)
+    hours           = db.Column(db.Float(),     nullable = False)
+
+    def __init__(self, user_id, trips, hours):
+        """inits UserStats with data
+
+        Arguments:
+            user_id {int} -- User ID of the user
+            trips {int} -- The number of finished bookings of the user
+            hours {float} -- The total hours of the finished bookings of the user
+        """
+        self.user_id        = user_id
+        self.trips          = trips
+        self.hours          = hours
+
+class UserStatsSchema(ma.Schema):
+    """This part defined structure of JSON response of our endpoint for UserStats model. Here we define the keys in our JSON response. The fields that will be exposed.
+
+    Arguments:
+        ma {Marshmallow} -- for serializing objects
+    """
+    class Meta:
+        # Fields to expose
+        fields = ('user_id', 'trips', 'hours')
+
+user_stats_schema = UserStatsSchema()   # an instance of UserStatsSchema
+
+
+# CAR STATS
+class CarStats(db.Model):
+    """Declaring CarStats model with its fields and properties (the CarStats table in Carshare database on Google Cloud SQL).
+    One row per car, kept up to date by lockCar() so the stats never need a scan of the Histories table.
+
+    Arguments:
+        db {SQLAlchemy} -- for accessing Carshare database on Google Cloud SQL
+    """
+    __tablename__   = "CarStats"
+    car_id          = db.Column(db.String(20),  primary_key = True)
+    trips           = db.Column(db.Integer(),   nullable = False)
+    hours           = db.Column(db.Float(),     nullable = False)
+    revenue         = db.Column(db.Float(),     nullable = False)
+
+    def __init__(self, car_id, trips, hours, revenue):
+        """inits CarStats with data
+
+        Arguments:
+            car_id {int} -- Car ID of the car
+            trips {int} -- The number of finished bookings of the car
+            hours {float} -- The total hours the car was rented
+            revenue {float} -- The total cost of the finished bookings of the car in AUD
+        """
+        self.car_id         = car_id
+        self.trips          = trips
+        self.hours          = hours
+        self.revenue        = revenue
+
+class CarStatsSchema(ma.Schema):
+    """This part defined structure of JSON response of our endpoint for CarStats model. Here we define the keys in our JSON response. The fields that will be exposed.
+
+    Arguments:
+        ma {Marshmallow} -- for serializing objects
+    """
+    class Meta:
+        # Fields to expose
+        fields = ('car_id', 'trips', 'hours', 'revenue')
+
+car_stats_schema = CarStatsSchema()     # an instance of CarStatsSchema
+
+
+def upsertStats(model, key, increments):
+    """Add to the counters of a stats row in one statement, inserting the row if it does not exist yet
+    (INSERT ... ON DUPLICATE KEY UPDATE on MySQL, INSERT ... ON CONFLICT DO UPDATE on SQLite and PostgreSQL),
+    so two requests creating the same row at the same time cannot fail on its primary key.
+    Other databases have no upsert: the row is updated in place (still atomic) and inserted if it does not exist,
+    so there two requests creating the same row at the same time can still fail on its primary key.
+
+    Arguments:
+        model {db.Model} -- UserStats or CarStats
+        key {dict} -- The primary key column and its value
+        increments {dict} -- The value added to each counter (also the values of a new row)
+    """
+    dialect = db.engine.dialect.name
+    inserts = {"mysql": mysql.insert, "postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+    if dialect not in inserts:
+        updated = model.query.filter_by(**key).update({name: getattr(model, name) + value for name, value in increments.items()},
+                                                      synchronize_session = False)
+        if not updated:
+            db.session.add(model(**key, **increments))
+        return
+
+    statement = inserts[dialect](model).values(**key, **increments)
+    if dialect == "mysql":
+        statement = statement.on_duplicate_key_update({name: getattr(model, name) + statement.inserted[name] for name in increments})
+    else:
+        statement = statement.on_conflict_do_update(index_elements = list(key),
+                                                    set_ = {name: getattr(model, name) + statement.excluded[name] for name in increments})
+
+    db.session.execute(statement)
+
+
+def recordTrip(user_id, car_id, begin_time, return_time, cost_per_hour):
+    """Add a finished booking to the UserStats and CarStats tables.
+    The counters are incremented by the database in one upsert per table (see upsertStats()) so concurrent requests do not overwrite each other.
+    Nothing is committed here, the caller commits together with the History row.
+    Stats of the histories recorded before the tables existed are computed by running stats_rebuild.py once after deploying.
+
+    Arguments:
+        user_id {int} -- User ID of the user who booked the car
+        car_id {int} -- Car ID of the car which was booked
+        begin_time {datetime} -- The beginning date and time of the finished booking
+        return_time {datetime} -- The return date and time of the finished booking
+        cost_per_hour {float} -- The cost per hour of the car in AUD
+    """
+    hours = max((return_time - begin_time).total_seconds(), 0) / 3600
+    revenue = hours * float(cost_per_hour)
+
+    upsertStats(UserStats, {"user_id": str(user_id)}, {"trips": 1, "hours": hours})
+    upsertStats(CarStats, {"car_id": str(car_id)}, {"trips": 1, "hours": hours, "revenue": revenue})
+
+
+# FACE ENROLMENT
+class FaceEnrolment(db.Model):
+    """Declaring FaceEnrolment model with its fields and properties (the FaceEnrolments table in Carshare database on Google Cloud SQL).
+    One row per facial recognition label (the name of a dataset folder on the Agent Pis) linked to the user it logs in.
+    Every change gets the next version and unenrolled labels are kept with no user, so an Agent Pi only downloads the changes since the version it has (see getFaceMapping()).
+    Versions are unique, so two changes made at the same time can never share one (see setFaceEnrolment()).
+
+    Arguments:
+        db {SQLAlchemy} -- for accessing Carshare database on Google Cloud SQL
+    """
+    __tablename__   = "FaceEnrolments"
+    label           = db.Column(db.String(50),  primary_key = True)
+    user_id         = db.Column(db.String(20),  nullable = True)
+    version         = db.Column(db.Integer(),   nullable = False,       unique = True)
+
+    def __init__(self, label, user_id, version):
+        """inits FaceEnrolment with data
+
+        Arguments:
+            label {str} -- The facial recognition label
+            user_id {int} -- User ID of the user logged in by the label. None once unenrolled
+            version {int} -- The version of the mapping this change belongs to
+        """
+        self.label          = label
+        self.user_id        = user_id
+        self.version        = version
+
+class FaceEnrolmentSchema(ma.Schema):
+    """This part defined structure of JSON response of our endpoint for FaceEnrolment model. Here we define the keys in our JSON response. The fields that will be exposed.
+
+    Arguments:
+        ma {Marshmallow} -- for serializing objects
+    """
+    class Meta:
+        # Fields to expose
+        fields = ('label', 'user_id', 'version')
+
+face_enrolment_schema = FaceEnrolmentSchema()   # an instance of FaceEnrolmentSchema
+
+
+# FACE EMBEDDING
+class FaceEmbedding(db.Model):
+    """Declaring FaceEmbedding model with its fields and properties (the FaceEmbeddings table in Carshare database on Google Cloud SQL).
+    One row per enrolled face: the 128-d embedding computed by an Agent Pi, stored as 512 bytes of little-endian float32.
+    The Master Pi matches the faces the Agent Pis send against them (see flask_face.py).
+
+    Arguments:
+        db {SQLAlchemy} -- for accessing Carshare database on Google Cloud SQL
+    """
+    __tablename__   = "FaceEmbeddings"
+    id              = db.Column(db.Integer,     primary_key = True,     autoincrement = True)
+    user_id         = db.Column(db.String(20),  nullable = False,       index = True)
+    vector          = db.Column(db.LargeBinary, nullable = False)
+
+    def __init__(self, user_id, vector):
+        """inits FaceEmbedding with data
+
+        Arguments:
+            user_id {int} -- User ID of the user the face belongs to
+            vector {bytes} -- The embedding as little-endian float32
+        """
+        self.user_id        = user_id
+        self.vector         = vector
+
+
+def setFaceEnrolment(label, user_id, attempts = 5):
+    """Link a facial recognition label to a user (None to unenrol it) as the next version of the mapping, and commit.
+    If another change took the same version first, the unique version makes the commit fail and the change is retried with the next one.
+
+    Arguments:
+        label {str} -- The facial recognition label
+        user_id {int} -- User ID of the user, None to unenrol the label
+
+    Keyword Arguments:
+        attempts {int} -- Number of versions tried before giving up
+
+    Raises:
+        IntegrityError: Every attempt conflicted with another change
+
+    Returns:
+        FaceEnrolment -- The changed row
+    """
+    for attempt in range(attempts):
+        version = (db.session.query(db.func.max(FaceEnrolment.version)).scalar() or 0) + 1
+        enrolment = FaceEnrolment.query.get(label)
+        if enrolment is None:
+            enrolment = FaceEnrolment(label = label, user_id = user_id, version = version)
+            db.session.add(enrolment)
+        else:
+            enrolment.user_id = user_id
+            enrolment.version = version
+
+        try:
+            db.session.commit()
+            return enrolment
+        except IntegrityError:
+            db.session.rollback()
+            if attempt == attempts - 1:
+                raise
+
 # ENDPOINTS
 
 # Endpoint to register
@@ -337,15 +625,70 @@ def getUserHistories(user_id):
         - User ID will be retrieved from session data
         - Pass the User ID to the URL
         - A query will be executed to return all the histories of the targeted user
+        - The (small) Histories table is queried first, newest first
+        - The ArchivedHistories table is only queried if the optional "limit" query parameter has not been filled by the recent histories
+        - The months exported to cold storage by history_archive.py (no longer in the tables) are only read if the limit is still not filled,
+          newest month first, from the "ARCHIVE_DIR" of the app config (default: HistoryArchiver.ARCHIVE_DIR)
     """
-
-    histories = History.query.filter_by(user_id = user_id).all()
+    from history_archive import HistoryArchiver    # history_archive imports this module
+
+    limit = request.args.get("limit", type = int)
+
+    query = History.query.filter_by(user_id = user_id).order_by(History.begin_time.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    histories = query.all()
+
+    # Read the archive lazily, only when the recent histories are not enough
+    if limit is None or len(histories) < limit:
+        query = ArchivedHistory.query.filter_by(user_id = user_id).order_by(ArchivedHistory.begin_time.desc())
+        if limit is not None:
+            query = query.limit(limit - len(histories))
+        histories += query.all()
+
+    # Read the exported months lazily, newest first, only when the tables are not enough
+    if limit is None or len(histories) < limit:
+        archiver = HistoryArchiver(app, archive_dir = app.config.get("ARCHIVE_DIR", HistoryArchiver.ARCHIVE_DIR))
+        for partition in reversed(archiver.exported()):
+            rows = [row for row in archiver.readPartition(partition) if str(row["user_id"]) == str(user_id)]
+            rows.sort(key = lambda row: row["begin_time"], reverse = True)
+            histories += [History(  user_id = row["user_id"],
+                                    car_id = row["car_id"],
+                                    begin_time = datetime.fromisoformat(row["begin_time"]),
+                                    return_time = datetime.fromisoformat(row["return_time"])) for row in rows]
+            if limit is not None and len(histories) >= limit:
+                histories = histories[:limit]
+                break
 
     result = histories_schema.dump(histories)
 
     return jsonify(result)
 
 
+# Endpoint to view a user's stats
+@api.route("/stats/user/<user_id>", methods = ["GET"])
+def getUserStats(user_id):
+    """
+    Returns the number of trips and the total hours of the targeted user from the UserStats table (zeros if the user has no finished booking)
+    """
+
+    stats = UserStats.query.get(str(user_id)) or UserStats(user_id = str(user_id), trips = 0, hours = 0.0)
+
+    return jsonify(user_stats_schema.dump(stats))
+
+
+# Endpoint to view a car's stats
+@api.route("/stats/car/<car_id>", methods = ["GET"])
+def getCarStats(car_id):
+    """
+    Returns the number of trips, the total rented hours and the revenue of the targeted car from the CarStats table (zeros if the car has no finished booking)
+    """
+
+    stats = CarStats.query.get(str(car_id)) or CarStats(car_id = str(car_id), trips = 0, hours = 0.0, revenue = 0.0)
+
+    return jsonify(car_stats_schema.dump(stats))
+
+
 # Endpoint to show all UNBOOKED cars
 @api.route("/car/unbooked", methods = ["GET"])
 def getUnbookedCars():
@@ -426,8 +769,8 @@ def makeABooking():
         # Prepare object for database insertion
         newBooking = Booking(   user_id = user_id,
                                 car_id = car_id,
-                                begin_time = begin_datetime,
-                                return_time = return_datetime,
+                                begin_time = toDateTime(begin_datetime),
+                                return_time = toDateTime(return_datetime),
                                 ongoing = False)
 
         # Add new row to the database
@@ -451,7 +794,8 @@ def makeABooking():
                 'dateTime': return_datetime.replace(' ', 'T') + ':00+10:00',
             },
         }
-        calendar.insert(event)
+        if calendar is not None:
+            calendar.insert(event)
 
         flash("Booking made")
 
@@ -489,7 +833,7 @@ def cancelABooking():
         # Prepare object for database insertion
         booking = db.session.query(Booking).filter( Booking.user_id == user_id,
                                                     Booking.car_id == car_id,
-                                                    Booking.begin_time == begin_datetime).first()
+                                                    Booking.begin_time == toDateTime(begin_datetime)).first()
 
         # Delete row from the database
         db.session.delete(booking)
@@ -502,7 +846,8 @@ def cancelABooking():
         db.session.commit()
 
         # Delete event from Google Calendar
-        calendar.delete(user_id, car_id, begin_datetime)
+        if calendar is not None:
+            calendar.delete(user_id, car_id, begin_datetime)
 
         flash("Booking cancelled")
 
@@ -528,7 +873,7 @@ def unlockCar():
     # Check if this is the right user with the right booked car and time 
     booking = db.session.query(Booking).filter_by(  user_id = user_id,
                                                     car_id = car_id,
-                                                    begin_time = begin_time).first()
+                                                    begin_time = toDateTime(begin_time)).first()
 
     # Activate booking
     if booking is not None:
@@ -555,6 +900,7 @@ def lockCar():
         - The target booking will be removed to indicate the booking has finished
         - A record will be added to Histories table
         - Car's availability will be updated in the Cars table
+        - The user's and the car's stats will be updated in the same transaction
     """
 
     user_id     = request.form.get("user_id")
@@ -583,6 +929,9 @@ def lockCar():
         car = Car.query.get(car_id) 
         car.booked = False
 
+        # Update user's and car's stats
+        recordTrip(user_id, car_id, begin_time, return_time, car.cost_per_hour)
+
         # Commit changes
         db.session.commit()
 
@@ -617,6 +966,55 @@ def showCarLocation(car_id):
         lat = myLat, lng = myLng)
 
 
+# Endpoint to enrol a facial recognition label
+@api.route("/face/enrol", methods = ["POST"])
+def enrolFace():
+    """
+    Links a facial recognition label (a dataset folder name) to an existing user, so the Agent Pis log the user in when they recognize the label.
+    - label and user_id are sent in form data
+    - 404 if the user does not exist
+    - Returns the enrolment and the version of the mapping it belongs to
+    """
+    label       = request.form.get("label")
+    user_id     = request.form.get("user_id")
+
+    if not label or User.query.get(user_id) is None:
+        return jsonify({"error": "unknown user"}), 404
+
+    return jsonify(face_enrolment_schema.dump(setFaceEnrolment(label, str(user_id))))
+
+
+# Endpoint to unenrol a facial recognition label
+@api.route("/face/unenrol", methods = ["POST"])
+def unenrolFace():
+    """
+    Unlinks a facial recognition label from its user, the Agent Pis stop logging anyone in with it.
+    - label is sent in form data
+    - 404 if the label is not enrolled
+    """
+    label       = request.form.get("label")
+
+    if FaceEnrolment.query.get(label) is None:
+        return jsonify({"error": "unknown label"}), 404
+
+    return jsonify(face_enrolment_schema.dump(setFaceEnrolment(label, None)))
+
+
+# Endpoint to download the changes of the facial recognition mapping
+@api.route("/face/mapping", methods = ["GET"])
+def getFaceMapping():
+    """
+    Returns the changes of the mapping of facial recognition labels to User IDs since a version (?since=, 0 for the whole mapping):
+    {"version": latest version, "changes": {label: User ID, or null if the label was unenrolled}}
+    """
+    since       = request.args.get("since", 0, type = int)
+
+    changes = db.session.query(FaceEnrolment.label, FaceEnrolment.user_id).filter(FaceEnrolment.version > since).all()
+    version = db.session.query(db.func.max(FaceEnrolment.version)).scalar() or 0
+
+    return jsonify({"version": version, "changes": {label: user_id for label, user_id in changes}})
+
+
 # Endpoint to check login credentials from Agent Pi
 @api.route("/ap_login", methods = ["POST"])
 def apLogin():
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# python3 flask_face.py --store ../AP/output
+from flask import Blueprint, request, jsonify
+import threading, base64, json, os
+import numpy as np
+from flask_api import db, User, FaceEmbedding, FaceEnrolment
+
+face = Blueprint("face", __name__)
+
+DIM = 128   # Size of the embeddings of the Agent Pis
+
+
+def encodeEmbedding(vec):
+    """Encode an embedding for a form field or a TCP message (base64 of little-endian float32)
+
+    Arguments:
+        vec {numpy.ndarray} -- The 128-d embedding
+
+    Returns:
+        str -- The encoded embedding
+    """
+    return base64.b64encode(np.asarray(vec, dtype = "<f4").tobytes()).decode()
+
+
+def decodeEmbedding(text):
+    """Decode an embedding encoded by encodeEmbedding()
+
+    Arguments:
+        text {str} -- The encoded embedding
+
+    Raises:
+        ValueError: The text is not a 128-d embedding
+
+    Returns:
+        numpy.ndarray -- The embedding
+    """
+    try:
+        vec = np.frombuffer(base64.b64decode(text or "", validate = True), dtype = "<f4")
+    except (ValueError, TypeError):
+        raise ValueError("not base64")
+    if vec.shape != (DIM,) or not np.all(np.isfinite(vec)):
+        raise ValueError("not a {}-d embedding".format(DIM))
+    return vec.astype(np.float32)
+
+
+class FaceIndex:
+    """This class keeps every enrolled face (the FaceEmbeddings table) in memory as NumPy arrays, so the Agent Pis only compute embeddings
+    and the Master Pi recognizes them for the whole fleet:
+        - The embeddings are L2-normalised and summed per user, a face is matched with one matrix-vector product against the centroid of every user
+        - The probability of a user is the softmax of the cosine similarities divided by TEMPERATURE, like the index of the Agent Pis (embedding_index.py)
+        - A face less similar than MIN_SIMILARITY to every user is not recognized
+
+    The index is updated before each match: the watermark is the highest FaceEmbedding ID already loaded, so only the new rows are loaded.
+    If rows were deleted (the row count does not add up), everything is loaded again.
+    update() changes the sums under the lock, then publishes the User IDs and the centroids together with one assignment (self.published):
+    match() never takes the lock and always sees User IDs and centroids of the same load, even while the index is loaded again.
+    """
+    CHUNK_SIZE      = 10000
+    TEMPERATURE     = 0.05
+    MIN_SIMILARITY  = 0.5
+
+    def __init__(self):
+        """inits FaceIndex with no face
+        """
+        self.lock       = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget every face
+        """
+        self.clear()
+        self.published  = ((), np.zeros((0, DIM), dtype = np.float32))     # (User IDs, centroids) matched against
+
+    def clear(self):
+        """Forget the faces loaded. The published faces are still matched until the next update publishes the faces loaded again
+        """
+        self.watermark  = 0
+        self.count      = 0
+        self.users      = []                                    # User ID of each row of sums
+        self.rows       = {}                                    # row of each User ID in sums
+        self.sums       = np.zeros((0, DIM), dtype = np.float32)
+
+    def add(self, user_ids, vectors):
+        """Add faces to the index
+
+        Arguments:
+            user_ids {list} -- User ID of each face
+            vectors {numpy.ndarray} -- The embeddings, one per row
+        """
+        for user_id in user_ids:
+            if user_id not in self.rows:
+                self.rows[user_id] = len(self.users)
+                self.users.append(user_id)
+        if len(self.users) > len(self.sums):
+            self.sums = np.vstack([self.sums, np.zeros((len(self.users) - len(self.sums), DIM), dtype = np.float32)])
+
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis = 1, keepdims = True), 1e-12)
+        np.add.at(self.sums, np.array([self.rows[user_id] for user_id in user_ids]), vectors)
+        self.count += len(user_ids)
+
+    def load(self, since):
+        """Load the faces with an ID above since, in chunks ordered by ID
+
+        Arguments:
+            since {int} -- The highest FaceEmbedding ID already loaded
+
+        Returns:
+            int -- The highest FaceEmbedding ID loaded
+        """
+        while True:
+            rows = db.session.query(FaceEmbedding.id, FaceEmbedding.user_id, FaceEmbedding.vector) \
+                             .filter(FaceEmbedding.id > since).order_by(FaceEmbedding.id).limit(self.CHUNK_SIZE).all()
+            if not rows:
+                return since
+
+            ids, user_ids, vectors = zip(*rows)
+            self.add(list(user_ids), np.frombuffer(b"".join(vectors), dtype = "<f4").reshape(-1, DIM).astype(np.float32))
+            since = ids[-1]
+
+    def update(self):
+        """Load the new faces, or every face if some were deleted
+        """
+        with self.lock:
+            watermark, count = db.session.query(db.func.max(FaceEmbedding.id), db.func.count(FaceEmbedding.id)).one()
+            watermark = watermark or 0
+            if (watermark, count) == (self.watermark, self.count):
+                return
+
+            newer = db.session.query(db.func.count(FaceEmbedding.id)).filter(FaceEmbedding.id > self.watermark).scalar()
+            if self.count + newer != count:
+                self.clear()
+            self.watermark = self.load(self.watermark)
+            centroids = self.sums / np.maximum(np.linalg.norm(self.sums, axis = 1, keepdims = True), 1e-12)
+            self.published = (tuple(self.users), centroids)
+
+    def match(self, vec):
+        """Recognize a face
+
+        Arguments:
+            vec {numpy.ndarray} -- The 128-d embedding
+
+        Returns:
+            tuple -- The User ID (None if nobody is similar enough), its probability and its cosine similarity
+        """
+        users, centroids = self.published
+        if len(centroids) == 0:
+            return None, 0.0, 0.0
+
+        similarities = centroids @ (vec / max(np.linalg.norm(vec), 1e-12))
+        best = int(np.argmax(similarities))
+        weights = np.exp((similarities - similarities[best]) / self.TEMPERATURE)
+        proba, similarity = float(1.0 / weights.sum()), float(similarities[best])
+
+        if similarity < self.MIN_SIMILARITY:
+            return None, proba, similarity
+        return users[best], proba, similarity
+
+
+faces = FaceIndex()
+
+
+# Endpoint to enrol a face
+@face.route("/face/embedding", methods = ["POST"])
+def addFaceEmbedding():
+    """
+    Adds the embedding of a face of a user to the faces the Master Pi recognizes.
+    - user_id and embedding (see encodeEmbedding()) are sent in form data
+    - 404 if the user does not exist, 400 if the embedding is invalid
+    - Returns the number of faces of the user
+    """
+    user_id     = request.form.get("user_id")
+
+    if User.query.get(user_id) is None:
+        return jsonify({"error": "unknown user"}), 404
+    try:
+        vec = decodeEmbedding(request.form.get("embedding"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    db.session.add(FaceEmbedding(user_id = str(user_id), vector = vec.astype("<f4").tobytes()))
+    db.session.commit()
+
+    return jsonify({"user_id": str(user_id), "embeddings": FaceEmbedding.query.filter_by(user_id = str(user_id)).count()})
+
+
+# Endpoint to delete the faces of a user
+@face.route("/face/embedding/delete", methods = ["POST"])
+def deleteFaceEmbeddings():
+    """
+    Deletes every face of a user, the Master Pi stops recognizing the user.
+    - user_id is sent in form data
+    - Returns the number of faces deleted
+    """
+    user_id     = request.form.get("user_id")
+
+    deleted = FaceEmbedding.query.filter_by(user_id = str(user_id)).delete()
+    db.session.commit()
+
+    return jsonify({"deleted": deleted})
+
+
+# Endpoint to recognize a face
+@face.route("/face/verify", methods = ["POST"])
+def verifyFace():
+    """
+    Recognizes the face of an embedding computed by an Agent Pi against every enrolled face.
+    - embedding (see encodeEmbedding()) is sent in form data
+    - 400 if the embedding is invalid
+    - Returns the User ID (null if nobody is similar enough), its probability and its cosine similarity
+    """
+    try:
+        vec = decodeEmbedding(request.form.get("embedding"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    faces.update()
+    user_id, proba, similarity = faces.match(vec)
+
+    return jsonify({"user_id": user_id, "proba": round(proba, 4), "similarity": round(similarity, 4)})
+
+
+def importStore(directory):
+    """Enrol the faces of the embedding store of an Agent Pi (embeddings.npy, labels.npy and labels.json written by train.py).
+    Each label is linked to its user through the FaceEnrolments table, faces of labels not enrolled are skipped.
+
+    Arguments:
+        directory {str} -- The directory of the store
+
+    Returns:
+        int -- The number of faces enrolled
+    """
+    with open(os.path.join(directory, "labels.json")) as f:
+        classes = json.load(f)["classes"]
+    vectors = np.load(os.path.join(directory, "embeddings.npy"), allow_pickle = False)
+    labels = np.load(os.path.join(directory, "labels.npy"), allow_pickle = False)
+
+    users = dict(db.session.query(FaceEnrolment.label, FaceEnrolment.user_id).filter(FaceEnrolment.user_id != None).all())
+    rows = [{"user_id": users[classes[label]], "vector": vec.astype("<f4").tobytes()}
+            for vec, label in zip(vectors, labels) if classes[label] in users]
+    db.session.bulk_insert_mappings(FaceEmbedding, rows)
+    db.session.commit()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    import argparse
+    from flask_main import app
+
+    parser = argparse.ArgumentParser(description = "Enrol the faces of the embedding store of an Agent Pi (labels are linked to users by /face/enrol)")
+    parser.add_argument("--store", required = True, help = "directory of embeddings.npy, labels.npy and labels.json")
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        print("[INFO] {} faces enrolled".format(importStore(args.store)))
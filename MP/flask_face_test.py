@@ -0,0 +1,125 @@
+import unittest
+import tempfile
+import json
+import os
+import numpy as np
+from flask import Flask
+from flask_api import api, db, User, FaceEnrolment
+from flask_face import face, faces, encodeEmbedding, importStore
+
+# The test app uses an in-memory SQLite database instead of Google Cloud SQL
+app = Flask(__name__)
+app.secret_key = "test key"
+app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+db.init_app(app)
+app.register_blueprint(api)
+app.register_blueprint(face)
+
+class FaceVerificationTest(unittest.TestCase):
+    """This is the set up for the test case, create the tables with 3 users, each with a random face (a direction the embeddings of the user are around)
+    """
+    def setUp(self):
+        with app.app_context():
+            db.create_all()
+            for name in ("fahim", "tyler", "vinh"):
+                db.session.add(User(name, "hash", name + "@example.com", name, "A", "Customer"))
+            db.session.commit()
+
+        faces.reset()
+        self.client = app.test_client()
+        self.rng = np.random.RandomState(0)
+        self.centers = {user_id: self.rng.randn(128) for user_id in ("1", "2", "3")}
+
+    def tearDown(self):
+        with app.app_context():
+            db.drop_all()
+
+    def face(self, user_id):
+        return self.centers[user_id] + 0.3 * self.rng.randn(128)
+
+    def enrol(self, user_id, count):
+        for _ in range(count):
+            response = self.client.post("/face/embedding", data = {"user_id": user_id, "embedding": encodeEmbedding(self.face(user_id))})
+        return response
+
+    def verify(self, vec):
+        return self.client.post("/face/verify", data = {"embedding": encodeEmbedding(vec)}).get_json()
+
+    def test_verify(self):
+        """
+        Function: enrol 2 users, verify their faces and a face of a user who is not enrolled
+
+        Assertion: the enrolled users are recognized with a high probability, the other face is not recognized
+        """
+        self.assertEqual(self.enrol("1", 5).get_json(), {"user_id": "1", "embeddings": 5})
+        self.enrol("2", 5)
+
+        for user_id in ("1", "2"):
+            reply = self.verify(self.face(user_id))
+            self.assertEqual(reply["user_id"], user_id)
+            self.assertGreater(reply["proba"], 0.9)
+        self.assertIsNone(self.verify(-self.centers["1"])["user_id"])
+
+    def test_updates(self):
+        """
+        Function: verify a face, enrol a third user, then delete the faces of the first user
+
+        Assertion: the index picks up the new user and the deletion without a restart
+        """
+        self.enrol("1", 3)
+        self.assertEqual(self.verify(self.face("1"))["user_id"], "1")
+
+        self.enrol("3", 3)
+        self.assertEqual(self.verify(self.face("3"))["user_id"], "3")
+
+        self.assertEqual(self.client.post("/face/embedding/delete", data = {"user_id": "1"}).get_json(), {"deleted": 3})
+        self.assertIsNone(self.verify(self.face("1"))["user_id"])
+        self.assertEqual(faces.count, 3)
+
+    def test_matchWhileLoading(self):
+        """
+        Function: enrol 2 users, then clear the faces loaded as update() does before loading everything again
+
+        Assertion: the faces published by the last update are still matched until the next update publishes again
+        """
+        self.enrol("1", 3)
+        self.enrol("2", 3)
+        self.assertEqual(self.verify(self.face("1"))["user_id"], "1")
+
+        faces.clear()
+        self.assertEqual(faces.match(self.face("2"))[0], "2")
+        self.assertEqual(self.verify(self.face("2"))["user_id"], "2")
+        self.assertEqual(faces.count, 6)
+
+    def test_invalid(self):
+        """
+        Function: enrol a face of a user who does not exist, and send embeddings which are not 128 floats
+
+        Assertion: 404 and 400
+        """
+        self.assertEqual(self.client.post("/face/embedding", data = {"user_id": "9", "embedding": encodeEmbedding(self.face("1"))}).status_code, 404)
+        self.assertEqual(self.client.post("/face/verify", data = {"embedding": "not base64!"}).status_code, 400)
+        self.assertEqual(self.client.post("/face/verify", data = {"embedding": encodeEmbedding(np.zeros(64))}).status_code, 400)
+
+    def test_importStore(self):
+        """
+        Function: import an embedding store of an Agent Pi with 2 labels, only one of them enrolled
+
+        Assertion: only the faces of the enrolled label are imported, and recognized as its user
+        """
+        directory = tempfile.mkdtemp()
+        vectors = np.array([self.face("2") for _ in range(4)] + [self.face("3") for _ in range(2)], dtype = np.float32)
+        np.save(os.path.join(directory, "embeddings.npy"), vectors)
+        np.save(os.path.join(directory, "labels.npy"), np.array([0] * 4 + [1] * 2, dtype = np.int32))
+        json.dump({"version": 1, "dim": 128, "count": 6, "classes": ["Tyler", "Vinh"]}, open(os.path.join(directory, "labels.json"), "w"))
+
+        with app.app_context():
+            db.session.add(FaceEnrolment("Tyler", "2", 1))
+            db.session.commit()
+            self.assertEqual(importStore(directory), 4)
+
+        self.assertEqual(self.verify(self.face("2"))["user_id"], "2")
+
+if __name__ == "__main__":
+    unittest.main()
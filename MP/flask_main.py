@@ -6,6 +6,8 @@ from flask_marshmallow import Marshmallow
 import os, requests, json
 from flask_api import api, db
 from flask_site import site
+from flask_analytics import analytics
+from flask_face import face
 from flask_bootstrap import Bootstrap
 # import MySQLdb
 from flask_session import Session
@@ -32,7 +34,8 @@ PASSWORD="password"
 DATABASE="Carshare"
 
 
-app.config["SQLALCHEMY_DATABASE_URI"] = "mysql://{}:{}@{}/{}".format(USER, PASSWORD, HOST, DATABASE)
+# The CARSHARE_DATABASE_URI environment variable overrides the database (e.g. a local SQLite file for benchmark.py)
+app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("CARSHARE_DATABASE_URI", "mysql://{}:{}@{}/{}".format(USER, PASSWORD, HOST, DATABASE))
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = True
 
 db.init_app(app)
@@ -48,6 +51,8 @@ GoogleMaps(
 
 app.register_blueprint(api)
 app.register_blueprint(site)
+app.register_blueprint(analytics)
+app.register_blueprint(face)
 
 if __name__ == "__main__":
     app.run()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# python3 history_archive.py            (runs the compaction job every hour)
+# python3 history_archive.py --once     (runs the compaction job once)
+
+import os, json, gzip, glob, time, threading, argparse
+from datetime import datetime
+from flask_api import db, History, ArchivedHistory
+
+class HistoryArchiver:
+    """This class keeps the Histories table small by moving old histories into the ArchivedHistories table.
+
+    - A history is old when its return time is before the start of the month that is HOT_MONTHS months ago
+    - Archived histories are partitioned by the month of their return time (YYYY-MM)
+    - Every finished month of the archive is exported to a compact column-oriented file (gzipped JSON) in the archive directory for cold storage.
+      Once the file is read back and holds every row of the month, the rows are deleted from ArchivedHistories, so that table stays bounded too
+
+    flask_api.getUserHistories() reads the Histories table first, then ArchivedHistories and then the exported files, each only when it needs more rows.
+    Months moved to cold storage are only in their exported files (see exported() and readPartition()),
+    flask_api.py, flask_analytics.py and stats_rebuild.py read them from there.
+    """
+    HOT_MONTHS      = 3             # Number of months (including the current one) kept in the Histories table
+    BATCH_SIZE      = 500           # Number of rows moved per transaction
+    ARCHIVE_DIR     = "archive"     # Where the exported partitions are written
+    COLUMNS         = ("id", "user_id", "car_id", "begin_time", "return_time")
+
+    def __init__(self, app, hot_months = HOT_MONTHS, batch_size = BATCH_SIZE, archive_dir = ARCHIVE_DIR):
+        """inits HistoryArchiver with the Flask app (for the database connection) and its settings
+
+        Arguments:
+            app {Flask} -- The Flask app which db has been initialised with
+
+        Keyword Arguments:
+            hot_months {int} -- Number of months kept in the Histories table
+            batch_size {int} -- Number of rows moved per transaction
+            archive_dir {str} -- Directory for the exported partitions
+        """
+        self.app            = app
+        self.hot_months     = hot_months
+        self.batch_size     = batch_size
+        self.archive_dir    = archive_dir
+        self._stop          = threading.Event()
+        self._thread        = None
+
+    def cutoff(self, now = None):
+        """Find the time before which histories are moved out of the Histories table
+
+        Keyword Arguments:
+            now {datetime} -- The current time (default: datetime.now())
+
+        Returns:
+            datetime -- The first day of the oldest month kept in the Histories table
+        """
+        now = now or datetime.now()
+        months = now.year * 12 + (now.month - 1) - (self.hot_months - 1)
+        return datetime(months // 12, months % 12 + 1, 1)
+
+    def compact(self, now = None):
+        """Move every history older than the cutoff from Histories to ArchivedHistories.
+        Rows are moved in batches, each batch in its own transaction, so the tables are never locked for long.
+
+        Keyword Arguments:
+            now {datetime} -- The current time (default: datetime.now())
+
+        Returns:
+            int -- The number of histories moved
+        """
+        cutoff = self.cutoff(now)
+        moved = 0
+
+        with self.app.app_context():
+            while True:
+                histories = History.query.filter(History.return_time < cutoff).order_by(History.id).limit(self.batch_size).all()
+                if not histories:
+                    break
+
+                for history in histories:
+                    db.session.add(ArchivedHistory( id = history.id,
+                                                    user_id = history.user_id,
+                                                    car_id = history.car_id,
+                                                    begin_time = history.begin_time,
+                                                    return_time = history.return_time,
+                                                    partition = history.return_time.strftime("%Y-%m")))
+                    db.session.delete(history)
+
+                # Commit changes (one batch)
+                db.session.commit()
+                moved += len(histories)
+
+        return moved
+
+    def partitionPath(self, partition):
+        """Path of the exported file of a partition
+
+        Arguments:
+            partition {str} -- The month of the partition (YYYY-MM)
+
+        Returns:
+            str -- Path of the exported file
+        """
+        return os.path.join(self.archive_dir, "histories-{}.json.gz".format(partition))
+
+    def export(self, now = None):
+        """Export every finished month of the ArchivedHistories table to cold storage, then delete its rows from the table.
+        Each file stores one list per column (instead of one object per row), which keeps the files small.
+        Rows of a month that was already exported (e.g. the job stopped before deleting them) are merged into its file.
+        The rows are only deleted once the file has been read back and holds all of them.
+
+        Keyword Arguments:
+            now {datetime} -- The current time (default: datetime.now())
+
+        Returns:
+            list -- The partitions (YYYY-MM) exported
+        """
+        current = (now or datetime.now()).strftime("%Y-%m")
+        exported = []
+
+        with self.app.app_context():
+            partitions = [row[0] for row in db.session.query(ArchivedHistory.partition).distinct()]
+
+            for partition in sorted(partitions):
+                if partition >= current:
+                    continue
+
+                histories = ArchivedHistory.query.filter_by(partition = partition).order_by(ArchivedHistory.id).all()
+                rows = {history.id: {   "id"            : history.id,
+                                        "user_id"       : history.user_id,
+                                        "car_id"        : history.car_id,
+                                        "begin_time"    : history.begin_time.isoformat(" "),
+                                        "return_time"   : history.return_time.isoformat(" ")} for history in histories}
+                if os.path.exists(self.partitionPath(partition)):
+                    for row in self.readPartition(partition):
+                        rows.setdefault(row["id"], row)
+
+                ordered = [rows[i] for i in sorted(rows)]
+                self.writePartition(partition, {name: [row[name] for row in ordered] for name in self.COLUMNS})
+
+                # Verify the file before deleting anything from the database
+                written = set(row["id"] for row in self.readPartition(partition))
+                ids = [history.id for history in histories]
+                if not written.issuperset(ids):
+                    raise IOError("the export of partition {} is missing rows, nothing deleted".format(partition))
+                self.purge(ids)
+                exported.append(partition)
+
+        return exported
+
+    def purge(self, ids):
+        """Delete exported rows from the ArchivedHistories table, in batches (each batch in its own transaction)
+
+        Arguments:
+            ids {list} -- The IDs of the rows
+        """
+        for start in range(0, len(ids), self.batch_size):
+            batch = ids[start:start + self.batch_size]
+            ArchivedHistory.query.filter(ArchivedHistory.id.in_(batch)).delete(synchronize_session = False)
+            db.session.commit()
+
+    def exported(self):
+        """List the partitions exported to the archive directory
+
+        Returns:
+            list -- The months of the exported partitions (YYYY-MM), oldest first
+        """
+        paths = glob.glob(self.partitionPath("*"))
+        return sorted(os.path.basename(path)[len("histories-"):-len(".json.gz")] for path in paths)
+
+    def writePartition(self, partition, columns):
+        """Write the columns of a partition to disk. The file is written to a temporary path first, then renamed, so readers never see half a file.
+
+        Arguments:
+            partition {str} -- The month of the partition (YYYY-MM)
+            columns {dict} -- A list of values for each column
+        """
+        os.makedirs(self.archive_dir, exist_ok = True)
+        path = self.partitionPath(partition)
+
+        with gzip.open(path + ".tmp", "wt") as f:
+            json.dump({"version": 1, "partition": partition, "columns": columns}, f)
+        os.replace(path + ".tmp", path)
+
+    def readPartition(self, partition):
+        """Read an exported partition back as rows
+
+        Arguments:
+            partition {str} -- The month of the partition (YYYY-MM)
+
+        Returns:
+            list -- A dict for each history in the partition
+        """
+        with gzip.open(self.partitionPath(partition), "rt") as f:
+            columns = json.load(f)["columns"]
+
+        return [dict(zip(self.COLUMNS, row)) for row in zip(*(columns[name] for name in self.COLUMNS))]
+
+    def run(self):
+        """Run the compaction and the export once and print a summary
+        """
+        moved = self.compact()
+        exported = self.export()
+        print("[INFO] archived {} histories, exported partitions: {}".format(moved, exported or "none"))
+
+    def start(self, interval = 3600):
+        """Start the compaction job in a background thread
+
+        Keyword Arguments:
+            interval {int} -- Seconds between two runs
+        """
+        def loop():
+            while not self._stop.is_set():
+                self.run()
+                self._stop.wait(interval)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target = loop, daemon = True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread after its current run
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+if __name__ == "__main__":
+    from flask_main import app
+
+    parser = argparse.ArgumentParser(description = "Move old histories out of the Histories table")
+    parser.add_argument("--once", action = "store_true", help = "run the job once and exit")
+    parser.add_argument("--interval", type = int, default = 3600, help = "seconds between two runs")
+    parser.add_argument("--hot-months", type = int, default = HistoryArchiver.HOT_MONTHS, help = "months kept in the Histories table")
+    args = parser.parse_args()
+
+    archiver = HistoryArchiver(app, hot_months = args.hot_months)
+
+    while True:
+        archiver.run()
+        if args.once:
+            break
+        time.sleep(args.interval)
@@ -0,0 +1,126 @@
+import unittest, tempfile
+from datetime import datetime
+from flask import Flask
+from flask_api import api, db, History, ArchivedHistory
+from history_archive import HistoryArchiver
+
+# The test app uses an in-memory SQLite database instead of Google Cloud SQL
+app = Flask(__name__)
+app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+db.init_app(app)
+app.register_blueprint(api)
+
+class HistoryArchiveTest(unittest.TestCase):
+    """This is the set up for the test case, create the tables and add 2 old histories and 1 recent history for user 1
+    """
+    def setUp(self):
+        with app.app_context():
+            db.create_all()
+            db.session.add(History("1", "1", datetime(2020, 1, 10, 9), datetime(2020, 1, 11, 9)))
+            db.session.add(History("1", "2", datetime(2020, 2, 10, 9), datetime(2020, 2, 10, 17)))
+            db.session.add(History("1", "1", datetime(2020, 5, 20, 9), datetime(2020, 5, 21, 9)))
+            db.session.commit()
+
+        self.archive_dir = tempfile.mkdtemp()
+        app.config["ARCHIVE_DIR"] = self.archive_dir
+        self.archiver = HistoryArchiver(app, hot_months = 3, archive_dir = self.archive_dir)
+        self.now = datetime(2020, 5, 25)
+
+    def tearDown(self):
+        with app.app_context():
+            db.drop_all()
+
+    def test_cutoff(self):
+        """
+        Assertion: with 3 hot months, everything before March is archived (also across a year boundary)
+        """
+        self.assertEqual(self.archiver.cutoff(self.now), datetime(2020, 3, 1))
+        self.assertEqual(self.archiver.cutoff(datetime(2020, 1, 15)), datetime(2019, 11, 1))
+
+    def test_compact(self):
+        """
+        Function: run the compaction job
+
+        Assertion: the 2 old histories are moved to ArchivedHistories with their partition, the recent one stays
+        """
+        self.assertEqual(self.archiver.compact(self.now), 2)
+
+        with app.app_context():
+            self.assertEqual(History.query.count(), 1)
+            partitions = sorted(history.partition for history in ArchivedHistory.query.all())
+            self.assertEqual(partitions, ["2020-01", "2020-02"])
+
+    def test_export(self):
+        """
+        Function: run the compaction job, then export the archived partitions
+
+        Assertion: both months are exported once and can be read back
+        """
+        self.archiver.compact(self.now)
+        self.assertEqual(self.archiver.export(self.now), ["2020-01", "2020-02"])
+        self.assertEqual(self.archiver.export(self.now), [])
+
+        rows = self.archiver.readPartition("2020-02")
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["car_id"], "2")
+
+    def test_purge(self):
+        """
+        Function: compact and export, then archive a late row of an exported month and export again
+
+        Assertion: exported rows are deleted from ArchivedHistories, and the late row is merged into the existing file before being deleted
+        """
+        self.archiver.compact(self.now)
+        with app.app_context():
+            self.assertEqual(ArchivedHistory.query.count(), 2)
+        self.archiver.export(self.now)
+        with app.app_context():
+            self.assertEqual(ArchivedHistory.query.count(), 0)
+            db.session.add(ArchivedHistory(id = 99, user_id = "2", car_id = "3", begin_time = datetime(2020, 2, 1, 9),
+                                           return_time = datetime(2020, 2, 1, 10), partition = "2020-02"))
+            db.session.commit()
+
+        self.assertEqual(self.archiver.export(self.now), ["2020-02"])
+        with app.app_context():
+            self.assertEqual(ArchivedHistory.query.count(), 0)
+        self.assertEqual([row["id"] for row in self.archiver.readPartition("2020-02")], [2, 99])
+        self.assertEqual(self.archiver.exported(), ["2020-01", "2020-02"])
+
+    def test_userHistories(self):
+        """
+        Function: request the histories of user 1 after compaction
+
+        Assertion: the recent history comes first, archived histories are only read when the limit is not reached
+        """
+        self.archiver.compact(self.now)
+        client = app.test_client()
+
+        self.assertEqual(len(client.get("/history/1").get_json()), 3)
+
+        recent = client.get("/history/1?limit=1").get_json()
+        self.assertEqual(len(recent), 1)
+        self.assertEqual(recent[0]["begin_time"], "2020-05-20T09:00:00")
+
+        self.assertEqual(len(client.get("/history/1?limit=2").get_json()), 2)
+
+    def test_userHistoriesExported(self):
+        """
+        Function: compact and export (the old histories are deleted from the tables), then request the histories of user 1
+
+        Assertion: the exported histories are read from their files after the recent one, newest first, and only when the limit is not reached
+        """
+        self.archiver.compact(self.now)
+        self.archiver.export(self.now)
+        client = app.test_client()
+
+        histories = client.get("/history/1").get_json()
+        self.assertEqual([history["begin_time"] for history in histories],
+                         ["2020-05-20T09:00:00", "2020-02-10T09:00:00", "2020-01-10T09:00:00"])
+        self.assertEqual(histories[1], {"user_id": "1", "car_id": "2", "begin_time": "2020-02-10T09:00:00", "return_time": "2020-02-10T17:00:00"})
+
+        self.assertEqual(len(client.get("/history/1?limit=2").get_json()), 2)
+        self.assertEqual(client.get("/history/2").get_json(), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# python3 load_test.py --workers 1,2,4 --clients 16 --duration 10
+# python3 load_test.py --url http://127.0.0.1:5000 --clients 16     (against a server which is already running)
+
+import os, sys, time, argparse, subprocess, multiprocessing
+import requests
+
+def unbooked(s, url, args):
+    """Request the list of available cars (the list shown before making a booking)
+    """
+    return s.get(url + "/car/unbooked")
+
+
+def search(s, url, args):
+    """Search for cars with a filter
+    """
+    return s.post(url + "/car/search", data = {"make": "Toyota", "colour": "Black"})
+
+
+def booking(s, url, args):
+    """Make a booking and cancel it again (requires a logged in session, see client())
+    """
+    details = {"car_id": args.car_id, "begin_date": "2030-01-01", "begin_time": "10:00"}
+    s.post(url + "/booking/make", data = dict(details, return_date = "2030-01-01", return_time = "12:00"))
+    return s.post(url + "/booking/cancel", data = details)
+
+
+SCENARIOS = {"unbooked": unbooked, "search": search, "booking": booking}
+
+
+def client(url, scenario, duration, args):
+    """Send requests of a scenario one after another for a duration. Each client runs in its own process so the clients are not limited by the GIL.
+
+    Arguments:
+        url {str} -- Base URL of the server
+        scenario {str} -- Name of the scenario (a key of SCENARIOS)
+        duration {float} -- Seconds to send requests for
+        args {Namespace} -- Command line arguments (credentials and car ID for the booking scenario)
+
+    Returns:
+        tuple -- The number of successful and failed requests
+    """
+    s = requests.Session()
+    if scenario == "booking":
+        s.post(url + "/login", data = {"username": args.username, "password": args.password})
+
+    ok, failed = 0, 0
+    end = time.time() + duration
+    while time.time() < end:
+        try:
+            response = SCENARIOS[scenario](s, url, args)
+            if response.status_code < 400: ok += 1
+            else: failed += 1
+        except requests.RequestException:
+            failed += 1
+    return ok, failed
+
+
+def run(url, scenario, clients, duration, args):
+    """Run a scenario with a number of concurrent clients
+
+    Returns:
+        float -- Requests per second
+    """
+    with multiprocessing.Pool(clients) as pool:
+        results = pool.starmap(client, [(url, scenario, duration, args)] * clients)
+    return sum(ok for ok, _ in results) / duration
+
+
+def startServer(workers, threads, port):
+    """Start serve.py with a number of workers and wait until it answers
+
+    Returns:
+        Popen -- The server process
+    """
+    # serve.py is next to this file, and flask_main reads its config from that directory
+    directory = os.path.dirname(os.path.abspath(__file__))
+    server = subprocess.Popen([sys.executable, os.path.join(directory, "serve.py"), "--workers", str(workers), "--threads", str(threads),
+                               "--bind", "127.0.0.1:{}".format(port)], cwd = directory)
+    url = "http://127.0.0.1:{}".format(port)
+    for _ in range(100):
+        try:
+            requests.get(url + "/", timeout = 1)
+            return server
+        except requests.RequestException:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("serve.py did not start on port {}".format(port))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Measure requests/sec of the booking and search endpoints")
+    parser.add_argument("--url", help = "test a server which is already running instead of starting serve.py")
+    parser.add_argument("--workers", default = "1,2,{}".format(multiprocessing.cpu_count()), help = "comma separated worker counts to compare")
+    parser.add_argument("--threads", type = int, default = 4, help = "threads per worker")
+    parser.add_argument("--port", type = int, default = 5050, help = "port used for the started servers")
+    parser.add_argument("--clients", type = int, default = 16, help = "concurrent client processes")
+    parser.add_argument("--duration", type = float, default = 10, help = "seconds per scenario")
+    parser.add_argument("--scenarios", default = "unbooked,search", help = "comma separated: " + ", ".join(SCENARIOS))
+    parser.add_argument("--username", help = "user for the booking scenario")
+    parser.add_argument("--password", help = "password for the booking scenario")
+    parser.add_argument("--car-id", default = "1", help = "car for the booking scenario")
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(",")
+    worker_counts = [None] if args.url else [int(w) for w in args.workers.split(",")]
+
+    print("{:>8} {:>10} {:>12}".format("workers", "scenario", "requests/s"))
+    for workers in worker_counts:
+        server = None if args.url else startServer(workers, args.threads, args.port)
+        url = args.url or "http://127.0.0.1:{}".format(args.port)
+        try:
+            for scenario in scenarios:
+                rps = run(url, scenario, args.clients, args.duration, args)
+                print("{:>8} {:>10} {:>12.1f}".format(workers or "-", scenario, rps))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
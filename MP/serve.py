@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# pip3 install gunicorn
+# python3 serve.py --workers 4 --threads 4
+# python3 serve.py --workers 4 --threads 4 --preload       (load the app once in the master, a code change then needs a full restart)
+#
+# Graceful reload (new workers, no dropped requests):       kill -HUP <master pid>
+# Graceful shutdown:                                        kill -TERM <master pid>
+
+import os, argparse, multiprocessing
+from gunicorn.app.base import BaseApplication
+
+class CarshareServer(BaseApplication):
+    """This class serves the Flask app of flask_main.py with Gunicorn instead of Flask's development server (app.run()).
+
+    - Each worker process loads the app (models, blueprints, config and templates) and handles requests with a pool of threads
+      (or greenlets with the gevent worker class)
+    - Gunicorn restarts workers that die and reloads them gracefully on SIGHUP, the new workers import the code again
+    - With preload_app the master loads the app once and then forks the workers, which share its memory and start faster.
+      The workers forked on SIGHUP then get the master's copy of the code, so a code change needs a full restart
+    """
+
+    def __init__(self, options):
+        """inits CarshareServer with the Gunicorn settings
+
+        Arguments:
+            options {dict} -- Gunicorn settings (bind, workers, threads, worker_class, etc.)
+        """
+        self.options = options
+        self.application = None
+        super().__init__()
+
+    def load_config(self):
+        """Pass the settings to Gunicorn
+        """
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key.lower(), value)
+
+    def load(self):
+        """Load the app. In each worker, or with preload_app once in the master before the workers are forked.
+
+        Returns:
+            Flask -- The Flask app of flask_main.py
+        """
+        if self.application is None:
+            self.application = preload()
+        return self.application
+
+
+def preload():
+    """Import flask_main (models, blueprints and config) and compile every template, so no request waits for them.
+    With preload_app this runs in the master and the forked workers share them instead of each loading them on its first request.
+
+    Returns:
+        Flask -- The Flask app of flask_main.py
+    """
+    from flask_main import app
+
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+    return app
+
+
+def post_fork(server, worker):
+    """Gunicorn hook run in each worker after the fork: drop the database connections inherited from the master, each worker opens its own.
+    """
+    from flask_api import db
+
+    app = server.app.load()
+    with app.app_context():
+        db.get_engine(app).dispose()
+
+
+def options(bind = "0.0.0.0:5000", workers = None, threads = 4, worker_class = "gthread", timeout = 30, preload_app = False):
+    """Build the Gunicorn settings
+
+    Keyword Arguments:
+        bind {str} -- Address to listen on (the web pages call the API on 127.0.0.1:5000)
+        workers {int} -- Number of worker processes (default: 2 x cores + 1)
+        threads {int} -- Number of threads per worker
+        worker_class {str} -- "gthread", "sync" or "gevent" (requires gevent to be installed)
+        timeout {int} -- Seconds before a silent worker is restarted
+        preload_app {bool} -- Load the app in the master before forking (SIGHUP then does not reload the code)
+
+    Returns:
+        dict -- Gunicorn settings
+    """
+    return {
+        "bind"              : bind,
+        "workers"           : workers or multiprocessing.cpu_count() * 2 + 1,
+        "threads"           : threads,
+        "worker_class"      : worker_class,
+        "timeout"           : timeout,
+        "graceful_timeout"  : timeout,
+        "preload_app"       : preload_app,
+        "post_fork"         : post_fork,
+        "accesslog"         : "-" if os.environ.get("CARSHARE_ACCESS_LOG") else None
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Serve the Carshare Flask app with multiple worker processes")
+    parser.add_argument("--bind", default = "0.0.0.0:5000", help = "address to listen on")
+    parser.add_argument("--workers", type = int, default = None, help = "worker processes (default: 2 x cores + 1)")
+    parser.add_argument("--threads", type = int, default = 4, help = "threads per worker")
+    parser.add_argument("--worker-class", default = "gthread", help = "gthread, sync or gevent")
+    parser.add_argument("--timeout", type = int, default = 30, help = "seconds before a silent worker is restarted")
+    parser.add_argument("--preload", action = "store_true", help = "load the app once in the master (SIGHUP then does not reload the code)")
+    args = parser.parse_args()
+
+    CarshareServer(options(args.bind, args.workers, args.threads, args.worker_class, args.timeout, args.preload)).run()
@@ -88,6 +88,48 @@ def lockCar(user_id, car_id):
         return None # No string is returned
 
 
+def getFaceMapping(since):
+    """This function will request the changes of the facial recognition mapping (label -> User ID) via the Flask API.
+    This function will trigger flask_api.getFaceMapping().
+    This function is called from a TCP client from the Agent Pi.
+
+    The reply can be longer than one TCP read, so it starts with its length in bytes and a new line.
+
+    Arguments:
+        since {int} -- The version of the mapping the Agent Pi has (0 for the whole mapping)
+
+    Returns:
+        str -- The length of the JSON content of the reponse from the API, a new line, and the JSON content
+    """
+    # Send a request to Flask API
+    response = requests.get("http://127.0.0.1:5000/face/mapping", params = {"since": since})
+
+    # Examine the response from the API
+    if response.status_code == 200:
+        return "{}\n{}".format(len(response.content), response.text) # Return the changes since the version
+    return None
+
+
+def verifyFace(embedding):
+    """This function will request the Master Pi to recognize the face of an embedding via the Flask API.
+    This function will trigger flask_face.verifyFace().
+    This function is called from a TCP client from the Agent Pi, which only computes the embedding of the face.
+
+    Arguments:
+        embedding {str} -- The 128-d embedding, base64 of little-endian float32 (see flask_face.encodeEmbedding())
+
+    Returns:
+        str -- Content of the reponse from the API, JSON with the User ID (null if not recognized), its probability and similarity
+    """
+    # Send the POST request to the API
+    response = requests.post("http://127.0.0.1:5000/face/verify", {"embedding": embedding})
+
+    # Examine the response from the API
+    if response.status_code == 200:
+        return response.text # Return the recognized user
+    return None
+
+
 # ----------------------------------------------------------------------------------------
 """The code below is for launching the TCP server and listen for connection.
 Once there is a connection and a message, the message will be examine with the leading tag to indicate which request to send to the Flask API.
@@ -150,6 +192,22 @@ if __name__ == '__main__':
                         # Trigger the right function to send request
                         reply = lockCar(user_id, car_id)
 
+                    # For message with mapping tag
+                    elif (tag == "mapping"):
+                        # Data handling - message = "mapping version"
+                        since       = message.decode().split()[1]
+
+                        # Trigger the right function to send request
+                        reply = getFaceMapping(since)
+
+                    # For message with verify tag
+                    elif (tag == "verify"):
+                        # Data handling - message = "verify embedding"
+                        embedding   = message.decode().split()[1]
+
+                        # Trigger the right function to send request
+                        reply = verifyFace(embedding)
+
                     if reply is not None:
                         print("Sending reply.")
                         conn.sendall(reply.encode())
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# python3 stats_rebuild.py --workers 4
+
+import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask_api import db, Car, History, ArchivedHistory, UserStats, CarStats
+from history_archive import HistoryArchiver
+
+def partitions(app, model, workers):
+    """Split the ID range of a table into one range per worker
+
+    Arguments:
+        app {Flask} -- The Flask app which db has been initialised with
+        model {db.Model} -- History or ArchivedHistory
+        workers {int} -- The number of ranges
+
+    Returns:
+        list -- (model, first ID, last ID) for each range
+    """
+    with app.app_context():
+        low, high = db.session.query(db.func.min(model.id), db.func.max(model.id)).one()
+
+    if low is None:
+        return []
+
+    step = (high - low) // workers + 1
+    return [(model, start, min(start + step - 1, high)) for start in range(low, high + 1, step)]
+
+
+def aggregate(app, model, first, last, costs):
+    """Compute the stats of the histories in an ID range. Each worker uses its own app context (and database connection).
+
+    Arguments:
+        app {Flask} -- The Flask app which db has been initialised with
+        model {db.Model} -- History or ArchivedHistory
+        first {int} -- The first ID of the range
+        last {int} -- The last ID of the range
+        costs {dict} -- The cost per hour of each car ID
+
+    Returns:
+        tuple -- The user stats ({user_id: [trips, hours]}) and the car stats ({car_id: [trips, hours, revenue]})
+    """
+    with app.app_context():
+        rows = db.session.query(model.user_id, model.car_id, model.begin_time, model.return_time) \
+                         .filter(model.id.between(first, last)).all()
+
+    return count(rows, costs)
+
+
+def aggregateExport(archiver, partition, costs):
+    """Compute the stats of a partition exported to cold storage (its rows are no longer in ArchivedHistories)
+
+    Arguments:
+        archiver {HistoryArchiver} -- The archiver which exported the partition
+        partition {str} -- The month of the partition (YYYY-MM)
+        costs {dict} -- The cost per hour of each car ID
+
+    Returns:
+        tuple -- The user stats ({user_id: [trips, hours]}) and the car stats ({car_id: [trips, hours, revenue]})
+    """
+    rows = [(row["user_id"], row["car_id"], datetime.fromisoformat(row["begin_time"]), datetime.fromisoformat(row["return_time"]))
+            for row in archiver.readPartition(partition)]
+
+    return count(rows, costs)
+
+
+def count(rows, costs):
+    """Add up the trips, hours and revenue of histories
+
+    Arguments:
+        rows {list} -- (user_id, car_id, begin_time, return_time) of each history
+        costs {dict} -- The cost per hour of each car ID
+
+    Returns:
+        tuple -- The user stats ({user_id: [trips, hours]}) and the car stats ({car_id: [trips, hours, revenue]})
+    """
+    users = defaultdict(lambda: [0, 0.0])
+    cars = defaultdict(lambda: [0, 0.0, 0.0])
+
+    for user_id, car_id, begin_time, return_time in rows:
+        hours = max((return_time - begin_time).total_seconds(), 0) / 3600
+
+        users[str(user_id)][0] += 1
+        users[str(user_id)][1] += hours
+
+        cars[str(car_id)][0] += 1
+        cars[str(car_id)][1] += hours
+        cars[str(car_id)][2] += hours * costs.get(str(car_id), 0.0)
+
+    return users, cars
+
+
+def rebuild(app, workers = 4, archive_dir = HistoryArchiver.ARCHIVE_DIR):
+    """Recompute the UserStats and CarStats tables from scratch, from the Histories and ArchivedHistories tables
+    and the partitions exported to cold storage by history_archive.py.
+    The histories are split into ID ranges that are aggregated in parallel, then the tables are replaced in one transaction.
+    Cars locked while the rebuild is running may be missed, so it is best run while the API is stopped.
+    The revenue is priced with the current cost per hour of each car, while recordTrip() prices a trip with the cost per hour when the car is locked
+    (the histories do not keep it): after a price change the rebuilt revenue of a car differs from the revenue counted as the car was locked.
+
+    Arguments:
+        app {Flask} -- The Flask app which db has been initialised with
+
+    Keyword Arguments:
+        workers {int} -- The number of parallel workers
+        archive_dir {str} -- Directory of the exported partitions
+
+    Returns:
+        tuple -- The number of users and cars with stats
+    """
+    with app.app_context():
+        costs = {str(car_id): float(cost_per_hour) for car_id, cost_per_hour in db.session.query(Car.id, Car.cost_per_hour)}
+
+    ranges = partitions(app, History, workers) + partitions(app, ArchivedHistory, workers)
+    archiver = HistoryArchiver(app, archive_dir = archive_dir)
+    exports = archiver.exported()
+
+    # Aggregate every range and every exported partition in parallel
+    with ThreadPoolExecutor(max_workers = workers) as executor:
+        results = list(executor.map(lambda r: aggregate(app, *r, costs), ranges))
+        results += list(executor.map(lambda partition: aggregateExport(archiver, partition, costs), exports))
+
+    # Merge the partial stats
+    users = defaultdict(lambda: [0, 0.0])
+    cars = defaultdict(lambda: [0, 0.0, 0.0])
+    for partial_users, partial_cars in results:
+        for user_id, stats in partial_users.items():
+            users[user_id] = [total + value for total, value in zip(users[user_id], stats)]
+        for car_id, stats in partial_cars.items():
+            cars[car_id] = [total + value for total, value in zip(cars[car_id], stats)]
+
+    # Replace the tables
+    with app.app_context():
+        UserStats.query.delete()
+        CarStats.query.delete()
+        db.session.add_all([UserStats(user_id, trips, hours) for user_id, (trips, hours) in users.items()])
+        db.session.add_all([CarStats(car_id, trips, hours, revenue) for car_id, (trips, hours, revenue) in cars.items()])
+
+        # Commit changes
+        db.session.commit()
+
+    return len(users), len(cars)
+
+
+if __name__ == "__main__":
+    from flask_main import app
+
+    parser = argparse.ArgumentParser(description = "Recompute the UserStats and CarStats tables from the histories")
+    parser.add_argument("--workers", type = int, default = 4, help = "number of parallel workers")
+    parser.add_argument("--archive-dir", default = HistoryArchiver.ARCHIVE_DIR, help = "directory of the exported partitions")
+    args = parser.parse_args()
+
+    print("[INFO] rebuilding stats...")
+    users, cars = rebuild(app, args.workers, args.archive_dir)
+    print("[INFO] stats rebuilt for {} users and {} cars".format(users, cars))
@@ -0,0 +1,122 @@
+import unittest, tempfile
+from unittest import mock
+from datetime import datetime
+from flask import Flask
+from flask_api import api, db, Car, Booking, History, recordTrip
+from history_archive import HistoryArchiver
+from stats_rebuild import rebuild
+
+# The test app uses an in-memory SQLite database instead of Google Cloud SQL
+app = Flask(__name__)
+app.secret_key = "test key"
+app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+db.init_app(app)
+app.register_blueprint(api)
+
+class StatsTest(unittest.TestCase):
+    """This is the set up for the test case, create the tables with 1 car (10 AUD per hour) and 2 ongoing bookings of user 1
+    """
+    def setUp(self):
+        with app.app_context():
+            db.create_all()
+            db.session.add(Car("Toyota", "Sedan", "Black", 5, "-37.814, 144.96332", 10.0, True))
+            db.session.add(Booking("1", "1", datetime(2020, 5, 21, 12), datetime(2020, 5, 21, 15), True))
+            db.session.commit()
+
+        self.client = app.test_client()
+        self.archive_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        with app.app_context():
+            db.drop_all()
+
+    def test_lockCar(self):
+        """
+        Function: lock the car twice (the second booking is made after the first one finished)
+
+        Assertion: the stats of the user and the car are updated by lockCar()
+        """
+        self.assertEqual(self.client.put("/car/lock", data = {"user_id": "1", "car_id": "1"}).data, b"locked")
+
+        with app.app_context():
+            db.session.add(Booking("1", "1", datetime(2020, 5, 22, 12), datetime(2020, 5, 22, 13, 30), True))
+            db.session.commit()
+        self.client.put("/car/lock", data = {"user_id": "1", "car_id": "1"})
+
+        self.assertEqual(self.client.get("/stats/user/1").get_json(), {"user_id": "1", "trips": 2, "hours": 4.5})
+        self.assertEqual(self.client.get("/stats/car/1").get_json(), {"car_id": "1", "trips": 2, "hours": 4.5, "revenue": 45.0})
+        self.assertEqual(self.client.get("/stats/user/2").get_json()["trips"], 0)
+
+    def test_recordTrip(self):
+        """
+        Function: record 2 trips of a new user in one transaction, then a third trip in another transaction
+
+        Assertion: the first trip inserts the stats rows, the others add to them
+        """
+        with app.app_context():
+            recordTrip("3", "1", datetime(2020, 5, 1, 10), datetime(2020, 5, 1, 11), 10.0)
+            recordTrip("3", "1", datetime(2020, 5, 2, 10), datetime(2020, 5, 2, 12), 10.0)
+            db.session.commit()
+            recordTrip("3", "2", datetime(2020, 5, 3, 10), datetime(2020, 5, 3, 10, 30), 20.0)
+            db.session.commit()
+
+        self.assertEqual(self.client.get("/stats/user/3").get_json(), {"user_id": "3", "trips": 3, "hours": 3.5})
+        self.assertEqual(self.client.get("/stats/car/1").get_json(), {"car_id": "1", "trips": 2, "hours": 3.0, "revenue": 30.0})
+        self.assertEqual(self.client.get("/stats/car/2").get_json()["revenue"], 10.0)
+
+    def test_recordTripOtherDatabase(self):
+        """
+        Function: record 2 trips of a new user in one transaction, then a third one, on a database with no upsert statement
+
+        Assertion: the first trip inserts the stats rows, the others add to them
+        """
+        with app.app_context(), mock.patch.object(db.engine.dialect, "name", "oracle"):
+            recordTrip("3", "1", datetime(2020, 5, 1, 10), datetime(2020, 5, 1, 11), 10.0)
+            recordTrip("3", "1", datetime(2020, 5, 2, 10), datetime(2020, 5, 2, 12), 10.0)
+            db.session.commit()
+            recordTrip("3", "1", datetime(2020, 5, 3, 10), datetime(2020, 5, 3, 10, 30), 10.0)
+            db.session.commit()
+
+        self.assertEqual(self.client.get("/stats/user/3").get_json(), {"user_id": "3", "trips": 3, "hours": 3.5})
+        self.assertEqual(self.client.get("/stats/car/1").get_json(), {"car_id": "1", "trips": 3, "hours": 3.5, "revenue": 35.0})
+
+    def test_rebuild(self):
+        """
+        Function: lock the car, add histories directly to the Histories table, then rebuild the stats
+
+        Assertion: the rebuilt stats count every history
+        """
+        self.client.put("/car/lock", data = {"user_id": "1", "car_id": "1"})
+
+        with app.app_context():
+            for day in range(1, 10):
+                db.session.add(History("2", "1", datetime(2020, 4, day, 10), datetime(2020, 4, day, 12)))
+            db.session.commit()
+
+        self.assertEqual(rebuild(app, workers = 3, archive_dir = self.archive_dir), (2, 1))
+        self.assertEqual(self.client.get("/stats/user/1").get_json()["trips"], 1)
+        self.assertEqual(self.client.get("/stats/user/2").get_json(), {"user_id": "2", "trips": 9, "hours": 18.0})
+        self.assertEqual(self.client.get("/stats/car/1").get_json()["revenue"], 210.0)
+
+    def test_rebuildExported(self):
+        """
+        Function: archive and export old histories (their rows are deleted from the tables), then rebuild the stats
+
+        Assertion: the histories of the exported partitions are still counted
+        """
+        with app.app_context():
+            for month in (1, 2):
+                db.session.add(History("2", "1", datetime(2020, month, 3, 10), datetime(2020, month, 3, 13)))
+            db.session.commit()
+
+        archiver = HistoryArchiver(app, archive_dir = self.archive_dir)
+        archiver.compact(datetime(2020, 5, 25))
+        self.assertEqual(archiver.export(datetime(2020, 5, 25)), ["2020-01", "2020-02"])
+
+        self.assertEqual(rebuild(app, workers = 2, archive_dir = self.archive_dir), (1, 1))
+        self.assertEqual(self.client.get("/stats/user/2").get_json(), {"user_id": "2", "trips": 2, "hours": 6.0})
+        self.assertEqual(self.client.get("/stats/car/1").get_json()["revenue"], 60.0)
+
+if __name__ == "__main__":
+    unittest.main()